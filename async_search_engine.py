@@ -0,0 +1,196 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+import asyncpg
+from dotenv import load_dotenv
+from database import (
+    DENSE_INDEX_TYPE, DENSE_RERANK_OVERSAMPLE, SPARSE_VECTOR_TYPE, document_columns, nearest_sql,
+    sparse_literal, vector_literal
+)
+from search_metrics import metrics
+from vector_models import VectorModels
+from vector_store import format_results
+
+load_dotenv()
+
+def _dense_literal(vector):
+    return vector_literal(vector.tolist())
+
+class AsyncSearchEngine:
+    """asyncio counterpart of SearchEngine backed by an asyncpg pool.
+    
+    Query encoding runs in a thread pool and the dense and sparse index
+    lookups of a hybrid query are issued concurrently on separate pooled
+    connections, so one process can keep many queries in flight.
+    """
+    
+    def __init__(self, vector_models=None):
+        self.vector_models = vector_models or VectorModels()
+        self.executor = ThreadPoolExecutor(max_workers=int(os.getenv('ENCODER_THREADS', '4')))
+        self.pool = None
+        self.documents_indexed = False
+        self.hybrid_candidate_multiplier = int(os.getenv('HYBRID_CANDIDATE_MULTIPLIER', '4'))
+        self.rrf_k = int(os.getenv('RRF_K', '60'))
+        self.hnsw_ef_search = int(os.getenv('HNSW_EF_SEARCH', '40'))
+        self.dense_index_type = DENSE_INDEX_TYPE
+        self.dense_oversample = DENSE_RERANK_OVERSAMPLE
+    
+    async def connect(self):
+        self.pool = await asyncpg.create_pool(
+            min_size=int(os.getenv('DB_POOL_MIN', '1')),
+            max_size=int(os.getenv('DB_POOL_MAX', '10')),
+            database=os.getenv('DB_NAME', 'hybrid_search'),
+            user=os.getenv('DB_USER', 'postgres'),
+            password=os.getenv('DB_PASSWORD'),
+            host=os.getenv('DB_HOST', 'localhost'),
+            port=int(os.getenv('DB_PORT', '5432'))
+        )
+        
+        # Searching requires the TF-IDF model persisted by SearchEngine.index_documents
+        row = await self.pool.fetchrow("SELECT terms, idf FROM sparse_models ORDER BY id DESC LIMIT 1")
+        has_documents = await self.pool.fetchval("SELECT EXISTS (SELECT 1 FROM sparse_vectors)")
+        if row is not None and has_documents:
+            self.vector_models.load_sparse_model(row['terms'], row['idf'])
+            self.documents_indexed = True
+        return self
+    
+    async def __aenter__(self):
+        return await self.connect()
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    async def _run_in_executor(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+    
+    async def _encode(self, query, dense=True, sparse=True):
+        tasks = []
+        if dense:
+            tasks.append(self._run_in_executor(self.vector_models.get_dense_embedding, query))
+        if sparse:
+            tasks.append(self._run_in_executor(self.vector_models.get_sparse_embedding, query))
+        return await asyncio.gather(*tasks)
+    
+    async def _fetch(self, query, *args, ef_search=None):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                if ef_search is not None:
+                    await conn.execute("SELECT set_config('hnsw.ef_search', $1, true)", str(ef_search))
+                with metrics.timer('db.execute'):
+                    return await conn.fetch(query, *args)
+    
+    async def _candidates(self, table, cast, vector_text, num_candidates):
+        # Same plan as Database, so a halfvec or bit dense index is used and re-ranked
+        query = nearest_sql(
+            table, f'$1::{cast}', '$2',
+            dense_index_type=self.dense_index_type, dense_oversample=self.dense_oversample
+        )
+        num_rows = num_candidates
+        if table == 'dense_vectors' and self.dense_index_type != 'vector':
+            num_rows *= self.dense_oversample
+        ef_search = min(max(num_rows, self.hnsw_ef_search), 1000)
+        rows = await self._fetch(query, vector_text, num_candidates, ef_search=ef_search)
+        return [(row['document_id'], row['similarity']) for row in rows]
+    
+    async def _score(self, table, cast, vector_text, document_ids):
+        if not document_ids:
+            return {}
+        query = f"""
+            SELECT document_id, 1 - (vector <=> $1::{cast}) as similarity
+            FROM {table}
+            WHERE document_id = ANY($2::int[])
+        """
+        rows = await self._fetch(query, vector_text, list(document_ids))
+        return {row['document_id']: row['similarity'] for row in rows}
+    
+    async def _fetch_documents(self, scored, fields=None, snippet_length=None):
+        if not scored:
+            return format_results([], fields)
+        rows = await self._fetch(
+            f"SELECT {document_columns(fields, snippet_length)} FROM documents d WHERE d.id = ANY($1::int[])",
+            [document_id for document_id, _ in scored]
+        )
+        documents = {row['id']: tuple(row) for row in rows}
+        return format_results([
+            documents[document_id] + (similarity,)
+            for document_id, similarity in scored if document_id in documents
+        ], fields)
+    
+    async def get_documents(self, document_ids, fields=None):
+        return await self._fetch_documents([(document_id, None) for document_id in document_ids], fields)
+    
+    async def dense_search(self, query, limit=10, fields=None, snippet_length=None):
+        dense_vector, = await self._encode(query, sparse=False)
+        scored = await self._candidates('dense_vectors', 'vector', _dense_literal(dense_vector), limit)
+        return await self._fetch_documents(scored, fields, snippet_length)
+    
+    async def sparse_search(self, query, limit=10, fields=None, snippet_length=None):
+        sparse_vector, = await self._encode(query, dense=False)
+        scored = await self._candidates(
+            'sparse_vectors', SPARSE_VECTOR_TYPE, sparse_literal(sparse_vector), limit
+        )
+        return await self._fetch_documents(scored, fields, snippet_length)
+    
+    async def hybrid_search(self, query, limit=10, dense_weight=0.5, candidate_multiplier=None, fusion='weighted',
+                            fields=None, snippet_length=None):
+        if fusion not in ('weighted', 'rrf'):
+            raise ValueError(f"Unknown fusion method: {fusion}")
+        if candidate_multiplier is None:
+            candidate_multiplier = self.hybrid_candidate_multiplier
+        num_candidates = limit * max(candidate_multiplier, 1)
+        
+        dense_vector, sparse_vector = await self._encode(query)
+        dense_text = _dense_literal(dense_vector)
+        sparse_text = sparse_literal(sparse_vector)
+        
+        dense_candidates, sparse_candidates = await asyncio.gather(
+            self._candidates('dense_vectors', 'vector', dense_text, num_candidates),
+            self._candidates('sparse_vectors', SPARSE_VECTOR_TYPE, sparse_text, num_candidates)
+        )
+        
+        if fusion == 'rrf':
+            scores = {}
+            for candidates in (dense_candidates, sparse_candidates):
+                for rank, (document_id, _) in enumerate(candidates, start=1):
+                    scores[document_id] = scores.get(document_id, 0.0) + 1.0 / (self.rrf_k + rank)
+        else:
+            dense_scores = dict(dense_candidates)
+            sparse_scores = dict(sparse_candidates)
+            # Score the missing side only for ids the other index returned
+            missing_dense, missing_sparse = await asyncio.gather(
+                self._score('dense_vectors', 'vector', dense_text, set(sparse_scores) - set(dense_scores)),
+                self._score('sparse_vectors', SPARSE_VECTOR_TYPE, sparse_text, set(dense_scores) - set(sparse_scores))
+            )
+            dense_scores.update(missing_dense)
+            sparse_scores.update(missing_sparse)
+            scores = {
+                document_id: dense_scores[document_id] * dense_weight
+                + sparse_scores[document_id] * (1 - dense_weight)
+                for document_id in dense_scores.keys() & sparse_scores.keys()
+            }
+        
+        scored = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return await self._fetch_documents(scored, fields, snippet_length)
+    
+    async def search(self, query, search_type='hybrid', limit=10, dense_weight=0.5,
+                     candidate_multiplier=None, fusion='weighted', fields=None, snippet_length=None):
+        if not self.documents_indexed:
+            raise ValueError("Documents must be indexed before searching")
+        
+        if search_type == 'dense':
+            return await self.dense_search(query, limit, fields, snippet_length)
+        elif search_type == 'sparse':
+            return await self.sparse_search(query, limit, fields, snippet_length)
+        elif search_type == 'hybrid':
+            return await self.hybrid_search(
+                query, limit, dense_weight, candidate_multiplier, fusion, fields, snippet_length
+            )
+        else:
+            raise ValueError(f"Unknown search type: {search_type}")
+    
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+        self.executor.shutdown(wait=False)
+        self.vector_models.close()
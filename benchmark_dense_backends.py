@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Dense Backend Benchmark
+Compares load time, single-query latency and batch throughput of the torch,
+int8 and onnx dense encoders, and checks that each backend's embeddings stay
+within a cosine tolerance of the torch reference model
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from benchmark_encoding import load_texts
+from data_preprocessor import generate_synthetic_queries
+from dense_encoders import DENSE_BACKENDS, cosine_parity
+from vector_models import VectorModels
+
+def load_backend(backend, threads):
+    vector_models = VectorModels()
+    vector_models.dense_backend = backend
+    vector_models.dense_threads = threads
+    vector_models.encode_workers = 1
+    # Every query must reach the encoder
+    vector_models.dense_cache.max_size = 0
+    start_time = time.time()
+    vector_models.warm_up(sparse=False)
+    return vector_models, time.time() - start_time
+
+def query_latency(vector_models, queries):
+    latencies = []
+    embeddings = []
+    for query in queries:
+        start_time = time.perf_counter()
+        embeddings.append(vector_models.get_dense_embedding(query))
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    
+    latencies.sort()
+    return {
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    }, embeddings
+
+def throughput(vector_models, texts, batch_size):
+    start_time = time.time()
+    embeddings = vector_models.get_dense_embeddings(texts, batch_size=batch_size)
+    return len(texts) / (time.time() - start_time), embeddings
+
+def main():
+    """Main function to run the dense backend benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--backends', nargs='+', default=list(DENSE_BACKENDS), choices=DENSE_BACKENDS)
+    parser.add_argument('--threads', type=int, default=None, help='Intra-op threads (DENSE_THREADS)')
+    parser.add_argument('--queries', type=int, default=200, help='Queries encoded one at a time')
+    parser.add_argument('--documents', type=int, default=1000, help='Documents encoded in batches')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--min-cosine', type=float, default=0.99,
+                        help='Lowest cosine similarity to the torch embeddings a backend may produce')
+    parser.add_argument('--preprocessed', action='store_true',
+                        help='Encode the preprocessed dataset instead of synthetic documents')
+    args = parser.parse_args()
+    
+    print("DENSE BACKEND BENCHMARK")
+    print("=" * 50)
+    
+    queries = generate_synthetic_queries(args.queries)
+    texts = load_texts(args.documents, args.preprocessed)
+    print(f"{len(queries)} queries, {len(texts)} documents, "
+          f"{args.threads or 'default'} intra-op threads")
+    
+    # The torch model is the reference the other backends are checked against
+    backends = ['torch'] + [backend for backend in args.backends if backend != 'torch']
+    reference = None
+    passed = True
+    
+    print(f"\n{'Backend':<8} {'Load s':>7} {'p50 ms':>8} {'p95 ms':>8} {'Docs/s':>9} "
+          f"{'Min cos':>8} {'Mean cos':>9}  Parity")
+    for backend in backends:
+        try:
+            vector_models, load_time = load_backend(backend, args.threads)
+        except ImportError as exc:
+            print(f"{backend:<8} skipped: {exc}")
+            if backend == 'torch':
+                return False
+            continue
+        try:
+            latency, query_embeddings = query_latency(vector_models, queries)
+            docs_per_second, document_embeddings = throughput(vector_models, texts, args.batch_size)
+        finally:
+            vector_models.close()
+        
+        embeddings = list(query_embeddings) + list(document_embeddings)
+        if reference is None:
+            reference = embeddings
+        similarity = cosine_parity(reference, embeddings) if backend != 'torch' else None
+        
+        if similarity is None:
+            parity = "reference"
+            min_cosine = mean_cosine = "-"
+        else:
+            ok = bool(similarity.min() >= args.min_cosine)
+            passed = passed and ok
+            parity = "ok" if ok else f"FAIL (< {args.min_cosine})"
+            min_cosine, mean_cosine = f"{similarity.min():.4f}", f"{similarity.mean():.4f}"
+        print(f"{backend:<8} {load_time:>7.1f} {latency['p50_ms']:>8.2f} {latency['p95_ms']:>8.2f} "
+              f"{docs_per_second:>9.1f} {min_cosine:>8} {mean_cosine:>9}  {parity}")
+    
+    return passed
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
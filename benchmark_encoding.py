@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Dense Encoding Throughput Benchmark
+Compares documents per second of per-document encoding, in-process batched
+encoding and length-bucketed multi-process encoding across worker counts
+"""
+
+import argparse
+import time
+import numpy as np
+from data_preprocessor import generate_synthetic_documents, load_preprocessed_data
+from vector_models import VectorModels
+
+def load_texts(num_documents, preprocessed):
+    if preprocessed:
+        return load_preprocessed_data(columns=['content'], num_rows=num_documents)['content'].tolist()
+    # Synthetic reports mixed with their titles, so lengths vary as they do in real data
+    texts = []
+    for document in generate_synthetic_documents((num_documents + 1) // 2):
+        texts.extend([document['content'], document['title']])
+    return texts[:num_documents]
+
+def run_per_document(vector_models, texts):
+    """One encode call per document, as indexing originally did."""
+    vector_models.dense_cache.max_size = 0
+    start_time = time.time()
+    embeddings = np.array([vector_models.get_dense_embedding(text) for text in texts])
+    return time.time() - start_time, embeddings
+
+def run_batched(vector_models, texts, batch_size, workers):
+    vector_models.encode_workers = workers
+    if workers > 1:
+        # Worker start-up and model loading are excluded, as the pool is reused across index batches
+        vector_models._get_dense_pool()
+    start_time = time.time()
+    embeddings = vector_models.get_dense_embeddings(texts, batch_size=batch_size)
+    return time.time() - start_time, embeddings
+
+def main():
+    """Main function to run the encoding benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--documents', type=int, default=2000, help='Documents to encode')
+    parser.add_argument('--per-document', type=int, default=200,
+                        help='Documents encoded one at a time for the baseline (0 to skip)')
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[32, 128])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--preprocessed', action='store_true',
+                        help='Encode the preprocessed dataset instead of synthetic documents')
+    args = parser.parse_args()
+    
+    print("DENSE ENCODING BENCHMARK")
+    print("=" * 50)
+    
+    texts = load_texts(args.documents, args.preprocessed)
+    lengths = [len(text) for text in texts]
+    print(f"{len(texts)} documents, {min(lengths)}-{max(lengths)} characters (mean {np.mean(lengths):.0f})")
+    
+    vector_models = VectorModels()
+    vector_models.warm_up(sparse=False)
+    reference = None
+    
+    try:
+        print(f"\n{'Mode':<28} {'Seconds':>9} {'Docs/s':>9} {'Speedup':>8}")
+        baseline = None
+        if args.per_document:
+            seconds, _ = run_per_document(vector_models, texts[:args.per_document])
+            baseline = args.per_document / seconds
+            print(f"{'per document':<28} {seconds:>9.2f} {baseline:>9.1f} {1.0:>7.2f}x")
+        
+        for workers in args.workers:
+            for batch_size in args.batch_size:
+                seconds, embeddings = run_batched(vector_models, texts, batch_size, workers)
+                if reference is None:
+                    reference = embeddings
+                # Every mode must return the same embeddings in the same order
+                drift = float(np.max(np.abs(embeddings - reference)))
+                throughput = len(texts) / seconds
+                speedup = f"{throughput / baseline:>7.2f}x" if baseline else f"{'n/a':>8}"
+                label = f"batch {batch_size}, {workers} worker{'s' if workers > 1 else ''}"
+                print(f"{label:<28} {seconds:>9.2f} {throughput:>9.1f} {speedup}"
+                      + (f"  max drift {drift:.1e}" if drift > 1e-4 else ""))
+            vector_models.close()
+    finally:
+        vector_models.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Indexing Throughput Benchmark
+Compares the per-row write path with the batched bulk write path
+"""
+
+import argparse
+import time
+from search_engine import SearchEngine, DOCUMENT_COLUMNS, prepare_documents
+from data_preprocessor import load_preprocessed_data
+
+def load_documents(num_documents):
+    """Load up to num_documents rows from the preprocessed data."""
+    documents_df = load_preprocessed_data(num_rows=num_documents)
+    # Dedicated keys keep the bulk upserts from touching documents already indexed
+    documents_df['doc_key'] = [f"benchmark:{i}" for i in range(len(documents_df))]
+    return prepare_documents(documents_df)
+
+def max_document_id(db):
+    return db.fetch_one("SELECT COALESCE(MAX(id), 0) FROM documents")[0]
+
+def delete_documents_after(db, document_id):
+    """Remove rows written by a benchmark run so runs do not affect each other."""
+    db.execute("DELETE FROM dense_vectors WHERE document_id > %s", (document_id,))
+    db.execute("DELETE FROM sparse_vectors WHERE document_id > %s", (document_id,))
+    db.execute("DELETE FROM documents WHERE id > %s", (document_id,))
+
+def run_per_row(vector_store, documents_df, dense_embeddings, sparse_embeddings):
+    """One INSERT and one commit per row, as index_documents used to do."""
+    start_time = time.time()
+    
+    for i, row in enumerate(documents_df.itertuples(index=False)):
+        document_id = vector_store.store_document(
+            title=row.title,
+            content=row.content,
+            source=row.source,
+            document_type=row.document_type
+        )
+        vector_store.store_dense_vector(document_id, dense_embeddings[i])
+        vector_store.store_sparse_vector(document_id, sparse_embeddings[i])
+    
+    return time.time() - start_time
+
+def run_bulk(vector_store, documents_df, dense_embeddings, sparse_embeddings, batch_size):
+    """Multi-row upserts with one transaction per chunk, as index_documents does."""
+    start_time = time.time()
+    
+    for start in range(0, len(documents_df), batch_size):
+        end = start + batch_size
+        vector_store.store_documents_batch(
+            documents_df.iloc[start:end][DOCUMENT_COLUMNS].itertuples(index=False, name=None),
+            dense_embeddings[start:end],
+            sparse_embeddings[start:end]
+        )
+    
+    return time.time() - start_time
+
+def main():
+    """Main function to run the indexing benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--documents', type=int, default=2000, help='Number of documents to write')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk transaction')
+    args = parser.parse_args()
+    
+    print("INDEXING THROUGHPUT BENCHMARK")
+    print("=" * 50)
+    
+    documents_df = load_documents(args.documents)
+    search_engine = SearchEngine()
+    vector_store = search_engine.vector_store
+    
+    # Embeddings are computed once up front so both runs time only the writes
+    print(f"Encoding {len(documents_df)} documents...")
+    contents = documents_df['content'].tolist()
+    search_engine.vector_models.fit_sparse_model(contents)
+    dense_embeddings = search_engine.vector_models.get_dense_embeddings(contents)
+    sparse_embeddings = search_engine.vector_models.get_sparse_embeddings(contents)
+    
+    baseline_id = max_document_id(vector_store.db)
+    
+    try:
+        per_row_time = run_per_row(vector_store, documents_df, dense_embeddings, sparse_embeddings)
+        delete_documents_after(vector_store.db, baseline_id)
+        
+        bulk_time = run_bulk(vector_store, documents_df, dense_embeddings, sparse_embeddings, args.batch_size)
+    finally:
+        delete_documents_after(vector_store.db, baseline_id)
+        search_engine.close()
+    
+    count = len(documents_df)
+    print(f"\nPer-row path:  {per_row_time:.2f}s ({count / per_row_time:.1f} docs/s)")
+    print(f"Bulk path:     {bulk_time:.2f}s ({count / bulk_time:.1f} docs/s, batch size {args.batch_size})")
+    print(f"Speedup:       {per_row_time / bulk_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Dense Index Quantization Benchmark
+Compares index size, latency and recall@k of the full-precision, halfvec and
+binary-quantized dense HNSW indexes against exact full-precision search
+"""
+
+import argparse
+import statistics
+import time
+import psycopg2
+from database import DENSE_INDEX_OPS, dense_index_sql
+from search_engine import SearchEngine
+
+def sample_queries(db, num_queries):
+    """Use document titles as realistic query texts."""
+    rows = db.fetch_all(
+        "SELECT title FROM documents WHERE title IS NOT NULL ORDER BY random() LIMIT %s",
+        (num_queries,)
+    )
+    return [row[0] for row in rows]
+
+def exact_neighbors(db, query_vector, k):
+    # Ordering by similarity keeps the planner off the HNSW indexes
+    rows = db.fetch_all("""
+        SELECT document_id, 1 - (vector <=> %s::vector) as similarity
+        FROM dense_vectors
+        ORDER BY similarity DESC
+        LIMIT %s
+    """, (query_vector.tolist(), k))
+    return [row[0] for row in rows]
+
+def index_size(db, index_type):
+    row = db.fetch_one(
+        "SELECT pg_relation_size(to_regclass(%s))",
+        (f"idx_dense_vectors_{index_type}",)
+    )
+    return row[0] if row else None
+
+def ensure_index(db, index_type):
+    """Build the dense index for index_type if it does not exist; returns the build time."""
+    if index_size(db, index_type) is not None:
+        return None
+    start_time = time.time()
+    db.execute(dense_index_sql(index_type))
+    return time.time() - start_time
+
+def run_mode(db, index_type, query_vectors, ground_truth, k):
+    db.dense_index_type = index_type
+    latencies = []
+    recalls = []
+    for query_vector, expected in zip(query_vectors, ground_truth):
+        start_time = time.perf_counter()
+        rows = db.dense_search(query_vector, k, fields=())
+        latencies.append(time.perf_counter() - start_time)
+        found = {row[0] for row in rows}
+        recalls.append(len(found & set(expected)) / len(expected) if expected else 1.0)
+    return latencies, recalls
+
+def main():
+    """Main function to run the quantization benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--queries', type=int, default=100, help='Number of sampled queries')
+    parser.add_argument('--k', type=int, default=10, help='Results per query (recall@k)')
+    parser.add_argument('--oversample', type=int, default=None,
+                        help='Candidates fetched from quantized indexes per result (DENSE_RERANK_OVERSAMPLE)')
+    parser.add_argument('--modes', nargs='+', default=list(DENSE_INDEX_OPS), choices=list(DENSE_INDEX_OPS))
+    args = parser.parse_args()
+    
+    print("DENSE INDEX QUANTIZATION BENCHMARK")
+    print("=" * 50)
+    
+    search_engine = SearchEngine()
+    db = search_engine.vector_store.db
+    if args.oversample is not None:
+        db.dense_oversample = args.oversample
+    
+    try:
+        queries = sample_queries(db, args.queries)
+        if not queries:
+            print("No documents indexed; run the indexer first.")
+            return
+        
+        print(f"Encoding {len(queries)} queries...")
+        query_vectors = search_engine.vector_models.get_dense_embeddings(queries)
+        ground_truth = [exact_neighbors(db, query_vector, args.k) for query_vector in query_vectors]
+        
+        print(f"\n{'Mode':<10} {'Index size':>12} {'p50 ms':>9} {'p95 ms':>9} {'Recall@' + str(args.k):>10}")
+        for index_type in args.modes:
+            try:
+                build_time = ensure_index(db, index_type)
+                if build_time is not None:
+                    print(f"  (built idx_dense_vectors_{index_type} in {build_time:.1f}s)")
+                latencies, recalls = run_mode(db, index_type, query_vectors, ground_truth, args.k)
+            except psycopg2.Error as e:
+                # halfvec and binary_quantize require pgvector 0.7+
+                print(f"{index_type:<10} unavailable: {e}")
+                continue
+            
+            latencies_ms = sorted(latency * 1000 for latency in latencies)
+            p95 = latencies_ms[min(len(latencies_ms) - 1, int(len(latencies_ms) * 0.95))]
+            print(
+                f"{index_type:<10} {index_size(db, index_type) / 1024 ** 2:>10.1f}MB "
+                f"{statistics.median(latencies_ms):>9.2f} {p95:>9.2f} {statistics.mean(recalls):>10.4f}"
+            )
+    finally:
+        search_engine.close()
+    
+    print(f"\nQuantized modes re-rank {db.dense_oversample}x candidates with full-precision vectors.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Startup Latency Benchmark
+Measures import time, engine construction, warm-up and first-query latency
+in fresh interpreter processes
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+def measure(query, search_type, warm_up):
+    """Run one cold start in this process and return stage timings in seconds."""
+    timings = {}
+    
+    start_time = time.perf_counter()
+    from search_engine import SearchEngine
+    timings['import'] = time.perf_counter() - start_time
+    
+    start_time = time.perf_counter()
+    search_engine = SearchEngine()
+    timings['construct'] = time.perf_counter() - start_time
+    
+    if warm_up:
+        start_time = time.perf_counter()
+        search_engine.warm_up()
+        timings['warm_up'] = time.perf_counter() - start_time
+    
+    start_time = time.perf_counter()
+    search_engine.search(query, search_type=search_type, limit=10)
+    timings['first_query'] = time.perf_counter() - start_time
+    
+    # A different query text so the embedding cache does not hide encoding cost
+    start_time = time.perf_counter()
+    search_engine.search(query + " outlook", search_type=search_type, limit=10)
+    timings['second_query'] = time.perf_counter() - start_time
+    
+    search_engine.close()
+    return timings
+
+def main():
+    """Main function to run the startup benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=3, help='Number of fresh processes to start')
+    parser.add_argument('--query', default='revenue growth and quarterly earnings')
+    parser.add_argument('--search-type', default='hybrid', choices=['dense', 'sparse', 'hybrid'])
+    parser.add_argument('--warm-up', action='store_true', help='Call SearchEngine.warm_up before the first query')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        print(json.dumps(measure(args.query, args.search_type, args.warm_up)))
+        return
+    
+    print("STARTUP LATENCY BENCHMARK")
+    print("=" * 50)
+    
+    command = [sys.executable, __file__, '--child', '--query', args.query, '--search-type', args.search_type]
+    if args.warm_up:
+        command.append('--warm-up')
+    
+    runs = []
+    for run in range(args.runs):
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+        print(f"  Run {run + 1}: " + ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in runs[-1].items()))
+    
+    print(f"\nMedian over {args.runs} runs ({args.search_type} search):")
+    for stage in runs[0]:
+        print(f"  {stage:<13} {statistics.median(run[stage] for run in runs):.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Search Benchmark Suite
+Indexes synthetic corpora of increasing size, drives dense, sparse and hybrid
+search at several concurrency levels, and reports QPS, latency percentiles and
+recall@k against exact brute-force search. Results are written as JSON so runs
+can be compared between versions.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+import numpy as np
+import pandas as pd
+from data_preprocessor import generate_synthetic_documents, generate_synthetic_queries
+from search_engine import SearchEngine
+from search_metrics import metrics
+
+SEARCH_TYPES = ['dense', 'sparse', 'hybrid']
+
+def synthetic_batches(num_documents, seed, chunk_size):
+    documents = generate_synthetic_documents(num_documents, seed)
+    while True:
+        chunk = list(islice(documents, chunk_size))
+        if not chunk:
+            return
+        yield pd.DataFrame(chunk)
+
+def index_corpus(search_engine, num_documents, seed, chunk_size):
+    """Index the first num_documents synthetic documents, chunk by chunk."""
+    start_time = time.time()
+    stats = search_engine.index_document_stream(synthetic_batches(num_documents, seed, chunk_size))
+    stats['seconds'] = time.time() - start_time
+    return stats
+
+def ground_truth(search_engine, queries, search_type, k):
+    """Exact top-k document ids per query, from a brute-force scan of the backend."""
+    backend = search_engine.vector_store.db
+    vector_models = search_engine.vector_models
+    expected = []
+    for query in queries:
+        if search_type == 'dense':
+            rows = backend.exact_dense_search(vector_models.get_dense_embedding(query), k, fields=())
+        elif search_type == 'sparse':
+            rows = backend.exact_sparse_search(vector_models.get_sparse_embedding(query), k, fields=())
+        else:
+            rows = backend.exact_hybrid_search(
+                vector_models.get_dense_embedding(query),
+                vector_models.get_sparse_embedding(query),
+                k, fields=()
+            )
+        expected.append([row[0] for row in rows])
+    return expected
+
+def measure_recall(search_engine, queries, search_type, k):
+    expected = ground_truth(search_engine, queries, search_type, k)
+    recalls = []
+    for query, expected_ids in zip(queries, expected):
+        if not expected_ids:
+            continue
+        found = search_engine.search(query, search_type=search_type, limit=k, fields=()).ids
+        recalls.append(len(set(found) & set(expected_ids)) / len(expected_ids))
+    return float(np.mean(recalls)) if recalls else None
+
+def run_load(search_engine, queries, search_type, k, concurrency, num_requests):
+    """Issue num_requests searches from concurrency threads; returns throughput and latencies."""
+    def one_request(i):
+        start_time = time.perf_counter()
+        try:
+            search_engine.search(queries[i % len(queries)], search_type=search_type, limit=k, fields=())
+            return time.perf_counter() - start_time, None
+        except Exception as e:
+            return time.perf_counter() - start_time, str(e)
+    
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(one_request, range(num_requests)))
+    wall_time = time.perf_counter() - start_time
+    
+    latencies = np.array([latency for latency, error in outcomes if error is None]) * 1000
+    errors = [error for _, error in outcomes if error is not None]
+    result = {
+        'requests': num_requests,
+        'errors': len(errors),
+        'wall_seconds': wall_time,
+        'qps': len(latencies) / wall_time if wall_time else 0.0
+    }
+    if len(latencies):
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        result.update(mean_ms=latencies.mean(), p50_ms=p50, p95_ms=p95, p99_ms=p99, max_ms=latencies.max())
+    if errors:
+        result['first_error'] = errors[0]
+    return result
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment_config():
+    # Settings that change search behaviour, recorded so results stay comparable
+    names = [
+        'SEARCH_BACKEND', 'DB_POOL_MAX', 'DENSE_MODEL_NAME', 'SPARSE_VECTOR_TYPE', 'SPARSE_DIMENSIONS',
+        'DENSE_INDEX_TYPE', 'DENSE_RERANK_OVERSAMPLE', 'HYBRID_CANDIDATE_MULTIPLIER', 'RRF_K'
+    ]
+    return {name: os.getenv(name) for name in names}
+
+def compare_with_baseline(runs, baseline_path):
+    """Print QPS, p95 and recall changes against a previous results file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    
+    def key(run):
+        return run['documents'], run['search_type'], run['concurrency']
+    baseline_runs = {key(run): run for run in baseline['runs']}
+    
+    print(f"\nCOMPARISON WITH {baseline_path} ({baseline.get('git_revision')})")
+    print("-" * 50)
+    for run in runs:
+        previous = baseline_runs.get(key(run))
+        if previous is None:
+            continue
+        changes = []
+        for metric in ('qps', 'p95_ms', 'recall_at_k'):
+            if run.get(metric) is not None and previous.get(metric):
+                changes.append(f"{metric} {(run[metric] / previous[metric] - 1) * 100:+.1f}%")
+        print(f"  {run['documents']:>9} docs {run['search_type']:<7} c={run['concurrency']:<3} " + ", ".join(changes))
+
+def main():
+    """Main function to run the benchmark suite."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--documents', type=int, nargs='+', default=[10000],
+                        help='Corpus sizes to benchmark, e.g. 10000 100000 1000000')
+    parser.add_argument('--search-types', nargs='+', default=SEARCH_TYPES, choices=SEARCH_TYPES)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=500, help='Searches per concurrency level')
+    parser.add_argument('--queries', type=int, default=200, help='Distinct query texts')
+    parser.add_argument('--recall-queries', type=int, default=50,
+                        help='Queries checked against brute force (0 to skip recall)')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=10000, help='Documents per streamed batch')
+    parser.add_argument('--use-cache', action='store_true',
+                        help='Keep the query embedding cache on (off by default so every request encodes)')
+    parser.add_argument('--output', default=None, help='Results file (default benchmark_results/<timestamp>.json)')
+    parser.add_argument('--baseline', default=None, help='Previous results file to compare against')
+    args = parser.parse_args()
+    
+    print("SEARCH BENCHMARK SUITE")
+    print("=" * 50)
+    print("Synthetic documents are added to the configured index; use a dedicated database")
+    print("(DB_NAME) or SEARCH_BACKEND=memory to keep them apart from real data.\n")
+    
+    search_engine = SearchEngine()
+    if not args.use_cache:
+        search_engine.vector_models.dense_cache.max_size = 0
+        search_engine.vector_models.sparse_cache.max_size = 0
+    queries = generate_synthetic_queries(args.queries, args.seed)
+    runs = []
+    corpora = []
+    
+    try:
+        for num_documents in sorted(args.documents):
+            print(f"Indexing {num_documents} synthetic documents...")
+            index_stats = index_corpus(search_engine, num_documents, args.seed, args.chunk_size)
+            corpus_size = search_engine.vector_store.db.count_documents()
+            corpora.append(dict(index_stats, documents=num_documents, corpus_size=corpus_size))
+            print(f"  {index_stats['indexed']} indexed, {index_stats['unchanged']} unchanged "
+                  f"in {index_stats['seconds']:.1f}s ({corpus_size} documents searchable)")
+            
+            for search_type in args.search_types:
+                recall = None
+                if args.recall_queries:
+                    recall = measure_recall(search_engine, queries[:args.recall_queries], search_type, args.k)
+                
+                for concurrency in args.concurrency:
+                    metrics.reset()
+                    result = run_load(search_engine, queries, search_type, args.k, concurrency, args.requests)
+                    result.update(
+                        documents=num_documents,
+                        corpus_size=corpus_size,
+                        search_type=search_type,
+                        concurrency=concurrency,
+                        k=args.k,
+                        recall_at_k=recall,
+                        stages=metrics.summary()
+                    )
+                    runs.append(result)
+                    recall_text = f"{recall:.4f}" if recall is not None else "n/a"
+                    print(f"  {search_type:<7} c={concurrency:<3} {result['qps']:>8.1f} QPS  "
+                          f"p50 {result.get('p50_ms', 0):.1f}ms  p95 {result.get('p95_ms', 0):.1f}ms  "
+                          f"p99 {result.get('p99_ms', 0):.1f}ms  recall@{args.k} {recall_text}"
+                          + (f"  errors {result['errors']}" if result['errors'] else ""))
+    finally:
+        search_engine.close()
+    
+    output = args.output or os.path.join(
+        'benchmark_results', f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'created_at': datetime.now().isoformat(),
+            'git_revision': git_revision(),
+            'config': environment_config(),
+            'arguments': vars(args),
+            'corpora': corpora,
+            'runs': runs
+        }, f, indent=2, default=float)
+    print(f"\nResults saved to {output}")
+    
+    if args.baseline:
+        compare_with_baseline(runs, args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Bulk Document Loader
+Loads documents with the HNSW indexes dropped, then builds each index once
+with BULK_MAINTENANCE_WORK_MEM and BULK_PARALLEL_WORKERS, reporting progress
+"""
+
+import argparse
+import os
+import time
+import pandas as pd
+from data_preprocessor import DEFAULT_CHUNK_SIZE, read_preprocessed_data, stream_documents
+from search_engine import SearchEngine
+from setup_database import setup_database
+
+def print_progress(index, phase, done, total):
+    percent = f" {done / total * 100:5.1f}%" if total else ""
+    print(f"\r  {index}: {phase} {done}/{total}{percent}", end="", flush=True)
+
+def main():
+    """Main function to run the bulk loader."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--input', default=None,
+                        help='CSV of documents to load (default: the preprocessed Parquet dataset)')
+    parser.add_argument('--from-sources', action='store_true',
+                        help='Stream documents straight from the source files instead of a CSV')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Documents read per batch')
+    parser.add_argument('--batch-size', type=int, default=None, help='Documents per write (INDEX_BATCH_SIZE)')
+    parser.add_argument('--prune', action='store_true', help='Delete documents missing from the input')
+    args = parser.parse_args()
+    
+    print("BULK DOCUMENT LOAD")
+    print("=" * 50)
+    
+    # Documents are streamed in chunks, so memory does not grow with the corpus
+    if args.from_sources:
+        batches = stream_documents(args.chunk_size)
+    elif args.input:
+        batches = pd.read_csv(args.input, chunksize=args.chunk_size)
+    else:
+        batches = read_preprocessed_data(args.chunk_size)
+    
+    if os.getenv('SEARCH_BACKEND', 'postgres') == 'postgres' and not setup_database(vector_indexes=False):
+        print("Database setup failed; check the DB_* settings.")
+        return
+    
+    search_engine = SearchEngine()
+    try:
+        print("Dropping vector indexes and loading documents...")
+        start_time = time.time()
+        with search_engine.bulk_load(progress=print_progress):
+            stats = search_engine.index_document_stream(batches, batch_size=args.batch_size, prune=args.prune)
+            load_time = time.time() - start_time
+            print(f"  {stats['indexed']} indexed, {stats['unchanged']} unchanged, "
+                  f"{stats['deleted']} deleted in {load_time:.1f}s")
+            print("Building vector indexes...")
+        print(f"\nIndexes built in {time.time() - start_time - load_time:.1f}s")
+    finally:
+        search_engine.close()
+
+if __name__ == "__main__":
+    main()
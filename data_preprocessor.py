@@ -1,197 +1,380 @@
 import pandas as pd
 import numpy as np
 import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import random
+from itertools import repeat
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SOURCE_DIR = 'data/financial_reports'
+# Parquet dataset partitioned by document_type (document_type=<type>/part-*.parquet)
+PREPROCESSED_PATH = 'data/preprocessed'
+PREPROCESSED_COLUMNS = ['doc_key', 'title', 'content', 'source', 'document_type']
+DEFAULT_CHUNK_SIZE = 10000
+# Empty means one worker per CPU
+PREPROCESS_WORKERS = int(os.getenv('PREPROCESS_WORKERS') or 0) or os.cpu_count()
+
+def _column(chunk, name, default):
+    """A source column as text, formatted as an f-string would, or default when the file lacks it."""
+    if name in chunk.columns:
+        # Newer pandas keeps missing values as NaN through astype(str)
+        return chunk[name].astype(str).fillna('nan')
+    return pd.Series(default, index=chunk.index)
+
+def _documents(chunk, filepath, start, document_type, title, content):
+    row_numbers = pd.Series(np.arange(start, start + len(chunk)), index=chunk.index).astype(str)
+    return pd.DataFrame({
+        # A file can match more than one source, so the type keeps their keys apart
+        'doc_key': document_type + ':' + filepath + ':' + row_numbers,
+        'title': title,
+        'content': content,
+        'source': filepath,
+        'document_type': document_type
+    }, columns=PREPROCESSED_COLUMNS)
+
+def _stock_documents(chunk, filename, filepath, start):
+    content = (
+        "Stock data: " + filename + " - Date: " + _column(chunk, 'Date', 'Unknown')
+        + " - Price: " + _column(chunk, 'Close', 'N/A') + " - Volume: " + _column(chunk, 'Volume', 'N/A')
+    )
+    return _documents(chunk, filepath, start, 'stock_data', "Stock Data: " + filename, content)
+
+def _transaction_documents(chunk, filename, filepath, start):
+    transaction_id = _column(chunk, 'Transaction_ID', 'Unknown')
+    content = (
+        "Transaction: " + transaction_id + " - Amount: " + _column(chunk, 'Amount', 'N/A')
+        + " - Date: " + _column(chunk, 'Date', 'Unknown')
+    )
+    return _documents(chunk, filepath, start, 'transaction_record', "Transaction Record: " + transaction_id, content)
+
+def _sales_documents(chunk, filename, filepath, start):
+    product = _column(chunk, 'Product', 'Unknown')
+    salesperson = _column(chunk, 'Salesperson', 'Unknown')
+    content = (
+        "Sales Record: " + product + " - Salesperson: " + salesperson
+        + " - Amount: " + _column(chunk, 'Amount', 'N/A')
+    )
+    return _documents(chunk, filepath, start, 'sales_record', "Sales Record: " + product + " - " + salesperson, content)
+
+def _is_stock_file(filename):
+    return filename.endswith('.csv') and 'data' in filename.lower()
+
+def _is_transactions_file(filename):
+    return 'transaction' in filename.lower()
+
+def _is_sales_file(filename):
+    return 'cosmetic' in filename.lower() or 'sales' in filename.lower()
+
+SOURCES = [
+    (_is_stock_file, _stock_documents),
+    (_is_transactions_file, _transaction_documents),
+    (_is_sales_file, _sales_documents)
+]
+
+def _source_tasks():
+    """(builder, filename, path) for every source file, from one walk of SOURCE_DIR and its archive folders."""
+    tasks = []
+    for directory, _, filenames in sorted(os.walk(SOURCE_DIR)):
+        for filename in sorted(filenames):
+            for matches, build in SOURCES:
+                if matches(filename):
+                    tasks.append((build, filename, os.path.join(directory, filename)))
+    return tasks
+
+def _iter_file_documents(build, filename, filepath, chunk_size):
+    """Yield a DataFrame of documents for each chunk of a source CSV file.
+    
+    A file that cannot be read raises rather than being cut short, since a
+    prune would otherwise delete its remaining rows from the index.
+    """
+    start = 0
+    try:
+        for chunk in pd.read_csv(filepath, chunksize=chunk_size):
+            if not chunk.empty:
+                yield build(chunk, filename, filepath, start)
+            start += len(chunk)
+    except Exception as exc:
+        raise ValueError(f"Could not read {filepath} after {start} rows: {exc}") from exc
+
+def _iter_source(build, chunk_size):
+    for task_build, filename, filepath in _source_tasks():
+        if task_build is build:
+            yield from _iter_file_documents(build, filename, filepath, chunk_size)
+
+def iter_stock_data(chunk_size=DEFAULT_CHUNK_SIZE):
+    return _iter_source(_stock_documents, chunk_size)
+
+def iter_transactions_data(chunk_size=DEFAULT_CHUNK_SIZE):
+    return _iter_source(_transaction_documents, chunk_size)
+
+def iter_sales_data(chunk_size=DEFAULT_CHUNK_SIZE):
+    return _iter_source(_sales_documents, chunk_size)
+
+def _records(batches):
+    return [record for batch in batches for record in batch.to_dict('records')]
 
 def preprocess_stock_data():
-    stock_data = []
-    
-    for filename in os.listdir('data/financial_reports'):
-        if filename.endswith('.csv') and 'data' in filename.lower():
-            filepath = os.path.join('data/financial_reports', filename)
-            try:
-                df = pd.read_csv(filepath)
-                if not df.empty:
-                    for _, row in df.iterrows():
-                        content = f"Stock data: {filename} - Date: {row.get('Date', 'Unknown')} - Price: {row.get('Close', 'N/A')} - Volume: {row.get('Volume', 'N/A')}"
-                        stock_data.append({
-                            'title': f"Stock Data: {filename}",
-                            'content': content,
-                            'source': filepath,
-                            'document_type': 'stock_data'
-                        })
-            except Exception:
-                continue
-    
-    return stock_data
+    return _records(iter_stock_data())
 
 def preprocess_transactions_data():
-    transactions_data = []
-    
-    for filename in os.listdir('data/financial_reports'):
-        if 'transaction' in filename.lower():
-            filepath = os.path.join('data/financial_reports', filename)
-            try:
-                df = pd.read_csv(filepath)
-                if not df.empty:
-                    for _, row in df.iterrows():
-                        content = f"Transaction: {row.get('Transaction_ID', 'Unknown')} - Amount: {row.get('Amount', 'N/A')} - Date: {row.get('Date', 'Unknown')}"
-                        transactions_data.append({
-                            'title': f"Transaction Record: {row.get('Transaction_ID', 'Unknown')}",
-                            'content': content,
-                            'source': filepath,
-                            'document_type': 'transaction_record'
-                        })
-            except Exception:
-                continue
-    
-    return transactions_data
+    return _records(iter_transactions_data())
 
 def preprocess_sales_data():
-    sales_data = []
-    
-    for filename in os.listdir('data/financial_reports'):
-        if 'cosmetic' in filename.lower() or 'sales' in filename.lower():
-            filepath = os.path.join('data/financial_reports', filename)
-            try:
-                df = pd.read_csv(filepath)
-                if not df.empty:
-                    for _, row in df.iterrows():
-                        content = f"Sales Record: {row.get('Product', 'Unknown')} - Salesperson: {row.get('Salesperson', 'Unknown')} - Amount: {row.get('Amount', 'N/A')}"
-                        sales_data.append({
-                            'title': f"Sales Record: {row.get('Product', 'Unknown')} - {row.get('Salesperson', 'Unknown')}",
-                            'content': content,
-                            'source': filepath,
-                            'document_type': 'sales_record'
-                        })
-            except Exception:
-                continue
-    
-    return sales_data
+    return _records(iter_sales_data())
 
-def create_synthetic_annual_reports():
-    companies = [
-        "TechCorp Inc.", "Global Manufacturing Ltd.", "Digital Solutions Corp.",
-        "Innovation Systems", "Future Technologies", "Smart Solutions Ltd.",
-        "Advanced Analytics Corp.", "NextGen Industries", "Digital Dynamics",
-        "Innovation Labs", "Tech Solutions Inc.", "Global Innovations",
-        "Digital Enterprises", "Future Systems", "Smart Technologies"
-    ]
-    
-    annual_reports = []
-    
-    for i, company in enumerate(companies):
-        year = 2020 + (i % 4)
-        
-        content = f"""
+def _annual_report(company, year, rng=random):
+    content = f"""
         Annual Report for {company} - {year}
         
         Executive Summary:
-        {company} achieved significant growth in {year} with revenue increasing by {random.randint(15, 35)}% year-over-year. 
+        {company} achieved significant growth in {year} with revenue increasing by {rng.randint(15, 35)}% year-over-year. 
         The company's strategic initiatives in digital transformation and market expansion have yielded positive results.
         
         Financial Performance:
-        - Revenue: ${random.randint(100, 500)}M
-        - Net Income: ${random.randint(10, 50)}M
-        - EBITDA Margin: {random.randint(15, 25)}%
+        - Revenue: ${rng.randint(100, 500)}M
+        - Net Income: ${rng.randint(10, 50)}M
+        - EBITDA Margin: {rng.randint(15, 25)}%
         
         Strategic Initiatives:
-        The company continued its investment in R&D, allocating {random.randint(8, 15)}% of revenue to product development.
-        Market expansion efforts resulted in {random.randint(5, 15)} new partnerships and {random.randint(10, 30)}% increase in market share.
+        The company continued its investment in R&D, allocating {rng.randint(8, 15)}% of revenue to product development.
+        Market expansion efforts resulted in {rng.randint(5, 15)} new partnerships and {rng.randint(10, 30)}% increase in market share.
         
         Risk Factors:
         Market volatility and competitive pressures remain key challenges. Regulatory changes and economic uncertainty
         could impact future performance. The company has implemented comprehensive risk management strategies.
         
         Outlook:
-        {company} expects continued growth in {year + 1} with projected revenue increase of {random.randint(10, 25)}%.
+        {company} expects continued growth in {year + 1} with projected revenue increase of {rng.randint(10, 25)}%.
         The company remains committed to innovation and sustainable business practices.
         """
-        
-        annual_reports.append({
-            'title': f"Annual Report: {company} - {year}",
-            'content': content,
-            'source': 'synthetic',
-            'document_type': 'annual_report'
-        })
     
-    return annual_reports
+    return {
+        'title': f"Annual Report: {company} - {year}",
+        'content': content,
+        'source': 'synthetic',
+        'document_type': 'annual_report'
+    }
 
-def create_synthetic_earnings_calls():
+def create_synthetic_annual_reports():
     companies = [
         "TechCorp Inc.", "Global Manufacturing Ltd.", "Digital Solutions Corp.",
         "Innovation Systems", "Future Technologies", "Smart Solutions Ltd.",
         "Advanced Analytics Corp.", "NextGen Industries", "Digital Dynamics",
-        "Innovation Labs"
+        "Innovation Labs", "Tech Solutions Inc.", "Global Innovations",
+        "Digital Enterprises", "Future Systems", "Smart Technologies"
     ]
     
-    quarters = ["Q1", "Q2", "Q3", "Q4"]
-    years = [2022, 2023, 2024]
+    annual_reports = []
     
-    earnings_calls = []
+    for i, company in enumerate(companies):
+        year = 2020 + (i % 4)
+        annual_report = _annual_report(company, year)
+        annual_report['doc_key'] = f"annual_report:{company}:{year}"
+        annual_reports.append(annual_report)
     
-    for company in companies:
-        for year in years:
-            for quarter in quarters:
-                content = f"""
+    return annual_reports
+
+def _earnings_call(company, quarter, year, rng=random):
+    content = f"""
                 Earnings Call Transcript - {company} {quarter} {year}
                 
                 CEO Opening Remarks:
                 Good afternoon everyone. I'm pleased to report that {company} delivered strong results in {quarter} {year}.
-                Our revenue grew {random.randint(8, 25)}% year-over-year to ${random.randint(50, 200)}M.
+                Our revenue grew {rng.randint(8, 25)}% year-over-year to ${rng.randint(50, 200)}M.
                 
                 Financial Highlights:
-                - Revenue: ${random.randint(50, 200)}M (up {random.randint(8, 25)}% YoY)
-                - EPS: ${random.uniform(0.5, 2.5):.2f} (up {random.randint(10, 30)}% YoY)
-                - Gross Margin: {random.randint(60, 80)}%
+                - Revenue: ${rng.randint(50, 200)}M (up {rng.randint(8, 25)}% YoY)
+                - EPS: ${rng.uniform(0.5, 2.5):.2f} (up {rng.randint(10, 30)}% YoY)
+                - Gross Margin: {rng.randint(60, 80)}%
                 
                 Business Performance:
                 Our core business segments showed solid growth. Digital transformation initiatives contributed
-                {random.randint(15, 35)}% to revenue growth. Customer acquisition costs decreased by {random.randint(5, 15)}%.
+                {rng.randint(15, 35)}% to revenue growth. Customer acquisition costs decreased by {rng.randint(5, 15)}%.
                 
                 Guidance:
-                For {quarter} {year + 1}, we expect revenue of ${random.randint(60, 250)}M to ${random.randint(70, 300)}M.
+                For {quarter} {year + 1}, we expect revenue of ${rng.randint(60, 250)}M to ${rng.randint(70, 300)}M.
                 We remain confident in our long-term growth strategy and market position.
                 
                 Q&A Session:
                 Analyst questions focused on market expansion, competitive landscape, and future investment plans.
                 Management provided detailed responses on strategic initiatives and operational efficiency measures.
                 """
-                
-                earnings_calls.append({
-                    'title': f"Earnings Call: {company} - {quarter} {year}",
-                    'content': content,
-                    'source': 'synthetic',
-                    'document_type': 'earnings_call'
-                })
     
-    return earnings_calls
+    return {
+        'title': f"Earnings Call: {company} - {quarter} {year}",
+        'content': content,
+        'source': 'synthetic',
+        'document_type': 'earnings_call'
+    }
 
-def main():
-    all_documents = []
+def create_synthetic_earnings_calls():
+    companies = [
+        "TechCorp Inc.", "Global Manufacturing Ltd.", "Digital Solutions Corp.",
+        "Innovation Systems", "Future Technologies", "Smart Solutions Ltd.",
+        "Advanced Analytics Corp.", "NextGen Industries", "Digital Dynamics",
+        "Innovation Labs"
+    ]
     
-    stock_data = preprocess_stock_data()
-    all_documents.extend(stock_data)
+    quarters = ["Q1", "Q2", "Q3", "Q4"]
+    years = [2022, 2023, 2024]
     
-    transactions_data = preprocess_transactions_data()
-    all_documents.extend(transactions_data)
+    earnings_calls = []
     
-    sales_data = preprocess_sales_data()
-    all_documents.extend(sales_data)
+    for company in companies:
+        for year in years:
+            for quarter in quarters:
+                earnings_call = _earnings_call(company, quarter, year)
+                earnings_call['doc_key'] = f"earnings_call:{company}:{quarter}:{year}"
+                earnings_calls.append(earnings_call)
+    
+    return earnings_calls
+
+SYNTHETIC_NAME_PARTS = (
+    ["Tech", "Global", "Digital", "Innovation", "Future", "Smart", "Advanced", "NextGen",
+     "Quantum", "Pacific", "Summit", "Atlas", "Northern", "Blue", "Green", "Prime"],
+    ["Corp", "Systems", "Technologies", "Solutions", "Industries", "Dynamics", "Labs",
+     "Analytics", "Manufacturing", "Enterprises", "Holdings", "Networks", "Energy", "Health"],
+    ["Inc.", "Ltd.", "Group", "Co.", "plc", "AG"]
+)
+
+def _synthetic_company(rng):
+    prefixes, cores, suffixes = SYNTHETIC_NAME_PARTS
+    return f"{rng.choice(prefixes)} {rng.choice(cores)} {rng.choice(suffixes)}"
+
+def generate_synthetic_documents(num_documents, seed=0):
+    """Yield num_documents synthetic annual reports and earnings calls.
+    
+    Each document is generated from its own seeded RNG, so a corpus of n
+    documents is a prefix of any larger corpus with the same seed and
+    re-indexing a larger size only adds the new documents. Every document
+    carries a stable doc_key.
+    """
+    for i in range(num_documents):
+        rng = random.Random(f"{seed}:{i}")
+        company = _synthetic_company(rng)
+        year = rng.randint(2015, 2024)
+        if rng.random() < 0.2:
+            document = _annual_report(company, year, rng)
+        else:
+            document = _earnings_call(company, rng.choice(["Q1", "Q2", "Q3", "Q4"]), year, rng)
+        document['doc_key'] = f"synthetic:{seed}:{i}"
+        yield document
+
+def generate_synthetic_queries(num_queries, seed=0):
+    """Financial search queries over the vocabulary of the synthetic documents."""
+    templates = [
+        "{company} revenue growth",
+        "{company} {quarter} {year} earnings call",
+        "annual report {company} {year}",
+        "{quarter} {year} guidance and outlook",
+        "gross margin and EPS {year}",
+        "risk factors market volatility {company}",
+        "R&D investment and product development",
+        "digital transformation revenue contribution",
+        "customer acquisition costs decreased",
+        "market expansion new partnerships"
+    ]
+    rng = random.Random(f"queries:{seed}")
+    return [
+        rng.choice(templates).format(
+            company=_synthetic_company(rng),
+            quarter=rng.choice(["Q1", "Q2", "Q3", "Q4"]),
+            year=rng.randint(2015, 2024)
+        )
+        for _ in range(num_queries)
+    ]
+
+def _synthetic_documents():
+    return pd.DataFrame(
+        create_synthetic_annual_reports() + create_synthetic_earnings_calls(), columns=PREPROCESSED_COLUMNS
+    )
+
+def stream_documents(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield DataFrames of at most chunk_size documents from every source.
     
-    annual_reports = create_synthetic_annual_reports()
-    all_documents.extend(annual_reports)
+    Source files are read chunk by chunk, so memory is bounded by chunk_size
+    rather than by file or corpus size. Every document carries a stable
+    doc_key (document type, source path and row number), so re-running
+    updates documents in place instead of adding copies. A source file that
+    cannot be read raises ValueError.
+    """
+    for build, filename, filepath in _source_tasks():
+        yield from _iter_file_documents(build, filename, filepath, chunk_size)
+    yield _synthetic_documents()
+
+def _write_partitions(documents, directory, name):
+    # document_type is encoded in the partition directory rather than stored in the files
+    for document_type, group in documents.groupby('document_type', sort=False):
+        partition = os.path.join(directory, f"document_type={document_type}")
+        os.makedirs(partition, exist_ok=True)
+        table = pa.Table.from_pandas(group.drop(columns='document_type'), preserve_index=False)
+        pq.write_table(table, os.path.join(partition, f"{name}.parquet"), compression='zstd')
+
+def _preprocess_file(task_id, task, directory, chunk_size):
+    # Workers write their own parts, so documents never travel back through the pool
+    build, filename, filepath = task
+    num_documents = 0
+    for i, documents in enumerate(_iter_file_documents(build, filename, filepath, chunk_size)):
+        _write_partitions(documents, directory, f"part-{task_id:04d}-{i:05d}")
+        num_documents += len(documents)
+    return num_documents
+
+def _dataset():
+    if not os.path.exists(PREPROCESSED_PATH):
+        main()
+    # Memory-mapped, so only the columns read are paged in
+    return ds.dataset(
+        os.path.abspath(PREPROCESSED_PATH),
+        format='parquet',
+        partitioning='hive',
+        filesystem=fs.LocalFileSystem(use_mmap=True)
+    )
+
+def read_preprocessed_data(chunk_size=DEFAULT_CHUNK_SIZE, columns=None):
+    """Yield DataFrames of at most chunk_size preprocessed documents, reading only columns."""
+    for batch in _dataset().to_batches(columns=columns, batch_size=chunk_size):
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+def load_preprocessed_data(columns=None, num_rows=None):
+    """Preprocessed documents as one DataFrame, optionally only some columns or the first num_rows."""
+    dataset = _dataset()
+    if num_rows is None:
+        return dataset.to_table(columns=columns).to_pandas()
+    return dataset.head(num_rows, columns=columns).to_pandas()
+
+def main(chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    tasks = _source_tasks()
+    temp_path = f"{PREPROCESSED_PATH}.tmp"
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
     
-    earnings_calls = create_synthetic_earnings_calls()
-    all_documents.extend(earnings_calls)
+    # One task per source file, run in parallel across PREPROCESS_WORKERS processes
+    with ProcessPoolExecutor(max_workers=workers or PREPROCESS_WORKERS) as executor:
+        counts = executor.map(_preprocess_file, range(len(tasks)), tasks, repeat(temp_path), repeat(chunk_size))
+        num_documents = sum(counts)
     
-    df = pd.DataFrame(all_documents)
+    synthetic = _synthetic_documents()
+    _write_partitions(synthetic, temp_path, "part-synthetic")
+    num_documents += len(synthetic)
     
-    os.makedirs('data', exist_ok=True)
-    df.to_csv('data/preprocessed_data.csv', index=False)
+    # The finished dataset is swapped in so readers never see a partial one
+    old_path = f"{PREPROCESSED_PATH}.old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(PREPROCESSED_PATH):
+        os.replace(PREPROCESSED_PATH, old_path)
+    os.replace(temp_path, PREPROCESSED_PATH)
+    shutil.rmtree(old_path, ignore_errors=True)
     
-    return df
+    return num_documents
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -1,31 +1,363 @@
 import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
 import psycopg2
+import psycopg2.errors
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from scipy.sparse import csr_matrix, issparse
 from dotenv import load_dotenv
+from search_metrics import metrics
 
 load_dotenv()
 
+SPARSE_VECTOR_TYPE = os.getenv('SPARSE_VECTOR_TYPE', 'sparsevec')
+if SPARSE_VECTOR_TYPE not in ('sparsevec', 'vector'):
+    raise ValueError(f"Unknown SPARSE_VECTOR_TYPE: {SPARSE_VECTOR_TYPE}")
+
+# The sparse column dimension also bounds the TF-IDF vocabulary size
+SPARSE_DIMENSIONS = int(os.getenv(
+    'SPARSE_DIMENSIONS',
+    '100000' if SPARSE_VECTOR_TYPE == 'sparsevec' else '1000'
+))
+
+# pgvector's HNSW index rejects sparsevec values with more non-zero elements than this
+SPARSE_MAX_NONZERO = 1000
+
+DENSE_DIMENSIONS = int(os.getenv('DENSE_DIMENSIONS', '384'))
+
+# Full-precision vectors are always stored; these select what the dense HNSW index holds
+DENSE_INDEX_TYPE = os.getenv('DENSE_INDEX_TYPE', 'vector')
+DENSE_INDEX_OPS = {
+    'vector': 'vector_cosine_ops',
+    'halfvec': 'halfvec_cosine_ops',
+    'bit': 'bit_hamming_ops'
+}
+if DENSE_INDEX_TYPE not in DENSE_INDEX_OPS:
+    raise ValueError(f"Unknown DENSE_INDEX_TYPE: {DENSE_INDEX_TYPE}")
+
+# Candidates fetched from a quantized dense index per result, re-ranked at full precision
+DENSE_RERANK_OVERSAMPLE = int(os.getenv('DENSE_RERANK_OVERSAMPLE', '4'))
+
+# HNSW build parameters, shared by the dense and sparse indexes
+HNSW_M = int(os.getenv('HNSW_M', '16'))
+HNSW_EF_CONSTRUCTION = int(os.getenv('HNSW_EF_CONSTRUCTION', '64'))
+
+def quantize_dense(vector_sql, index_type=DENSE_INDEX_TYPE):
+    if index_type == 'halfvec':
+        return f"({vector_sql})::halfvec({DENSE_DIMENSIONS})"
+    if index_type == 'bit':
+        return f"binary_quantize({vector_sql})::bit({DENSE_DIMENSIONS})"
+    return vector_sql
+
+def dense_index_distance(column_sql, query_sql, index_type=DENSE_INDEX_TYPE):
+    """Distance expression matching the dense HNSW index of the given type."""
+    operator = '<~>' if index_type == 'bit' else '<=>'
+    return f"{quantize_dense(column_sql, index_type)} {operator} {quantize_dense(query_sql, index_type)}"
+
+def dense_index_sql(index_type=DENSE_INDEX_TYPE, m=None, ef_construction=None):
+    """CREATE INDEX statement for the dense HNSW index of the given type."""
+    expression = 'vector' if index_type == 'vector' else f"({quantize_dense('vector', index_type)})"
+    return f"""
+        CREATE INDEX IF NOT EXISTS idx_dense_vectors_{index_type}
+        ON dense_vectors
+        USING hnsw ({expression} {DENSE_INDEX_OPS[index_type]})
+        WITH (m = {m or HNSW_M}, ef_construction = {ef_construction or HNSW_EF_CONSTRUCTION});
+    """
+
+def sparse_index_sql(m=None, ef_construction=None):
+    """CREATE INDEX statement for the sparse HNSW index."""
+    return f"""
+        CREATE INDEX IF NOT EXISTS idx_sparse_vectors_vector
+        ON sparse_vectors
+        USING hnsw (vector {SPARSE_VECTOR_TYPE}_cosine_ops)
+        WITH (m = {m or HNSW_M}, ef_construction = {ef_construction or HNSW_EF_CONSTRUCTION});
+    """
+
+def nearest_sql(table, vector_sql, limit_sql, filter_sql=None, exact=False,
+                dense_index_type=DENSE_INDEX_TYPE, dense_oversample=DENSE_RERANK_OVERSAMPLE):
+    """Subquery of the limit_sql (document_id, similarity) rows of table nearest to vector_sql."""
+    filter_join = f"JOIN documents d ON d.id = v.document_id WHERE {filter_sql}" if filter_sql else ""
+    if table == 'dense_vectors' and dense_index_type != 'vector' and not exact:
+        # The quantized index returns an oversampled candidate set, which is
+        # re-ranked with the full-precision vectors
+        return f"""
+            SELECT document_id, 1 - (vector <=> {vector_sql}) as similarity
+            FROM (
+                SELECT v.document_id, v.vector
+                FROM dense_vectors v
+                {filter_join}
+                ORDER BY {dense_index_distance('v.vector', vector_sql, dense_index_type)}
+                LIMIT {limit_sql} * {dense_oversample}
+            ) quantized
+            ORDER BY vector <=> {vector_sql}
+            LIMIT {limit_sql}
+        """
+    # Ordering by similarity instead of distance keeps the planner off the HNSW
+    # index, so an exact scan reads only the rows the filter selects
+    order = 'similarity DESC' if exact else f'v.vector <=> {vector_sql}'
+    return f"""
+        SELECT v.document_id, 1 - (v.vector <=> {vector_sql}) as similarity
+        FROM {table} v
+        {filter_join}
+        ORDER BY {order}
+        LIMIT {limit_sql}
+    """
+
+def _as_csr_row(vector):
+    if issparse(vector):
+        return vector.tocsr()
+    return csr_matrix(np.asarray(vector).reshape(1, -1))
+
+def cap_nonzero(row, limit=SPARSE_MAX_NONZERO):
+    """Keep the limit largest weights of a CSR row, renormalized to unit length."""
+    if row.nnz <= limit:
+        return row
+    keep = np.argpartition(-np.abs(row.data), limit - 1)[:limit]
+    keep = keep[np.argsort(row.indices[keep])]
+    data = row.data[keep]
+    norm = np.linalg.norm(data)
+    if norm:
+        data = data / norm
+    return csr_matrix((data, row.indices[keep], [0, limit]), shape=row.shape)
+
+def to_sparsevec(vector, dimensions=SPARSE_DIMENSIONS):
+    """Format a single-row CSR matrix as a pgvector sparsevec literal (1-based indices).
+    
+    Rows with more than SPARSE_MAX_NONZERO weights keep only the largest ones,
+    so long documents can still be inserted into the HNSW-indexed column.
+    """
+    row = cap_nonzero(_as_csr_row(vector))
+    elements = ','.join(f'{index + 1}:{value}' for index, value in zip(row.indices, row.data))
+    return f'{{{elements}}}/{dimensions}'
+
+def vector_literal(values):
+    return '[' + ','.join(str(value) for value in values) + ']'
+
+def sparse_literal(vector):
+    value = sparse_param(vector)
+    return value if isinstance(value, str) else vector_literal(value)
+
+DOCUMENT_FIELDS = ('title', 'content', 'source', 'document_type', 'created_at')
+DEFAULT_DOCUMENT_FIELDS = ('title', 'content', 'source', 'document_type')
+
+def document_columns(fields=None, snippet_length=None):
+    """SELECT list of d.id plus the requested documents columns, with content optionally truncated."""
+    fields = DEFAULT_DOCUMENT_FIELDS if fields is None else fields
+    columns = ['d.id']
+    for field in fields:
+        if field not in DOCUMENT_FIELDS:
+            raise ValueError(f"Unknown document field: {field}")
+        if field == 'content' and snippet_length is not None:
+            columns.append(f"LEFT(d.content, {int(snippet_length)}) as content")
+        else:
+            columns.append(f"d.{field}")
+    return ', '.join(columns)
+
+FILTER_KEYS = ('document_type', 'source', 'created_after', 'created_before')
+
+def filter_clause(filters):
+    """WHERE conditions on documents d for a filters dict, with their named parameters.
+    
+    ``document_type`` and ``source`` take a value or a list of values;
+    ``created_after`` (inclusive) and ``created_before`` (exclusive) bound created_at.
+    """
+    conditions = []
+    params = {}
+    for key, value in (filters or {}).items():
+        if key not in FILTER_KEYS:
+            raise ValueError(f"Unknown filter: {key}")
+        if value is None:
+            continue
+        
+        param = f"filter_{key}"
+        if key in ('document_type', 'source'):
+            if isinstance(value, str):
+                conditions.append(f"d.{key} = %({param})s")
+                params[param] = value
+            else:
+                conditions.append(f"d.{key} = ANY(%({param})s)")
+                params[param] = list(value)
+        elif key == 'created_after':
+            conditions.append(f"d.created_at >= %({param})s")
+            params[param] = value
+        else:
+            conditions.append(f"d.created_at < %({param})s")
+            params[param] = value
+    return ' AND '.join(conditions), params
+
+def _group_by_query(rows, num_queries):
+    # Rows carry the 1-based query ordinal in their first column
+    grouped = [[] for _ in range(num_queries)]
+    for row in rows:
+        grouped[row[0] - 1].append(row[1:])
+    return grouped
+
+def sparse_param(vector):
+    if SPARSE_VECTOR_TYPE == 'sparsevec':
+        return to_sparsevec(vector)
+    
+    # Legacy vector(n) column: pad to the full column width
+    row = _as_csr_row(vector)
+    dense = np.zeros(SPARSE_DIMENSIONS)
+    dense[row.indices] = row.data
+    return dense.tolist()
+
 class Database:
     def __init__(self):
-        self.conn = psycopg2.connect(
+        self.min_connections = int(os.getenv('DB_POOL_MIN', '1'))
+        self.max_connections = int(os.getenv('DB_POOL_MAX', '10'))
+        self.health_check_interval = float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '30'))
+        self.pool = ThreadedConnectionPool(
+            self.min_connections,
+            self.max_connections,
             dbname=os.getenv('DB_NAME', 'hybrid_search'),
             user=os.getenv('DB_USER', 'postgres'),
             password=os.getenv('DB_PASSWORD'),
             host=os.getenv('DB_HOST', 'localhost'),
             port=os.getenv('DB_PORT', '5432')
         )
-        self.cur = self.conn.cursor()
+        # ThreadedConnectionPool raises when exhausted, so callers wait here instead
+        self._available = threading.BoundedSemaphore(self.max_connections)
+        self._last_used = {}
+        self.hybrid_candidate_multiplier = int(os.getenv('HYBRID_CANDIDATE_MULTIPLIER', '4'))
+        self.rrf_k = int(os.getenv('RRF_K', '60'))
+        self.filter_exact_max_rows = int(os.getenv('FILTER_EXACT_MAX_ROWS', '20000'))
+        self.hnsw_iterative_scan = os.getenv('HNSW_ITERATIVE_SCAN', 'relaxed_order')
+        self._iterative_scan_supported = None
+        self.hnsw_ef_search = int(os.getenv('HNSW_EF_SEARCH', '40'))
+        self.dense_index_type = DENSE_INDEX_TYPE
+        self.dense_oversample = DENSE_RERANK_OVERSAMPLE
+        self.slow_query_threshold = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '500')) / 1000
+        self.explain_sample_rate = float(os.getenv('EXPLAIN_SAMPLE_RATE', '0'))
+        self.bulk_maintenance_work_mem = os.getenv('BULK_MAINTENANCE_WORK_MEM', '1GB')
+        self.bulk_parallel_workers = int(os.getenv('BULK_PARALLEL_WORKERS', '4'))
+    
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(conn)
+        if last_used is not None and time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+    
+    def _checkout(self):
+        conn = self.pool.getconn()
+        if not self._is_healthy(conn):
+            self._discard(conn)
+            conn = self.pool.getconn()
+        return conn
+    
+    def _discard(self, conn):
+        self._last_used.pop(conn, None)
+        self.pool.putconn(conn, close=True)
+    
+    @contextmanager
+    def cursor(self):
+        """Check out a pooled connection and run the block as one transaction."""
+        start_time = time.perf_counter()
+        with self._available:
+            conn = self._checkout()
+            metrics.record('db.checkout', time.perf_counter() - start_time)
+            try:
+                with conn.cursor() as cur:
+                    yield cur
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        pass
+                if conn.closed:
+                    self._discard(conn)
+                    conn = None
+                raise
+            finally:
+                if conn is not None:
+                    self._last_used[conn] = time.monotonic()
+                    self.pool.putconn(conn)
+    
+    def _run(self, work, read_only=False):
+        # A dropped connection is replaced and the unit of work retried once. Writes are only
+        # retried when the connection failed before the work started: a write whose commit
+        # was lost in transit may already have been applied on the server
+        for attempt in range(2):
+            started = False
+            try:
+                with self.cursor() as cur:
+                    started = True
+                    return work(cur)
+            except psycopg2.extensions.QueryCanceledError:
+                raise
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                if attempt == 1 or (started and not read_only):
+                    raise
+    
+    def health_check(self):
+        return self.fetch_one("SELECT 1") == (1,)
     
     def execute(self, query, params=None):
-        self.cur.execute(query, params)
-        self.conn.commit()
+        self._run(lambda cur: cur.execute(query, params))
+    
+    def fetch_one(self, query, params=None, read_only=True):
+        def work(cur):
+            with metrics.timer('db.execute'):
+                cur.execute(query, params)
+            with metrics.timer('db.fetch'):
+                return cur.fetchone()
+        return self._run(work, read_only)
+    
+    def fetch_all(self, query, params=None, read_only=True):
+        def work(cur):
+            with metrics.timer('db.execute'):
+                cur.execute(query, params)
+            with metrics.timer('db.fetch'):
+                return cur.fetchall()
+        return self._run(work, read_only)
+    
+    def _apply_settings(self, cur, settings):
+        # Settings are transaction-local and end with the checkout's transaction
+        for name, value in (settings or {}).items():
+            cur.execute("SELECT set_config(%s, %s, true)", (name, str(value)))
     
-    def fetch_one(self, query, params=None):
-        self.cur.execute(query, params)
-        return self.cur.fetchone()
+    def fetch_all_with_settings(self, query, params=None, settings=None):
+        def work(cur):
+            start_time = time.perf_counter()
+            self._apply_settings(cur, settings)
+            cur.execute(query, params)
+            execute_time = time.perf_counter() - start_time
+            metrics.record('db.execute', execute_time)
+            with metrics.timer('db.fetch'):
+                return cur.fetchall(), execute_time
+        
+        rows, execute_time = self._run(work, read_only=True)
+        if execute_time >= self.slow_query_threshold and random.random() < self.explain_sample_rate:
+            self._capture_plan(query, params, settings, execute_time)
+        return rows
     
-    def fetch_all(self, query, params=None):
-        self.cur.execute(query, params)
-        return self.cur.fetchall()
+    def _capture_plan(self, query, params, settings, seconds):
+        # EXPLAIN ANALYZE runs the query again, which is why only a sample of slow queries is captured
+        def work(cur):
+            self._apply_settings(cur, settings)
+            cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query}", params)
+            return '\n'.join(row[0] for row in cur.fetchall())
+        
+        try:
+            plan = self._run(work, read_only=True)
+        except psycopg2.Error:
+            return
+        metrics.record_slow_query(query, seconds, plan)
     
     def store_document(self, title, content, source, document_type):
         query = """
@@ -33,7 +365,7 @@ class Database:
             VALUES (%s, %s, %s, %s)
             RETURNING id
         """
-        result = self.fetch_one(query, (title, content, source, document_type))
+        result = self.fetch_one(query, (title, content, source, document_type), read_only=False)
         return result[0]
     
     def store_dense_vector(self, document_id, vector):
@@ -44,64 +376,499 @@ class Database:
         self.execute(query, (document_id, vector.tolist()))
     
     def store_sparse_vector(self, document_id, vector):
-        query = """
+        query = f"""
             INSERT INTO sparse_vectors (document_id, vector)
-            VALUES (%s, %s::vector)
+            VALUES (%s, %s::{SPARSE_VECTOR_TYPE})
         """
-        self.execute(query, (document_id, vector.tolist()))
+        self.execute(query, (document_id, sparse_param(vector)))
     
-    def dense_search(self, query_vector, limit=10):
-        query = """
-            SELECT d.id, d.title, d.content, d.source, d.document_type,
-                   1 - (dv.vector <=> %s::vector) as similarity
-            FROM documents d
-            JOIN dense_vectors dv ON d.id = dv.document_id
-            ORDER BY dv.vector <=> %s::vector
-            LIMIT %s
+    def store_documents_batch(self, documents, dense_vectors, sparse_vectors):
+        """Upsert (doc_key, content_hash, title, content, source, document_type) rows with their vectors."""
+        documents = list(documents)
+        if not documents:
+            return []
+        
+        dense_vectors = [vector.tolist() for vector in dense_vectors]
+        sparse_vectors = [sparse_param(vector) for vector in sparse_vectors]
+        
+        def work(cur):
+            rows = execute_values(
+                cur,
+                """
+                INSERT INTO documents (doc_key, content_hash, title, content, source, document_type)
+                VALUES %s
+                ON CONFLICT (doc_key) DO UPDATE SET
+                    content_hash = EXCLUDED.content_hash,
+                    title = EXCLUDED.title,
+                    content = EXCLUDED.content,
+                    source = EXCLUDED.source,
+                    document_type = EXCLUDED.document_type
+                RETURNING doc_key, id
+                """,
+                documents,
+                page_size=len(documents),
+                fetch=True
+            )
+            ids_by_key = dict(rows)
+            document_ids = [ids_by_key[document[0]] for document in documents]
+            
+            # Updated documents replace their previous vectors
+            cur.execute("DELETE FROM dense_vectors WHERE document_id = ANY(%s)", (document_ids,))
+            cur.execute("DELETE FROM sparse_vectors WHERE document_id = ANY(%s)", (document_ids,))
+            
+            execute_values(
+                cur,
+                "INSERT INTO dense_vectors (document_id, vector) VALUES %s",
+                list(zip(document_ids, dense_vectors)),
+                template="(%s, %s::vector)",
+                page_size=len(documents)
+            )
+            execute_values(
+                cur,
+                "INSERT INTO sparse_vectors (document_id, vector) VALUES %s",
+                list(zip(document_ids, sparse_vectors)),
+                template=f"(%s, %s::{SPARSE_VECTOR_TYPE})",
+                page_size=len(documents)
+            )
+            return document_ids
+        
+        return self._run(work)
+    
+    def replace_sparse_vectors(self, document_ids, sparse_vectors):
+        document_ids = list(document_ids)
+        if not document_ids:
+            return
+        
+        sparse_vectors = [sparse_param(vector) for vector in sparse_vectors]
+        
+        def work(cur):
+            cur.execute("DELETE FROM sparse_vectors WHERE document_id = ANY(%s)", (document_ids,))
+            execute_values(
+                cur,
+                "INSERT INTO sparse_vectors (document_id, vector) VALUES %s",
+                list(zip(document_ids, sparse_vectors)),
+                template=f"(%s, %s::{SPARSE_VECTOR_TYPE})",
+                page_size=len(document_ids)
+            )
+        
+        self._run(work)
+    
+    def fetch_document_hashes(self, doc_keys):
+        rows = self.fetch_all(
+            "SELECT doc_key, id, content_hash FROM documents WHERE doc_key = ANY(%s)",
+            (list(doc_keys),)
+        )
+        return {doc_key: (document_id, content_hash) for doc_key, document_id, content_hash in rows}
+    
+    def fetch_document_contents(self, after_id=0, limit=1000):
+        """(id, doc_key, content) of up to limit documents with id > after_id, in id order."""
+        return self.fetch_all(
+            "SELECT id, doc_key, content FROM documents WHERE id > %s ORDER BY id LIMIT %s",
+            (after_id, limit)
+        )
+    
+    def delete_documents_except(self, doc_keys, batch_size=10000):
+        """Delete documents whose doc_key is missing from doc_keys, including legacy rows without a key."""
+        keys = [(doc_key,) for doc_key in set(doc_keys)]
+        
+        # The anti-join runs in SQL against the incoming keys, so stored rows never leave the server
+        def work(cur):
+            cur.execute("CREATE TEMP TABLE incoming_keys (doc_key TEXT PRIMARY KEY) ON COMMIT DROP")
+            execute_values(cur, "INSERT INTO incoming_keys (doc_key) VALUES %s", keys, page_size=batch_size)
+            cur.execute("ANALYZE incoming_keys")
+            cur.execute("""
+                CREATE TEMP TABLE stale_ids ON COMMIT DROP AS
+                SELECT d.id FROM documents d
+                WHERE NOT EXISTS (SELECT 1 FROM incoming_keys k WHERE k.doc_key = d.doc_key)
+            """)
+            cur.execute("DELETE FROM dense_vectors WHERE document_id IN (SELECT id FROM stale_ids)")
+            cur.execute("DELETE FROM sparse_vectors WHERE document_id IN (SELECT id FROM stale_ids)")
+            cur.execute("DELETE FROM documents WHERE id IN (SELECT id FROM stale_ids)")
+            return cur.rowcount
+        
+        return self._run(work)
+    
+    def save_sparse_model(self, terms, idf):
+        def work(cur):
+            cur.execute(
+                "INSERT INTO sparse_models (terms, idf) VALUES (%s, %s) RETURNING id",
+                (terms, idf)
+            )
+            model_id = cur.fetchone()[0]
+            # Only the latest model matches the stored sparse vectors
+            cur.execute("DELETE FROM sparse_models WHERE id < %s", (model_id,))
+            return model_id
+        return self._run(work)
+    
+    def load_sparse_model(self):
+        try:
+            return self.fetch_one("SELECT id, terms, idf FROM sparse_models ORDER BY id DESC LIMIT 1")
+        except psycopg2.errors.UndefinedTable:
+            return None
+    
+    def has_documents(self):
+        return self.fetch_one("SELECT EXISTS (SELECT 1 FROM sparse_vectors)")[0]
+    
+    def count_documents(self):
+        return self.fetch_one("SELECT COUNT(*) FROM documents")[0]
+    
+    def _vector_indexes(self):
+        return [
+            (f"idx_dense_vectors_{self.dense_index_type}", 'dense_vectors', dense_index_sql(self.dense_index_type)),
+            ('idx_sparse_vectors_vector', 'sparse_vectors', sparse_index_sql())
+        ]
+    
+    def has_vector_indexes(self):
+        names = [name for name, _, _ in self._vector_indexes()]
+        return self.fetch_one(
+            "SELECT bool_and(to_regclass(name) IS NOT NULL) FROM unnest(%s::text[]) AS name", (names,)
+        )[0]
+    
+    def drop_vector_indexes(self):
+        # Every dense index type is dropped, since any HNSW index left in place
+        # makes each insert pay for a graph update
+        names = [f"idx_dense_vectors_{index_type}" for index_type in DENSE_INDEX_OPS]
+        names.append('idx_sparse_vectors_vector')
+        
+        def work(cur):
+            for name in names:
+                cur.execute(f"DROP INDEX IF EXISTS {name}")
+        self._run(work)
+    
+    def build_vector_indexes(self, progress=None, poll_interval=1.0):
+        """Create the HNSW indexes in one pass each; returns build seconds per index.
+        
+        Builds run with BULK_MAINTENANCE_WORK_MEM and BULK_PARALLEL_WORKERS
+        parallel maintenance workers. ``progress(index, phase, done, total)`` is
+        called every ``poll_interval`` seconds from pg_stat_progress_create_index.
         """
-        return self.fetch_all(query, (query_vector.tolist(), query_vector.tolist(), limit))
+        settings = {
+            'maintenance_work_mem': self.bulk_maintenance_work_mem,
+            'max_parallel_maintenance_workers': self.bulk_parallel_workers
+        }
+        timings = {}
+        for name, table, create_sql in self._vector_indexes():
+            def work(cur):
+                self._apply_settings(cur, settings)
+                cur.execute(create_sql)
+            
+            finished = threading.Event()
+            poller = None
+            if progress is not None:
+                poller = threading.Thread(
+                    target=self._poll_index_progress,
+                    args=(name, table, progress, finished, poll_interval),
+                    daemon=True
+                )
+                poller.start()
+            
+            start_time = time.time()
+            try:
+                self._run(work)
+            finally:
+                finished.set()
+                if poller is not None:
+                    poller.join()
+            timings[name] = time.time() - start_time
+        return timings
     
-    def sparse_search(self, query_vector, limit=10):
+    def _poll_index_progress(self, name, table, progress, finished, interval):
+        # Runs on a second pooled connection while the build holds the first
         query = """
-            SELECT d.id, d.title, d.content, d.source, d.document_type,
-                   1 - (sv.vector <=> %s::vector) as similarity
-            FROM documents d
-            JOIN sparse_vectors sv ON d.id = sv.document_id
-            ORDER BY sv.vector <=> %s::vector
-            LIMIT %s
+            SELECT phase, blocks_done, blocks_total, tuples_done, tuples_total
+            FROM pg_stat_progress_create_index
+            WHERE relid = to_regclass(%s)
         """
-        return self.fetch_all(query, (query_vector.tolist(), query_vector.tolist(), limit))
+        while not finished.wait(interval):
+            try:
+                row = self.fetch_one(query, (table,))
+            except psycopg2.Error:
+                return
+            if row is None:
+                continue
+            phase, blocks_done, blocks_total, tuples_done, tuples_total = row
+            # HNSW builds report tuples loaded; other phases only count blocks
+            if tuples_total:
+                progress(name, phase, tuples_done, tuples_total)
+            else:
+                progress(name, phase, blocks_done, blocks_total)
     
-    def hybrid_search(self, dense_vector, sparse_vector, limit=10, dense_weight=0.5):
-        query = """
-            WITH dense_scores AS (
-                SELECT d.id, d.title, d.content, d.source, d.document_type,
-                       1 - (dv.vector <=> %s::vector) as dense_similarity
-                FROM documents d
-                JOIN dense_vectors dv ON d.id = dv.document_id
-            ),
-            sparse_scores AS (
-                SELECT d.id, 1 - (sv.vector <=> %s::vector) as sparse_similarity
-                FROM documents d
-                JOIN sparse_vectors sv ON d.id = sv.document_id
-            )
-            SELECT 
-                ds.id, ds.title, ds.content, ds.source, ds.document_type,
-                (ds.dense_similarity * %s + ss.sparse_similarity * %s) as similarity
-            FROM dense_scores ds
-            JOIN sparse_scores ss ON ds.id = ss.id
-            ORDER BY similarity DESC
-            LIMIT %s
+    def _documents_query(self, ranked_query, fields=None, snippet_length=None):
+        # Documents are joined only for the ranked ids, reading just the projected columns
+        return f"""
+            SELECT {document_columns(fields, snippet_length)}, r.similarity
+            FROM ({ranked_query}) r
+            JOIN documents d ON d.id = r.document_id
+            ORDER BY r.similarity DESC
+        """
+    
+    def _documents_query_many(self, query_source, ranked_query, fields=None, snippet_length=None):
+        return f"""
+            SELECT q.ord, {document_columns(fields, snippet_length)}, r.similarity
+            FROM {query_source}
+            CROSS JOIN LATERAL ({ranked_query}) r
+            JOIN documents d ON d.id = r.document_id
+            ORDER BY q.ord, r.similarity DESC
+        """
+    
+    def _nearest(self, table, vector_sql, limit_sql, filter_sql=None, exact=False):
+        return nearest_sql(
+            table, vector_sql, limit_sql, filter_sql, exact, self.dense_index_type, self.dense_oversample
+        )
+    
+    def _scan_settings(self, num_rows, exact=False, ef_search=None):
+        # An HNSW scan returns at most ef_search rows, so it must cover num_rows;
+        # a larger ef_search trades latency for recall
+        if exact:
+            return {}
+        ef_search = max(num_rows, ef_search or self.hnsw_ef_search)
+        return {'hnsw.ef_search': min(ef_search, 1000)}
+    
+    def _dense_scan_settings(self, num_rows, exact=False, ef_search=None):
+        if self.dense_index_type != 'vector':
+            num_rows *= self.dense_oversample
+        return self._scan_settings(num_rows, exact, ef_search)
+    
+    def _hybrid_plan(self, dense_sql, sparse_sql, limit, dense_weight, candidate_multiplier, fusion,
+                     filter_sql=None, exact=False, ef_search=None):
+        """Return the ranked hybrid subquery, its parameters and transaction settings."""
+        if candidate_multiplier is None:
+            candidate_multiplier = self.hybrid_candidate_multiplier
+        if fusion not in ('weighted', 'rrf'):
+            raise ValueError(f"Unknown fusion method: {fusion}")
+        
+        params = {
+            'limit': limit,
+            'dense_weight': dense_weight,
+            'sparse_weight': 1 - dense_weight,
+            'rrf_k': self.rrf_k
+        }
+        
+        if fusion == 'weighted' and (candidate_multiplier <= 0 or exact):
+            # Exhaustive: every (matching) row of both tables is scored
+            filter_join = f"JOIN documents d ON d.id = dv.document_id WHERE {filter_sql}" if filter_sql else ""
+            ranked = f"""
+                SELECT 
+                    dv.document_id,
+                    ((1 - (dv.vector <=> {dense_sql})) * %(dense_weight)s +
+                     (1 - (sv.vector <=> {sparse_sql})) * %(sparse_weight)s) as similarity
+                FROM dense_vectors dv
+                JOIN sparse_vectors sv ON sv.document_id = dv.document_id
+                {filter_join}
+                ORDER BY similarity DESC
+                LIMIT %(limit)s
+            """
+            return ranked, params, {}
+        
+        num_candidates = limit * max(candidate_multiplier, 1)
+        params['num_candidates'] = num_candidates
+        settings = self._dense_scan_settings(num_candidates, exact, ef_search)
+        dense_candidates = self._nearest('dense_vectors', dense_sql, '%(num_candidates)s', filter_sql, exact)
+        sparse_candidates = self._nearest('sparse_vectors', sparse_sql, '%(num_candidates)s', filter_sql, exact)
+        
+        if fusion == 'rrf':
+            # Each ranked list comes from its own index scan; documents are merged by
+            # rank alone, so no cross-table similarity needs to be computed.
+            ranked = f"""
+                SELECT 
+                    COALESCE(dr.document_id, sr.document_id) as document_id,
+                    COALESCE(1.0 / (%(rrf_k)s + dr.rank), 0) +
+                    COALESCE(1.0 / (%(rrf_k)s + sr.rank), 0) as similarity
+                FROM (
+                    SELECT document_id, ROW_NUMBER() OVER (ORDER BY similarity DESC) as rank
+                    FROM ({dense_candidates}) dense_candidates
+                ) dr
+                FULL OUTER JOIN (
+                    SELECT document_id, ROW_NUMBER() OVER (ORDER BY similarity DESC) as rank
+                    FROM ({sparse_candidates}) sparse_candidates
+                ) sr ON dr.document_id = sr.document_id
+                ORDER BY similarity DESC
+                LIMIT %(limit)s
+            """
+        else:
+            # Stage 1 takes the top candidates from each HNSW index; stage 2 scores
+            # the other side for the union of those ids only.
+            ranked = f"""
+                SELECT 
+                    c.document_id,
+                    ((1 - (dv.vector <=> {dense_sql})) * %(dense_weight)s +
+                     (1 - (sv.vector <=> {sparse_sql})) * %(sparse_weight)s) as similarity
+                FROM (
+                    SELECT document_id FROM ({dense_candidates}) dense_candidates
+                    UNION
+                    SELECT document_id FROM ({sparse_candidates}) sparse_candidates
+                ) c
+                JOIN dense_vectors dv ON dv.document_id = c.document_id
+                JOIN sparse_vectors sv ON sv.document_id = c.document_id
+                ORDER BY similarity DESC
+                LIMIT %(limit)s
+            """
+        return ranked, params, settings
+    
+    def _is_selective(self, filter_sql, filter_params):
+        # Counting stops past the threshold, so broad filters cost at most that many index reads
+        query = f"""
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM documents d WHERE {filter_sql} LIMIT %(max_rows)s
+            ) matching
         """
-        sparse_weight = 1 - dense_weight
-        return self.fetch_all(query, (
-            dense_vector.tolist(),
-            sparse_vector.tolist(),
-            dense_weight,
-            sparse_weight,
-            limit
-        ))
+        params = dict(filter_params, max_rows=self.filter_exact_max_rows + 1)
+        return self.fetch_one(query, params)[0] <= self.filter_exact_max_rows
+    
+    def supports_iterative_scan(self):
+        """Whether the installed pgvector (0.8+) has hnsw.iterative_scan; checked once."""
+        if self._iterative_scan_supported is None:
+            row = self.fetch_one("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+            if row is None:
+                # Not installed yet (setup_database creates it); check again next time
+                return False
+            version = tuple(int(part) for part in re.findall(r'\d+', row[0])[:2])
+            self._iterative_scan_supported = version >= (0, 8)
+        return self._iterative_scan_supported
+    
+    def _filtered_search(self, build, filters, limit, num_queries=None):
+        """Run the query from build(filter_sql, exact) with the filter strategy that fits.
+        
+        Filters matching few documents are applied first and the matching rows are
+        scanned exactly. Broader filters use an HNSW scan that keeps reading the
+        index until enough rows pass the filter (pgvector iterative index scans).
+        Before pgvector 0.8 the scan instead over-fetches the most candidates
+        hnsw.ef_search allows.
+        """
+        filter_sql, filter_params = filter_clause(filters)
+        exact = bool(filter_sql) and self._is_selective(filter_sql, filter_params)
+        
+        def run(exact):
+            query, params, settings = build(filter_sql, exact)
+            params.update(filter_params)
+            if filter_sql and not exact:
+                if self.supports_iterative_scan():
+                    settings = dict(settings, **{'hnsw.iterative_scan': self.hnsw_iterative_scan})
+                else:
+                    # The hnsw.* setting would be rejected; the filter sees ef_search candidates at most
+                    settings = dict(settings, **{'hnsw.ef_search': 1000})
+            rows = self.fetch_all_with_settings(query, params, settings=settings)
+            return [rows] if num_queries is None else _group_by_query(rows, num_queries)
+        
+        results = run(exact)
+        # An iterative scan gives up after hnsw.max_scan_tuples; the exact scan always fills limit
+        if filter_sql and not exact and any(len(rows) < limit for rows in results):
+            results = run(True)
+        return results[0] if num_queries is None else results
+    
+    def dense_search(self, query_vector, limit=10, fields=None, snippet_length=None, filters=None,
+                     ef_search=None):
+        def build(filter_sql, exact):
+            ranked = self._nearest('dense_vectors', '%(dense)s::vector', '%(limit)s', filter_sql, exact)
+            query = self._documents_query(ranked, fields, snippet_length)
+            settings = self._dense_scan_settings(limit, exact, ef_search)
+            return query, {'dense': query_vector.tolist(), 'limit': limit}, settings
+        return self._filtered_search(build, filters, limit)
+    
+    def sparse_search(self, query_vector, limit=10, fields=None, snippet_length=None, filters=None,
+                      ef_search=None):
+        def build(filter_sql, exact):
+            ranked = self._nearest(
+                'sparse_vectors', f'%(sparse)s::{SPARSE_VECTOR_TYPE}', '%(limit)s', filter_sql, exact
+            )
+            query = self._documents_query(ranked, fields, snippet_length)
+            settings = self._scan_settings(limit, exact, ef_search)
+            return query, {'sparse': sparse_param(query_vector), 'limit': limit}, settings
+        return self._filtered_search(build, filters, limit)
+    
+    def hybrid_search(self, dense_vector, sparse_vector, limit=10, dense_weight=0.5,
+                      candidate_multiplier=None, fusion='weighted', fields=None, snippet_length=None,
+                      filters=None, ef_search=None):
+        def build(filter_sql, exact):
+            ranked, params, settings = self._hybrid_plan(
+                '%(dense)s::vector', f'%(sparse)s::{SPARSE_VECTOR_TYPE}',
+                limit, dense_weight, candidate_multiplier, fusion, filter_sql, exact, ef_search
+            )
+            params.update(dense=dense_vector.tolist(), sparse=sparse_param(sparse_vector))
+            return self._documents_query(ranked, fields, snippet_length), params, settings
+        return self._filtered_search(build, filters, limit)
+    
+    def exact_dense_search(self, query_vector, limit=10, fields=None, snippet_length=None, filters=None):
+        # Brute-force scan without the HNSW index, used as recall ground truth
+        def build(filter_sql, exact):
+            ranked = self._nearest('dense_vectors', '%(dense)s::vector', '%(limit)s', filter_sql, exact=True)
+            query = self._documents_query(ranked, fields, snippet_length)
+            return query, {'dense': query_vector.tolist(), 'limit': limit}, {}
+        return self._filtered_search(build, filters, limit)
+    
+    def exact_sparse_search(self, query_vector, limit=10, fields=None, snippet_length=None, filters=None):
+        def build(filter_sql, exact):
+            ranked = self._nearest(
+                'sparse_vectors', f'%(sparse)s::{SPARSE_VECTOR_TYPE}', '%(limit)s', filter_sql, exact=True
+            )
+            query = self._documents_query(ranked, fields, snippet_length)
+            return query, {'sparse': sparse_param(query_vector), 'limit': limit}, {}
+        return self._filtered_search(build, filters, limit)
+    
+    def rrf_hybrid_search(self, dense_vector, sparse_vector, limit=10, candidate_multiplier=None,
+                          fields=None, snippet_length=None, filters=None, ef_search=None):
+        return self.hybrid_search(
+            dense_vector, sparse_vector, limit, candidate_multiplier=candidate_multiplier,
+            fusion='rrf', fields=fields, snippet_length=snippet_length, filters=filters, ef_search=ef_search
+        )
+    
+    def exact_hybrid_search(self, dense_vector, sparse_vector, limit=10, dense_weight=0.5,
+                            fields=None, snippet_length=None, filters=None):
+        return self.hybrid_search(
+            dense_vector, sparse_vector, limit, dense_weight, candidate_multiplier=0,
+            fields=fields, snippet_length=snippet_length, filters=filters
+        )
+    
+    def dense_search_many(self, query_vectors, limit=10, fields=None, snippet_length=None, filters=None,
+                          ef_search=None):
+        vectors = [vector_literal(vector.tolist()) for vector in query_vectors]
+        
+        def build(filter_sql, exact):
+            query = self._documents_query_many(
+                "unnest(%(dense)s::text[]) WITH ORDINALITY AS q(dense, ord)",
+                self._nearest('dense_vectors', 'q.dense::vector', '%(limit)s', filter_sql, exact),
+                fields, snippet_length
+            )
+            return query, {'dense': vectors, 'limit': limit}, self._dense_scan_settings(limit, exact, ef_search)
+        return self._filtered_search(build, filters, limit, len(vectors))
+    
+    def sparse_search_many(self, query_vectors, limit=10, fields=None, snippet_length=None, filters=None,
+                           ef_search=None):
+        vectors = [sparse_literal(vector) for vector in query_vectors]
+        
+        def build(filter_sql, exact):
+            query = self._documents_query_many(
+                "unnest(%(sparse)s::text[]) WITH ORDINALITY AS q(sparse, ord)",
+                self._nearest('sparse_vectors', f'q.sparse::{SPARSE_VECTOR_TYPE}', '%(limit)s', filter_sql, exact),
+                fields, snippet_length
+            )
+            return query, {'sparse': vectors, 'limit': limit}, self._scan_settings(limit, exact, ef_search)
+        return self._filtered_search(build, filters, limit, len(vectors))
+    
+    def hybrid_search_many(self, dense_vectors, sparse_vectors, limit=10, dense_weight=0.5,
+                           candidate_multiplier=None, fusion='weighted', fields=None, snippet_length=None,
+                           filters=None, ef_search=None):
+        dense_vectors = [vector_literal(vector.tolist()) for vector in dense_vectors]
+        sparse_vectors = [sparse_literal(vector) for vector in sparse_vectors]
+        
+        # The same per-query plans as hybrid_search, run for every query vector
+        # pair through one LATERAL join
+        def build(filter_sql, exact):
+            ranked, params, settings = self._hybrid_plan(
+                'q.dense::vector', f'q.sparse::{SPARSE_VECTOR_TYPE}',
+                limit, dense_weight, candidate_multiplier, fusion, filter_sql, exact, ef_search
+            )
+            params.update(dense=dense_vectors, sparse=sparse_vectors)
+            query = self._documents_query_many(
+                "unnest(%(dense)s::text[], %(sparse)s::text[]) WITH ORDINALITY AS q(dense, sparse, ord)",
+                ranked, fields, snippet_length
+            )
+            return query, params, settings
+        return self._filtered_search(build, filters, limit, len(dense_vectors))
+    
+    def fetch_documents(self, document_ids, fields=None):
+        query = f"SELECT {document_columns(fields)} FROM documents d WHERE d.id = ANY(%s)"
+        return self.fetch_all(query, (list(document_ids),))
     
     def close(self):
-        self.cur.close()
-        self.conn.close()
\ No newline at end of file
+        self.pool.closeall()
\ No newline at end of file
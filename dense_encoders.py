@@ -0,0 +1,163 @@
+import hashlib
+import os
+import numpy as np
+
+DENSE_BACKENDS = ('torch', 'int8', 'onnx')
+ONNX_MODEL_DIR = os.getenv('ONNX_MODEL_DIR', 'models')
+
+def _set_torch_threads(threads):
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+def _encode_pool_worker(model, threads, input_queue, results_queue):
+    # Runs in each spawned worker, so the cap never touches the parent process
+    _set_torch_threads(threads)
+    type(model)._encode_multi_process_worker('cpu', model, input_queue, results_queue)
+
+def start_encode_pool(model, workers, threads):
+    """A sentence-transformers encode pool of CPU workers, each limited to ``threads`` intra-op threads.
+    
+    The returned pool works with the model's ``encode_multi_process`` and
+    ``stop_multi_process_pool``.
+    """
+    import multiprocessing
+    context = multiprocessing.get_context('spawn')
+    input_queue = context.Queue()
+    output_queue = context.Queue()
+    processes = []
+    for _ in range(workers):
+        process = context.Process(
+            target=_encode_pool_worker, args=(model, threads, input_queue, output_queue), daemon=True
+        )
+        process.start()
+        processes.append(process)
+    return {'input': input_queue, 'output': output_queue, 'processes': processes}
+
+def load_torch_encoder(model_name, threads=None):
+    from sentence_transformers import SentenceTransformer
+    _set_torch_threads(threads)
+    return SentenceTransformer(model_name)
+
+def weights_fingerprint(model):
+    """Hash of a dense encoder's weights; int8 and onnx encoders carry the hash of their source model."""
+    fingerprint = getattr(model, 'fingerprint', None)
+    if fingerprint is not None:
+        return fingerprint
+    digest = hashlib.sha256()
+    for name, tensor in sorted(model.state_dict().items()):
+        digest.update(name.encode('utf-8'))
+        digest.update(tensor.detach().cpu().numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+def load_int8_encoder(model_name, threads=None):
+    """The sentence-transformers model with its Linear layers dynamically quantized to int8 (CPU only)."""
+    import torch
+    model = load_torch_encoder(model_name, threads).to('cpu')
+    quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    quantized.fingerprint = weights_fingerprint(model)
+    return quantized
+
+def onnx_model_path(model_name):
+    return os.path.join(ONNX_MODEL_DIR, f"{model_name.replace('/', '_')}.onnx")
+
+def export_onnx(model, path):
+    """Export the transformer of a sentence-transformers model; the graph outputs token embeddings."""
+    import torch
+    transformer = model._first_module().auto_model.to('cpu').eval()
+    features = model.tokenizer(["export"], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in features]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + ['token_embeddings']}
+    
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(features[name] for name in input_names),
+            temp_path,
+            input_names=input_names,
+            output_names=['token_embeddings'],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+    os.replace(temp_path, path)
+
+class OnnxEncoder:
+    """Runs an exported ONNX graph of a sentence-transformers model with onnxruntime.
+    
+    Tokenization and pooling follow the reference model, so embeddings match
+    its ``encode`` output; the graph is exported on first use.
+    """
+    
+    def __init__(self, model_name, path=None, threads=None):
+        import onnxruntime
+        from sentence_transformers import SentenceTransformer
+        
+        reference = SentenceTransformer(model_name, device='cpu')
+        pooling = reference[1]
+        if pooling.pooling_mode_mean_tokens:
+            self.pooling = 'mean'
+        elif pooling.pooling_mode_cls_token:
+            self.pooling = 'cls'
+        else:
+            raise ValueError(f"Unsupported pooling for ONNX encoding: {pooling.get_pooling_mode_str()}")
+        self.fingerprint = weights_fingerprint(reference)
+        self.tokenizer = reference.tokenizer
+        self.max_seq_length = reference.max_seq_length
+        
+        self.path = path or onnx_model_path(model_name)
+        if not os.path.exists(self.path):
+            export_onnx(reference, self.path)
+        
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(self.path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+    
+    def _pool(self, token_embeddings, attention_mask):
+        if self.pooling == 'cls':
+            return token_embeddings[:, 0]
+        mask = attention_mask[:, :, None].astype(token_embeddings.dtype)
+        return (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    
+    def encode(self, sentences, batch_size=32, **kwargs):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        
+        embeddings = []
+        for start in range(0, len(sentences), batch_size):
+            features = self.tokenizer(
+                list(sentences[start:start + batch_size]),
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors='np'
+            )
+            inputs = {name: features[name].astype(np.int64) for name in self.input_names}
+            token_embeddings = self.session.run(None, inputs)[0]
+            embeddings.append(self._pool(token_embeddings, features['attention_mask']))
+        
+        embeddings = np.vstack(embeddings).astype(np.float32)
+        return embeddings[0] if single else embeddings
+
+def load_dense_encoder(model_name, backend='torch', threads=None):
+    """Dense encoder for backend, with a ``SentenceTransformer.encode``-compatible ``encode``."""
+    if backend == 'torch':
+        return load_torch_encoder(model_name, threads)
+    if backend == 'int8':
+        return load_int8_encoder(model_name, threads)
+    if backend == 'onnx':
+        return OnnxEncoder(model_name, threads=threads)
+    raise ValueError(f"Unknown DENSE_BACKEND: {backend}")
+
+def cosine_parity(reference, embeddings):
+    """Row-wise cosine similarity between two embedding matrices."""
+    reference = np.asarray(reference, dtype=np.float32)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return np.sum(reference * embeddings, axis=1)
@@ -0,0 +1,140 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import numpy as np
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+class EmbeddingStore:
+    """Persistent dense embeddings keyed by content hash and model version.
+    
+    Vectors of each model are appended to a float32 file in ``path`` that is
+    read through a memory map; a SQLite index maps (model, content hash) to
+    the vector's row. Vectors are written before their index rows, so an
+    interrupted write leaves at most unreferenced rows at the end of the file.
+    One process should write to a store at a time.
+    """
+    
+    def __init__(self, path, model_key):
+        self.path = path
+        self.model_key = model_key
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(os.path.join(path, 'index.sqlite3'), check_same_thread=False)
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS models (
+                id INTEGER PRIMARY KEY,
+                model_key TEXT UNIQUE NOT NULL,
+                dimensions INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model_id INTEGER NOT NULL,
+                content_hash BLOB NOT NULL,
+                row INTEGER NOT NULL,
+                PRIMARY KEY (model_id, content_hash)
+            ) WITHOUT ROWID;
+        """)
+        self._connection.execute("INSERT OR IGNORE INTO models (model_key) VALUES (?)", (model_key,))
+        self._connection.commit()
+        self._model_id, self.dimensions = self._connection.execute(
+            "SELECT id, dimensions FROM models WHERE model_key = ?", (model_key,)
+        ).fetchone()
+        self._vectors_path = os.path.join(path, f"vectors_{self._model_id}.f32")
+        self._vectors = None
+    
+    def _rows(self):
+        if self.dimensions is None or not os.path.exists(self._vectors_path):
+            return 0
+        return os.path.getsize(self._vectors_path) // (self.dimensions * 4)
+    
+    def _mapped(self, rows):
+        # Appends grow the file, so the map is reopened once it no longer covers a row
+        if self._vectors is None or self._vectors.shape[0] < rows:
+            self._vectors = np.memmap(
+                self._vectors_path, dtype=np.float32, mode='r', shape=(self._rows(), self.dimensions)
+            )
+        return self._vectors
+    
+    def _lookup(self, hashes):
+        found = []
+        # Under SQLite's default limit of 999 bound parameters
+        for start in range(0, len(hashes), 900):
+            chunk = hashes[start:start + 900]
+            found.extend(self._connection.execute(
+                f"SELECT content_hash, row FROM embeddings WHERE model_id = ? "
+                f"AND content_hash IN ({','.join('?' * len(chunk))})",
+                [self._model_id] + chunk
+            ))
+        return [(bytes(key), row) for key, row in found]
+    
+    def get_many(self, hashes):
+        """Stored vectors for the given content hashes, as a dict of hash to vector."""
+        hashes = list(set(hashes))
+        with self._lock:
+            if self.dimensions is None or not hashes:
+                return {}
+            found = self._lookup(hashes)
+            if not found:
+                return {}
+            
+            rows = np.array([row for _, row in found])
+            vectors = np.array(self._mapped(rows.max() + 1)[rows])
+        return {key: vector for (key, _), vector in zip(found, vectors)}
+    
+    def put_many(self, hashes, vectors):
+        """Store vectors under their content hashes; hashes already stored are skipped."""
+        if not len(hashes):
+            return 0
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+                self._connection.execute(
+                    "UPDATE models SET dimensions = ? WHERE id = ?", (self.dimensions, self._model_id)
+                )
+                self._connection.commit()
+            elif vectors.shape[1] != self.dimensions:
+                raise ValueError(
+                    f"Expected {self.dimensions}-dimensional vectors for {self.model_key}, "
+                    f"got {vectors.shape[1]}"
+                )
+            
+            stored = {key for key, _ in self._lookup(list(set(hashes)))}
+            new = {}
+            for key, vector in zip(hashes, vectors):
+                if key not in stored and key not in new:
+                    new[key] = vector
+            if not new:
+                return 0
+            
+            first_row = self._rows()
+            with open(self._vectors_path, 'ab') as f:
+                # Drops a partial row left by an interrupted write
+                f.truncate(first_row * self.dimensions * 4)
+                f.write(np.stack(list(new.values())).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO embeddings (model_id, content_hash, row) VALUES (?, ?, ?)",
+                [(self._model_id, key, first_row + i) for i, key in enumerate(new)]
+            )
+            self._connection.commit()
+            return len(new)
+    
+    def stats(self):
+        with self._lock:
+            entries = self._connection.execute(
+                "SELECT COUNT(*) FROM embeddings WHERE model_id = ?", (self._model_id,)
+            ).fetchone()[0]
+            return {
+                'model_key': self.model_key,
+                'entries': entries,
+                'bytes': os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+            }
+    
+    def close(self):
+        with self._lock:
+            self._vectors = None
+            self._connection.close()
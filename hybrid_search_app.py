@@ -1,10 +1,14 @@
 import streamlit as st
 import pandas as pd
 import time
+import numpy as np
 import plotly.graph_objects as go
 from search_engine import SearchEngine
-from data_preprocessor import main as preprocess_data
-import os
+from search_results import SearchResults
+from data_preprocessor import load_preprocessed_data, read_preprocessed_data
+
+# Content is truncated in SQL; the expanders never show more than this
+SNIPPET_LENGTH = 200
 
 st.set_page_config(
     page_title="Hybrid Search System",
@@ -17,23 +21,23 @@ def load_search_engine():
     return SearchEngine()
 
 @st.cache_data
-def load_preprocessed_data():
-    if not os.path.exists('data/preprocessed_data.csv'):
-        preprocess_data()
-    return pd.read_csv('data/preprocessed_data.csv')
+def load_document_types():
+    # Only the column the filter needs; documents are streamed when indexing
+    document_types = load_preprocessed_data(columns=['document_type'])['document_type']
+    return sorted(document_types.dropna().unique())
 
-def index_documents(search_engine, documents_df):
+def index_documents(search_engine):
     with st.spinner("Indexing documents..."):
-        search_engine.index_documents(documents_df)
+        return search_engine.index_document_stream(read_preprocessed_data())
 
-def display_search_results(results_df, search_type):
-    if results_df.empty:
+def display_search_results(results, search_type):
+    if results.empty:
         st.warning("No results found.")
         return
     
     st.subheader(f"{search_type} Search Results")
     
-    for idx, row in results_df.head(5).iterrows():
+    for row in results[:5]:
         with st.expander(f"{row['title'][:80]}..."):
             st.write(f"**Source:** {row['source']}")
             st.write(f"**Type:** {row['document_type']}")
@@ -43,9 +47,9 @@ def display_search_results(results_df, search_type):
 def create_performance_comparison(dense_results, sparse_results, hybrid_results):
     methods = ['Dense', 'Sparse', 'Hybrid']
     avg_similarities = [
-        dense_results['similarity'].mean() if not dense_results.empty else 0,
-        sparse_results['similarity'].mean() if not sparse_results.empty else 0,
-        hybrid_results['similarity'].mean() if not hybrid_results.empty else 0
+        np.mean(dense_results.similarities) if not dense_results.empty else 0,
+        np.mean(sparse_results.similarities) if not sparse_results.empty else 0,
+        np.mean(hybrid_results.similarities) if not hybrid_results.empty else 0
     ]
     
     fig = go.Figure(data=[
@@ -65,14 +69,28 @@ def main():
     st.title("Hybrid Search System")
     
     search_engine = load_search_engine()
-    documents_df = load_preprocessed_data()
+    all_document_types = load_document_types()
     
     with st.sidebar:
         st.header("Configuration")
         
+        if search_engine.documents_indexed:
+            st.caption("An existing index is loaded and ready to search.")
+        
+        if search_engine.vector_indexes_missing:
+            st.warning("Vector indexes are missing, probably from an interrupted bulk load, "
+                       "so searches run as slow exact scans.")
+            if st.button("Build Vector Indexes"):
+                with st.spinner("Building vector indexes..."):
+                    timings = search_engine.build_vector_indexes()
+                st.success(f"Vector indexes built in {sum(timings.values()):.1f}s")
+        
         if st.button("Index Documents"):
-            index_documents(search_engine, documents_df)
-            st.success("Documents indexed successfully!")
+            stats = index_documents(search_engine)
+            st.success(
+                f"Documents indexed successfully! "
+                f"{stats['indexed']} new or changed, {stats['unchanged']} unchanged."
+            )
         
         st.subheader("Search Settings")
         search_type = st.selectbox(
@@ -83,10 +101,23 @@ def main():
         
         limit = st.slider("Number of Results", 1, 20, 5)
         
+        document_types = st.multiselect(
+            "Document Types",
+            all_document_types,
+            help="Only return documents of these types (all types when empty)"
+        )
+        filters = {'document_type': document_types} if document_types else None
+        
+        fusion = "Weighted"
+        dense_weight = 0.5
         if search_type == "Hybrid":
-            dense_weight = st.slider("Dense Weight", 0.0, 1.0, 0.5, 0.1)
-        else:
-            dense_weight = 0.5
+            fusion = st.selectbox(
+                "Fusion Method",
+                ["Weighted", "RRF"],
+                help="Weighted: Blend similarity scores, RRF: Merge dense and sparse rankings by rank"
+            )
+            if fusion == "Weighted":
+                dense_weight = st.slider("Dense Weight", 0.0, 1.0, 0.5, 0.1)
     
     st.header("Search Interface")
     
@@ -105,13 +136,18 @@ def main():
                     query, 
                     search_type='hybrid', 
                     limit=limit, 
-                    dense_weight=dense_weight
+                    dense_weight=dense_weight,
+                    fusion=fusion.lower(),
+                    snippet_length=SNIPPET_LENGTH,
+                    filters=filters
                 )
             else:
                 results = search_engine.search(
                     query, 
                     search_type=search_type.lower(), 
-                    limit=limit
+                    limit=limit,
+                    snippet_length=SNIPPET_LENGTH,
+                    filters=filters
                 )
             
             search_time = time.time() - start_time
@@ -120,15 +156,23 @@ def main():
         display_search_results(results, search_type)
         
         with st.expander("Detailed Results"):
-            st.dataframe(results, use_container_width=True)
+            st.dataframe(results.to_dataframe(), use_container_width=True)
+        
+        with st.expander("Latency Breakdown"):
+            # Percentiles over all searches in this session, by stage
+            st.dataframe(
+                pd.DataFrame.from_dict(search_engine.latency_stats(), orient='index'),
+                use_container_width=True
+            )
     
     st.subheader("Performance Comparison")
     
     if st.button("Compare All Search Methods"):
         with st.spinner("Running comparison..."):
-            dense_results = search_engine.search(query, 'dense', limit) if query else pd.DataFrame()
-            sparse_results = search_engine.search(query, 'sparse', limit) if query else pd.DataFrame()
-            hybrid_results = search_engine.search(query, 'hybrid', limit, 0.5) if query else pd.DataFrame()
+            # Only similarities are compared, so no document columns are fetched
+            dense_results = search_engine.search(query, 'dense', limit, fields=()) if query else SearchResults()
+            sparse_results = search_engine.search(query, 'sparse', limit, fields=()) if query else SearchResults()
+            hybrid_results = search_engine.search(query, 'hybrid', limit, 0.5, fields=()) if query else SearchResults()
             
             create_performance_comparison(dense_results, sparse_results, hybrid_results)
             
@@ -139,9 +183,9 @@ def main():
                 if not results.empty:
                     comparison_data.append({
                         'Method': method,
-                        'Avg Similarity': results['similarity'].mean(),
-                        'Max Similarity': results['similarity'].max(),
-                        'Min Similarity': results['similarity'].min(),
+                        'Avg Similarity': np.mean(results.similarities),
+                        'Max Similarity': max(results.similarities),
+                        'Min Similarity': min(results.similarities),
                         'Result Count': len(results)
                     })
             
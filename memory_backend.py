@@ -0,0 +1,515 @@
+import json
+import os
+import threading
+from datetime import datetime
+import numpy as np
+from scipy.sparse import csr_matrix, load_npz, save_npz, vstack
+from database import (
+    DEFAULT_DOCUMENT_FIELDS, DOCUMENT_FIELDS, FILTER_KEYS, SPARSE_DIMENSIONS, _as_csr_row
+)
+
+def top_k(scores, k):
+    """Indices of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+def _sparse_row(vector):
+    # Rows are kept at the full column width, as in the sparse_vectors table
+    row = _as_csr_row(vector)
+    return csr_matrix(
+        (row.data.astype(np.float32), row.indices, row.indptr),
+        shape=(1, SPARSE_DIMENSIONS)
+    )
+
+def _validate_fields(fields):
+    fields = DEFAULT_DOCUMENT_FIELDS if fields is None else tuple(fields)
+    for field in fields:
+        if field not in DOCUMENT_FIELDS:
+            raise ValueError(f"Unknown document field: {field}")
+    return fields
+
+def _write_atomic(path, write):
+    # Memory-mapped readers keep the old file; the new one replaces it in one rename
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        write(f)
+    os.replace(temp_path, path)
+
+class MemoryBackend:
+    """In-process search backend with the same storage and search methods as Database.
+    
+    Dense vectors are a float32 matrix and TF-IDF vectors a CSR matrix with one
+    row per document. Searches are exact matrix products with argpartition top-k,
+    which suits small corpora and tests that should not need a pgvector server.
+    With ``path`` (MEMORY_BACKEND_PATH) every write appends a segment holding
+    only the rows it touched; segments are merged into the base files when
+    the index is loaded (or on ``compact``), and the base dense matrix is
+    memory-mapped.
+    """
+    
+    def __init__(self, path=None):
+        self.path = path or os.getenv('MEMORY_BACKEND_PATH') or None
+        self.hybrid_candidate_multiplier = int(os.getenv('HYBRID_CANDIDATE_MULTIPLIER', '4'))
+        self.rrf_k = int(os.getenv('RRF_K', '60'))
+        self._lock = threading.RLock()
+        self._rows = []
+        self._dense_rows = []
+        self._sparse_rows = []
+        self._positions = {}
+        self._next_id = 1
+        self._sparse_model = None
+        self._state = None
+        self._segment = 0
+        
+        if self.path is not None:
+            os.makedirs(self.path, exist_ok=True)
+            self._load()
+    
+    def _file(self, name):
+        return os.path.join(self.path, name)
+    
+    def _segment_files(self):
+        return sorted(
+            name for name in os.listdir(self.path) if name.startswith('segment_') and name.endswith('.npz')
+        )
+    
+    def _load(self):
+        if os.path.exists(self._file('documents.json')):
+            with open(self._file('documents.json'), encoding='utf-8') as f:
+                stored = json.load(f)
+            self._next_id = stored['next_id']
+            self._rows = stored['rows']
+            for row in self._rows:
+                row['created_at'] = datetime.fromisoformat(row['created_at'])
+            self._positions = {row['id']: position for position, row in enumerate(self._rows)}
+            
+            if self._rows:
+                dense = np.load(self._file('dense.npy'), mmap_mode='r')
+                sparse = load_npz(self._file('sparse.npz')).tocsr()
+                self._dense_rows = list(dense)
+                self._sparse_rows = [sparse[position] for position in range(sparse.shape[0])]
+                self._state = self._build_state(dense, sparse)
+        
+        segments = self._segment_files()
+        if segments:
+            for name in segments:
+                self._replay(name)
+            self._state = None
+            self.compact()
+        
+        if os.path.exists(self._file('sparse_model.json')):
+            with open(self._file('sparse_model.json'), encoding='utf-8') as f:
+                model = json.load(f)
+            self._sparse_model = (model['id'], model['terms'], model['idf'])
+    
+    def _replay(self, name):
+        # Rows are logged whole, so replaying a segment twice gives the same index
+        with np.load(self._file(name)) as segment:
+            stored = json.loads(segment['meta'].tobytes().decode('utf-8'))
+            dense = segment['dense']
+            has_dense = segment['has_dense']
+            sparse = csr_matrix(
+                (segment['sparse_data'], segment['sparse_indices'], segment['sparse_indptr']),
+                shape=(len(stored['rows']), SPARSE_DIMENSIONS)
+            )
+        
+        self._next_id = max(self._next_id, stored['next_id'])
+        for i, row in enumerate(stored['rows']):
+            row['created_at'] = datetime.fromisoformat(row['created_at'])
+            position = self._positions.get(row['id'])
+            if position is None:
+                position = len(self._rows)
+                self._positions[row['id']] = position
+                self._rows.append(row)
+                self._dense_rows.append(None)
+                self._sparse_rows.append(None)
+            else:
+                self._rows[position] = row
+            self._dense_rows[position] = dense[i] if has_dense[i] else None
+            self._sparse_rows[position] = sparse[i]
+        self._remove(set(stored['deleted']))
+    
+    def _log(self, document_ids=(), deleted=()):
+        """Append a segment with the current rows of document_ids and the deleted ids."""
+        if self.path is None:
+            return
+        
+        positions = [self._positions[document_id] for document_id in document_ids]
+        dense_rows = [self._dense_rows[position] for position in positions]
+        dimensions = next((len(row) for row in dense_rows if row is not None), 0)
+        dense = np.zeros((len(positions), dimensions), dtype=np.float32)
+        for i, row in enumerate(dense_rows):
+            if row is not None:
+                dense[i] = row
+        sparse = vstack([self._sparse_rows[position] for position in positions], format='csr') if positions \
+            else csr_matrix((0, SPARSE_DIMENSIONS), dtype=np.float32)
+        
+        rows = [dict(self._rows[position], created_at=self._rows[position]['created_at'].isoformat())
+                for position in positions]
+        payload = json.dumps({'next_id': self._next_id, 'rows': rows, 'deleted': list(deleted)}).encode('utf-8')
+        self._segment += 1
+        _write_atomic(self._file(f"segment_{self._segment:08d}.npz"), lambda f: np.savez(
+            f,
+            meta=np.frombuffer(payload, dtype=np.uint8),
+            dense=dense,
+            has_dense=np.array([row is not None for row in dense_rows], dtype=bool),
+            sparse_data=sparse.data,
+            sparse_indices=sparse.indices,
+            sparse_indptr=sparse.indptr
+        ))
+    
+    def compact(self):
+        """Rewrite the base files with the whole index and drop the segments they replace."""
+        if self.path is None:
+            return
+        
+        with self._lock:
+            state = self._snapshot()
+            rows = [dict(row, created_at=row['created_at'].isoformat()) for row in self._rows]
+            payload = json.dumps({'next_id': self._next_id, 'rows': rows}).encode('utf-8')
+            _write_atomic(self._file('dense.npy'), lambda f: np.save(f, state['dense']))
+            _write_atomic(self._file('sparse.npz'), lambda f: save_npz(f, state['sparse']))
+            # Written last, so a reader never sees rows without their vectors; segments left
+            # by a crash before they are removed are replayed again harmlessly
+            _write_atomic(self._file('documents.json'), lambda f: f.write(payload))
+            for name in self._segment_files():
+                os.remove(self._file(name))
+            self._segment = 0
+    
+    def _build_state(self, dense, sparse):
+        return {
+            'rows': list(self._rows),
+            'dense': dense,
+            'sparse': sparse,
+            'document_type': np.array([row['document_type'] for row in self._rows], dtype=object),
+            'source': np.array([row['source'] for row in self._rows], dtype=object),
+            'created_at': np.array([row['created_at'] for row in self._rows], dtype='datetime64[us]')
+        }
+    
+    def _snapshot(self):
+        # Matrices are rebuilt after writes; searches share one snapshot until the next write
+        with self._lock:
+            if self._state is None:
+                dimensions = next((len(row) for row in self._dense_rows if row is not None), 0)
+                dense = np.vstack([
+                    row if row is not None else np.zeros(dimensions, dtype=np.float32)
+                    for row in self._dense_rows
+                ]).astype(np.float32) if self._rows else np.empty((0, dimensions), dtype=np.float32)
+                sparse = vstack(self._sparse_rows, format='csr') if self._rows \
+                    else csr_matrix((0, SPARSE_DIMENSIONS), dtype=np.float32)
+                self._state = self._build_state(dense, sparse)
+            return self._state
+    
+    def _append(self, doc_key, content_hash, title, content, source, document_type):
+        document_id = self._next_id
+        self._next_id += 1
+        self._positions[document_id] = len(self._rows)
+        self._rows.append({
+            'id': document_id,
+            'doc_key': doc_key,
+            'content_hash': content_hash,
+            'title': title,
+            'content': content,
+            'source': source,
+            'document_type': document_type,
+            'created_at': datetime.now()
+        })
+        self._dense_rows.append(None)
+        self._sparse_rows.append(csr_matrix((1, SPARSE_DIMENSIONS), dtype=np.float32))
+        return document_id
+    
+    def health_check(self):
+        return True
+    
+    def store_document(self, title, content, source, document_type):
+        with self._lock:
+            document_id = self._append(None, None, title, content, source, document_type)
+            self._state = None
+            self._log([document_id])
+        return document_id
+    
+    def store_dense_vector(self, document_id, vector):
+        with self._lock:
+            self._dense_rows[self._positions[document_id]] = np.asarray(vector, dtype=np.float32)
+            self._state = None
+            self._log([document_id])
+    
+    def store_sparse_vector(self, document_id, vector):
+        with self._lock:
+            self._sparse_rows[self._positions[document_id]] = _sparse_row(vector)
+            self._state = None
+            self._log([document_id])
+    
+    def store_documents_batch(self, documents, dense_vectors, sparse_vectors):
+        """Upsert (doc_key, content_hash, title, content, source, document_type) rows with their vectors."""
+        documents = list(documents)
+        if not documents:
+            return []
+        
+        with self._lock:
+            ids_by_key = {row['doc_key']: row['id'] for row in self._rows if row['doc_key'] is not None}
+            document_ids = []
+            for document, dense_vector, sparse_vector in zip(documents, dense_vectors, sparse_vectors):
+                doc_key = document[0]
+                if doc_key in ids_by_key:
+                    document_id = ids_by_key[doc_key]
+                    row = self._rows[self._positions[document_id]]
+                    row.update(zip(('content_hash', 'title', 'content', 'source', 'document_type'), document[1:]))
+                else:
+                    document_id = self._append(*document)
+                    ids_by_key[doc_key] = document_id
+                
+                position = self._positions[document_id]
+                self._dense_rows[position] = np.asarray(dense_vector, dtype=np.float32)
+                self._sparse_rows[position] = _sparse_row(sparse_vector)
+                document_ids.append(document_id)
+            
+            self._state = None
+            self._log(dict.fromkeys(document_ids))
+        return document_ids
+    
+    def replace_sparse_vectors(self, document_ids, sparse_vectors):
+        with self._lock:
+            for document_id, sparse_vector in zip(document_ids, sparse_vectors):
+                self._sparse_rows[self._positions[document_id]] = _sparse_row(sparse_vector)
+            self._state = None
+            self._log(dict.fromkeys(document_ids))
+    
+    def fetch_document_hashes(self, doc_keys):
+        doc_keys = set(doc_keys)
+        with self._lock:
+            return {
+                row['doc_key']: (row['id'], row['content_hash'])
+                for row in self._rows if row['doc_key'] in doc_keys
+            }
+    
+    def fetch_document_contents(self, after_id=0, limit=1000):
+        with self._lock:
+            rows = sorted((row for row in self._rows if row['id'] > after_id), key=lambda row: row['id'])
+            return [(row['id'], row['doc_key'], row['content']) for row in rows[:limit]]
+    
+    def delete_documents_except(self, doc_keys, batch_size=None):
+        doc_keys = set(doc_keys)
+        with self._lock:
+            deleted = [row['id'] for row in self._rows if row['doc_key'] not in doc_keys]
+            if deleted:
+                self._remove(set(deleted))
+                self._log(deleted=deleted)
+        return len(deleted)
+    
+    def _remove(self, document_ids):
+        keep = [position for position, row in enumerate(self._rows) if row['id'] not in document_ids]
+        if len(keep) == len(self._rows):
+            return
+        self._rows = [self._rows[position] for position in keep]
+        self._dense_rows = [self._dense_rows[position] for position in keep]
+        self._sparse_rows = [self._sparse_rows[position] for position in keep]
+        self._positions = {row['id']: position for position, row in enumerate(self._rows)}
+        self._state = None
+    
+    def save_sparse_model(self, terms, idf):
+        with self._lock:
+            model_id = self._sparse_model[0] + 1 if self._sparse_model else 1
+            self._sparse_model = (model_id, list(terms), list(idf))
+            if self.path is not None:
+                payload = json.dumps({'id': model_id, 'terms': list(terms), 'idf': list(idf)}).encode('utf-8')
+                _write_atomic(self._file('sparse_model.json'), lambda f: f.write(payload))
+        return model_id
+    
+    def load_sparse_model(self):
+        return self._sparse_model
+    
+    def has_documents(self):
+        return bool(self._rows)
+    
+    def count_documents(self):
+        return len(self._rows)
+    
+    # Scores are computed by brute force, so there are no vector indexes to defer
+    def has_vector_indexes(self):
+        return True
+    
+    def drop_vector_indexes(self):
+        pass
+    
+    def build_vector_indexes(self, progress=None, poll_interval=1.0):
+        return {}
+    
+    def _matching(self, state, filters):
+        """Positions of the documents that pass filters, or None for all of them."""
+        if not filters:
+            return None
+        
+        mask = np.ones(len(state['rows']), dtype=bool)
+        for key, value in filters.items():
+            if key not in FILTER_KEYS:
+                raise ValueError(f"Unknown filter: {key}")
+            if value is None:
+                continue
+            
+            if key in ('document_type', 'source'):
+                values = [value] if isinstance(value, str) else list(value)
+                mask &= np.isin(state[key], np.array(values, dtype=object))
+            elif key == 'created_after':
+                mask &= state['created_at'] >= np.datetime64(value, 'us')
+            else:
+                mask &= state['created_at'] < np.datetime64(value, 'us')
+        return np.flatnonzero(mask)
+    
+    def _dense_scores(self, state, positions, query_vectors):
+        # Stored and query vectors are L2-normalized, so the dot product is cosine similarity
+        matrix = state['dense'] if positions is None else state['dense'][positions]
+        queries = np.asarray(query_vectors, dtype=np.float32).reshape(len(query_vectors), -1)
+        return np.asarray(matrix @ queries.T)
+    
+    def _sparse_scores(self, state, positions, query_vectors):
+        matrix = state['sparse'] if positions is None else state['sparse'][positions]
+        queries = vstack([_sparse_row(vector) for vector in query_vectors], format='csr')
+        return (matrix @ queries.T).toarray()
+    
+    def _hybrid_rank(self, dense_scores, sparse_scores, limit, dense_weight, candidate_multiplier, fusion):
+        if candidate_multiplier is None:
+            candidate_multiplier = self.hybrid_candidate_multiplier
+        if fusion not in ('weighted', 'rrf'):
+            raise ValueError(f"Unknown fusion method: {fusion}")
+        
+        if fusion == 'weighted' and candidate_multiplier <= 0:
+            scores = dense_scores * dense_weight + sparse_scores * (1 - dense_weight)
+            top = top_k(scores, limit)
+            return top, scores[top]
+        
+        # Same candidate sets as the two-stage SQL plans in Database
+        num_candidates = limit * max(candidate_multiplier, 1)
+        dense_top = top_k(dense_scores, num_candidates)
+        sparse_top = top_k(sparse_scores, num_candidates)
+        candidates = np.union1d(dense_top, sparse_top)
+        
+        if fusion == 'rrf':
+            scores = np.zeros(len(dense_scores))
+            scores[dense_top] += 1.0 / (self.rrf_k + np.arange(1, len(dense_top) + 1))
+            scores[sparse_top] += 1.0 / (self.rrf_k + np.arange(1, len(sparse_top) + 1))
+            scores = scores[candidates]
+        else:
+            scores = dense_scores[candidates] * dense_weight + sparse_scores[candidates] * (1 - dense_weight)
+        top = top_k(scores, limit)
+        return candidates[top], scores[top]
+    
+    def _rows_for(self, state, positions, ranked, similarities, fields, snippet_length):
+        results = []
+        for index, similarity in zip(ranked, similarities):
+            row = state['rows'][index if positions is None else positions[index]]
+            values = [row[field] for field in fields]
+            if snippet_length is not None and 'content' in fields:
+                content_index = fields.index('content')
+                if values[content_index] is not None:
+                    values[content_index] = values[content_index][:snippet_length]
+            results.append((row['id'], *values, float(similarity)))
+        return results
+    
+    def _search_many(self, rank, num_queries, fields, snippet_length, filters):
+        """Rank every query with rank(state, positions, query_index) -> (indices, similarities)."""
+        fields = _validate_fields(fields)
+        state = self._snapshot()
+        if not state['rows']:
+            return [[] for _ in range(num_queries)]
+        positions = self._matching(state, filters)
+        results = []
+        for query_index in range(num_queries):
+            ranked, similarities = rank(state, positions, query_index)
+            results.append(self._rows_for(state, positions, ranked, similarities, fields, snippet_length))
+        return results
+    
+    # ef_search is accepted for interface parity with Database; every search here is exact
+    def dense_search(self, query_vector, limit=10, fields=None, snippet_length=None, filters=None,
+                     ef_search=None):
+        return self.dense_search_many([query_vector], limit, fields, snippet_length, filters)[0]
+    
+    def sparse_search(self, query_vector, limit=10, fields=None, snippet_length=None, filters=None,
+                      ef_search=None):
+        return self.sparse_search_many([query_vector], limit, fields, snippet_length, filters)[0]
+    
+    def hybrid_search(self, dense_vector, sparse_vector, limit=10, dense_weight=0.5,
+                      candidate_multiplier=None, fusion='weighted', fields=None, snippet_length=None,
+                      filters=None, ef_search=None):
+        return self.hybrid_search_many(
+            [dense_vector], [sparse_vector], limit, dense_weight, candidate_multiplier, fusion,
+            fields, snippet_length, filters
+        )[0]
+    
+    def exact_dense_search(self, query_vector, limit=10, fields=None, snippet_length=None, filters=None):
+        # Every search here is already exact
+        return self.dense_search(query_vector, limit, fields, snippet_length, filters)
+    
+    def exact_sparse_search(self, query_vector, limit=10, fields=None, snippet_length=None, filters=None):
+        return self.sparse_search(query_vector, limit, fields, snippet_length, filters)
+    
+    def rrf_hybrid_search(self, dense_vector, sparse_vector, limit=10, candidate_multiplier=None,
+                          fields=None, snippet_length=None, filters=None, ef_search=None):
+        return self.hybrid_search(
+            dense_vector, sparse_vector, limit, candidate_multiplier=candidate_multiplier,
+            fusion='rrf', fields=fields, snippet_length=snippet_length, filters=filters
+        )
+    
+    def exact_hybrid_search(self, dense_vector, sparse_vector, limit=10, dense_weight=0.5,
+                            fields=None, snippet_length=None, filters=None):
+        return self.hybrid_search(
+            dense_vector, sparse_vector, limit, dense_weight, candidate_multiplier=0,
+            fields=fields, snippet_length=snippet_length, filters=filters
+        )
+    
+    def dense_search_many(self, query_vectors, limit=10, fields=None, snippet_length=None, filters=None,
+                          ef_search=None):
+        query_vectors = list(query_vectors)
+        scores = {}
+        
+        def rank(state, positions, query_index):
+            if 'dense' not in scores:
+                scores['dense'] = self._dense_scores(state, positions, query_vectors)
+            column = scores['dense'][:, query_index]
+            top = top_k(column, limit)
+            return top, column[top]
+        return self._search_many(rank, len(query_vectors), fields, snippet_length, filters)
+    
+    def sparse_search_many(self, query_vectors, limit=10, fields=None, snippet_length=None, filters=None,
+                           ef_search=None):
+        query_vectors = list(query_vectors)
+        scores = {}
+        
+        def rank(state, positions, query_index):
+            if 'sparse' not in scores:
+                scores['sparse'] = self._sparse_scores(state, positions, query_vectors)
+            column = scores['sparse'][:, query_index]
+            top = top_k(column, limit)
+            return top, column[top]
+        return self._search_many(rank, len(query_vectors), fields, snippet_length, filters)
+    
+    def hybrid_search_many(self, dense_vectors, sparse_vectors, limit=10, dense_weight=0.5,
+                           candidate_multiplier=None, fusion='weighted', fields=None, snippet_length=None,
+                           filters=None, ef_search=None):
+        dense_vectors = list(dense_vectors)
+        sparse_vectors = list(sparse_vectors)
+        scores = {}
+        
+        def rank(state, positions, query_index):
+            # All queries are scored with one matrix product per model
+            if not scores:
+                scores['dense'] = self._dense_scores(state, positions, dense_vectors)
+                scores['sparse'] = self._sparse_scores(state, positions, sparse_vectors)
+            return self._hybrid_rank(
+                scores['dense'][:, query_index], scores['sparse'][:, query_index],
+                limit, dense_weight, candidate_multiplier, fusion
+            )
+        return self._search_many(rank, len(dense_vectors), fields, snippet_length, filters)
+    
+    def fetch_documents(self, document_ids, fields=None):
+        fields = _validate_fields(fields)
+        with self._lock:
+            rows = [self._rows[self._positions[document_id]] for document_id in document_ids
+                    if document_id in self._positions]
+        return [(row['id'], *(row[field] for field in fields)) for row in rows]
+    
+    def close(self):
+        pass
@@ -4,6 +4,8 @@ CREATE EXTENSION IF NOT EXISTS vector;
 -- Documents table
 CREATE TABLE IF NOT EXISTS documents (
     id SERIAL PRIMARY KEY,
+    doc_key TEXT,  -- stable source identity used for upserts
+    content_hash CHAR(64),  -- sha256 of title, content, source and type
     title VARCHAR(500),
     content TEXT,
     source VARCHAR(200),
@@ -20,22 +22,46 @@ CREATE TABLE IF NOT EXISTS dense_vectors (
 );
 
 -- Sparse vectors table (using TF-IDF)
+-- Stored as sparsevec (pgvector 0.7+); the dimension bounds the TF-IDF vocabulary.
+-- Set SPARSE_VECTOR_TYPE=vector to keep the legacy dense vector(1000) layout.
 CREATE TABLE IF NOT EXISTS sparse_vectors (
     id SERIAL PRIMARY KEY,
     document_id INTEGER REFERENCES documents(id),
-    vector vector(1000),  -- TF-IDF dimension
+    vector sparsevec(100000),  -- TF-IDF vocabulary size (SPARSE_DIMENSIONS)
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Fitted TF-IDF model (vocabulary and IDF weights), so restarts can search without re-indexing
+CREATE TABLE IF NOT EXISTS sparse_models (
+    id SERIAL PRIMARY KEY,
+    terms TEXT[] NOT NULL,  -- vocabulary, ordered by column index
+    idf DOUBLE PRECISION[] NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Create HNSW indexes for fast similarity search
+-- m and ef_construction are the HNSW_M / HNSW_EF_CONSTRUCTION defaults; setup_database.py
+-- reads them from the environment (see tune_hnsw.py for choosing values)
 CREATE INDEX IF NOT EXISTS idx_dense_vectors_vector 
 ON dense_vectors 
 USING hnsw (vector vector_cosine_ops)
 WITH (m = 16, ef_construction = 64);
 
+-- Quantized alternatives (DENSE_INDEX_TYPE=halfvec or bit); search re-ranks their
+-- candidates with the full-precision column, so idx_dense_vectors_vector can be dropped
+-- CREATE INDEX IF NOT EXISTS idx_dense_vectors_halfvec
+-- ON dense_vectors
+-- USING hnsw ((vector::halfvec(384)) halfvec_cosine_ops)
+-- WITH (m = 16, ef_construction = 64);
+--
+-- CREATE INDEX IF NOT EXISTS idx_dense_vectors_bit
+-- ON dense_vectors
+-- USING hnsw ((binary_quantize(vector)::bit(384)) bit_hamming_ops)
+-- WITH (m = 16, ef_construction = 64);
+
 CREATE INDEX IF NOT EXISTS idx_sparse_vectors_vector 
 ON sparse_vectors 
-USING hnsw (vector vector_cosine_ops)
+USING hnsw (vector sparsevec_cosine_ops)
 WITH (m = 16, ef_construction = 64);
 
 -- Create indexes for better performance
@@ -45,6 +71,16 @@ ON documents(title);
 CREATE INDEX IF NOT EXISTS idx_documents_type 
 ON documents(document_type);
 
+-- Used by metadata-filtered search
+CREATE INDEX IF NOT EXISTS idx_documents_source 
+ON documents(source);
+
+CREATE INDEX IF NOT EXISTS idx_documents_created_at 
+ON documents(created_at);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_doc_key 
+ON documents(doc_key);
+
 CREATE INDEX IF NOT EXISTS idx_dense_vectors_document_id 
 ON dense_vectors(document_id);
 
@@ -1,47 +1,283 @@
-import pandas as pd
+import hashlib
+import os
+import threading
 import time
+from itertools import chain
+from contextlib import contextmanager
+from search_metrics import metrics
 from vector_models import VectorModels
 from vector_store import VectorStore
 
+INDEX_COLUMNS = ['title', 'content', 'source', 'document_type']
+DOCUMENT_COLUMNS = ['doc_key', 'content_hash'] + INDEX_COLUMNS
+
+def content_hash(title, content, source, document_type):
+    payload = '\x1f'.join(str(value) for value in (title, content, source, document_type))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def prepare_documents(documents_df):
+    """Add content_hash and doc_key columns; doc_key defaults to the content hash."""
+    documents_df = documents_df.copy()
+    documents_df['content_hash'] = [
+        content_hash(*row) for row in documents_df[INDEX_COLUMNS].itertuples(index=False, name=None)
+    ]
+    if 'doc_key' not in documents_df.columns:
+        documents_df['doc_key'] = documents_df['content_hash']
+    documents_df['doc_key'] = documents_df['doc_key'].astype(str)
+    return documents_df.drop_duplicates('doc_key', keep='last').reset_index(drop=True)
+
+def _drain(batches):
+    # Each held batch is released as soon as it has been consumed
+    while batches:
+        yield batches.pop(0)
+
 class SearchEngine:
-    def __init__(self):
+    def __init__(self, backend=None):
         self.vector_models = VectorModels()
-        self.vector_store = VectorStore(self.vector_models)
+        self.vector_store = VectorStore(self.vector_models, backend)
         self.documents_indexed = False
+        self.bulk_loading = False
+        self.vector_indexes_missing = False
+        self.index_batch_size = int(os.getenv('INDEX_BATCH_SIZE', '1000'))
+        self.sparse_fit_sample_size = int(os.getenv('SPARSE_FIT_SAMPLE_SIZE', '50000'))
+        # Reentrant so index_documents can run inside bulk_load
+        self._index_lock = threading.RLock()
+        self._restore_index()
+    
+    def _restore_index(self):
+        # Reuse the TF-IDF model and vectors from a previous run instead of re-indexing
+        stored_model = self.vector_store.load_sparse_model()
+        if stored_model is None or not self.vector_store.has_documents():
+            return
+        
+        _, terms, idf = stored_model
+        self.vector_models.load_sparse_model(terms, idf)
+        self.documents_indexed = True
+        # An interrupted bulk load leaves the vector indexes dropped, so searches run as exact scans
+        self.vector_indexes_missing = not self.vector_store.has_vector_indexes()
     
-    def index_documents(self, documents_df):
+    def index_documents(self, documents_df, batch_size=None, prune=False, refit_sparse=False):
+        """Upsert documents, re-embedding only rows whose content hash changed.
+        
+        Rows are identified by a ``doc_key`` column when present, otherwise by
+        their content hash. With ``prune=True`` documents missing from
+        ``documents_df`` are deleted. The stored TF-IDF model is reused unless
+        ``refit_sparse`` is set or none exists; a refit rewrites the sparse
+        vectors of every stored document, including ones missing from
+        ``documents_df``, but still skips dense encoding for unchanged rows.
+        """
         start_time = time.time()
+        batch_size = batch_size or self.index_batch_size
+        stats = {'indexed': 0, 'unchanged': 0, 'deleted': 0}
         
-        self.vector_models.fit_sparse_model(documents_df['content'].tolist())
+        # Searches may run concurrently; indexing runs one at a time
+        with self._index_lock:
+            documents_df = prepare_documents(documents_df)
+            
+            refit = refit_sparse or not self.vector_models.sparse_fitted
+            if refit:
+                self.vector_models.fit_sparse_model(documents_df['content'].tolist())
+                self.vector_store.save_sparse_model(*self.vector_models.export_sparse_model())
+            
+            self._index_prepared(documents_df, batch_size, refit, stats)
+            
+            if prune:
+                stats['deleted'] = self.vector_store.delete_documents_except(documents_df['doc_key'])
+            elif refit:
+                self._refresh_sparse_vectors(set(documents_df['doc_key']), batch_size)
+            
+            self.documents_indexed = True
         
-        for _, row in documents_df.iterrows():
-            document_id = self.vector_store.store_document(
-                title=row['title'],
-                content=row['content'],
-                source=row['source'],
-                document_type=row['document_type']
-            )
+        return stats
+    
+    def _index_prepared(self, documents_df, batch_size, refit, stats):
+        for start in range(0, len(documents_df), batch_size):
+            chunk = documents_df.iloc[start:start + batch_size]
+            existing = self.vector_store.fetch_document_hashes(chunk['doc_key'])
+            
+            changed = [
+                existing.get(doc_key, (None, None))[1] != chunk_hash
+                for doc_key, chunk_hash in zip(chunk['doc_key'], chunk['content_hash'])
+            ]
+            changed_chunk = chunk[changed]
+            unchanged_chunk = chunk[[not flag for flag in changed]]
+            stats['indexed'] += len(changed_chunk)
+            stats['unchanged'] += len(unchanged_chunk)
             
-            dense_embedding = self.vector_models.get_dense_embedding(row['content'])
-            sparse_embedding = self.vector_models.get_sparse_embedding(row['content'])
+            if not changed_chunk.empty:
+                contents = changed_chunk['content'].tolist()
+                dense_embeddings = self.vector_models.get_dense_embeddings(contents, store=True)
+                sparse_embeddings = self.vector_models.get_sparse_embeddings(contents)
+                
+                self.vector_store.store_documents_batch(
+                    changed_chunk[DOCUMENT_COLUMNS].itertuples(index=False, name=None),
+                    dense_embeddings,
+                    sparse_embeddings
+                )
             
-            self.vector_store.store_dense_vector(document_id, dense_embedding)
-            self.vector_store.store_sparse_vector(document_id, sparse_embedding)
+            # A new vocabulary invalidates every stored sparse vector
+            if refit and not unchanged_chunk.empty:
+                self.vector_store.replace_sparse_vectors(
+                    [existing[doc_key][0] for doc_key in unchanged_chunk['doc_key']],
+                    self.vector_models.get_sparse_embeddings(unchanged_chunk['content'].tolist())
+                )
+    
+    def _refresh_sparse_vectors(self, indexed_doc_keys, batch_size):
+        # Stored documents outside this input still hold vectors of the old vocabulary
+        after_id = 0
+        while True:
+            rows = self.vector_store.fetch_document_contents(after_id, batch_size)
+            if not rows:
+                return
+            after_id = rows[-1][0]
+            stale = [(document_id, content) for document_id, doc_key, content in rows
+                     if doc_key not in indexed_doc_keys]
+            if stale:
+                self.vector_store.replace_sparse_vectors(
+                    [document_id for document_id, _ in stale],
+                    self.vector_models.get_sparse_embeddings([content for _, content in stale])
+                )
+    
+    def index_document_stream(self, batches, batch_size=None, prune=False, refit_sparse=False):
+        """Index an iterable of document DataFrames one batch at a time.
         
-        self.documents_indexed = True
+        Memory is bounded by the batch size rather than the corpus size. When
+        the TF-IDF model has to be fitted, it is fitted on the first
+        SPARSE_FIT_SAMPLE_SIZE documents of the stream, which are held until
+        then. ``prune`` deletes documents whose doc_key did not appear.
+        """
+        batch_size = batch_size or self.index_batch_size
+        stats = {'indexed': 0, 'unchanged': 0, 'deleted': 0}
+        batches = iter(batches)
+        
+        with self._index_lock:
+            refit = refit_sparse or not self.vector_models.sparse_fitted
+            sample = []
+            if refit:
+                sample_documents = 0
+                for batch in batches:
+                    sample.append(batch)
+                    sample_documents += len(batch)
+                    if sample_documents >= self.sparse_fit_sample_size:
+                        break
+                contents = [content for batch in sample for content in batch['content'].tolist()]
+                if not contents:
+                    return stats
+                self.vector_models.fit_sparse_model(contents[:self.sparse_fit_sample_size])
+                self.vector_store.save_sparse_model(*self.vector_models.export_sparse_model())
+            
+            doc_keys = set()
+            for batch in chain(_drain(sample), batches):
+                batch = prepare_documents(batch)
+                doc_keys.update(batch['doc_key'])
+                self._index_prepared(batch, batch_size, refit, stats)
+            
+            if prune and doc_keys:
+                stats['deleted'] = self.vector_store.delete_documents_except(doc_keys)
+            elif refit:
+                self._refresh_sparse_vectors(doc_keys, batch_size)
+            
+            self.documents_indexed = True
+        
+        return stats
+    
+    @contextmanager
+    def bulk_load(self, progress=None):
+        """Defer HNSW index construction while loading many documents.
+        
+        The vector indexes are dropped, documents indexed inside the block are
+        inserted without graph updates, and the indexes are built once at the
+        end with ``progress(index, phase, done, total)`` reporting. Searches on
+        this engine raise until the build finishes; other connections fall back
+        to exact scans while the indexes are missing.
+        """
+        with self._index_lock:
+            self.bulk_loading = True
+            try:
+                self.vector_store.drop_vector_indexes()
+                self.vector_indexes_missing = True
+                yield self
+            finally:
+                try:
+                    self.vector_store.build_vector_indexes(progress)
+                    self.vector_indexes_missing = False
+                finally:
+                    self.bulk_loading = False
+    
+    def build_vector_indexes(self, progress=None):
+        """Create any missing vector indexes, e.g. after an interrupted bulk load.
+        
+        Returns build seconds per index; ``progress`` is reported as in
+        ``bulk_load``.
+        """
+        with self._index_lock:
+            timings = self.vector_store.build_vector_indexes(progress)
+            self.vector_indexes_missing = False
+            return timings
     
-    def search(self, query, search_type='hybrid', limit=10, dense_weight=0.5):
+    def _check_searchable(self):
+        if self.bulk_loading:
+            raise ValueError("Search is unavailable until the bulk load has built the indexes")
         if not self.documents_indexed:
             raise ValueError("Documents must be indexed before searching")
+    
+    def search(self, query, search_type='hybrid', limit=10, dense_weight=0.5,
+               candidate_multiplier=None, fusion='weighted', fields=None, snippet_length=None,
+               filters=None, ef_search=None):
+        """Run one query.
+        
+        ``fields`` selects which document columns are fetched (id and
+        similarity are always returned) and ``snippet_length`` truncates
+        content in SQL; use ``get_documents`` to load full rows afterwards.
+        ``filters`` restricts results by ``document_type``, ``source``,
+        ``created_after`` and ``created_before`` and still returns ``limit`` hits
+        when that many documents match. ``ef_search`` overrides HNSW_EF_SEARCH
+        for this query: higher values raise recall at the cost of latency.
+        """
+        self._check_searchable()
         
-        if search_type == 'dense':
-            return self.vector_store.dense_search(query, limit)
-        elif search_type == 'sparse':
-            return self.vector_store.sparse_search(query, limit)
-        elif search_type == 'hybrid':
-            return self.vector_store.hybrid_search(query, limit, dense_weight)
-        else:
+        if search_type not in ('dense', 'sparse', 'hybrid'):
             raise ValueError(f"Unknown search type: {search_type}")
+        
+        with metrics.timer(f'search.{search_type}'):
+            if search_type == 'dense':
+                return self.vector_store.dense_search(query, limit, fields, snippet_length, filters, ef_search)
+            elif search_type == 'sparse':
+                return self.vector_store.sparse_search(query, limit, fields, snippet_length, filters, ef_search)
+            else:
+                return self.vector_store.hybrid_search(
+                    query, limit, dense_weight, candidate_multiplier, fusion,
+                    fields, snippet_length, filters, ef_search
+                )
+    
+    def search_many(self, queries, search_type='hybrid', limit=10, dense_weight=0.5,
+                    candidate_multiplier=None, fusion='weighted', fields=None, snippet_length=None,
+                    filters=None, ef_search=None):
+        self._check_searchable()
+        
+        with metrics.timer(f'search_many.{search_type}'):
+            return self.vector_store.search_many(
+                queries, search_type, limit, dense_weight, candidate_multiplier, fusion,
+                fields, snippet_length, filters, ef_search
+            )
+    
+    def get_documents(self, document_ids, fields=None):
+        return self.vector_store.fetch_documents(document_ids, fields)
+    
+    def get_document(self, document_id, fields=None):
+        documents = self.get_documents([document_id], fields)
+        return documents[0] if documents else None
+    
+    def warm_up(self, dense=True, sparse=True):
+        self.vector_models.warm_up(dense=dense, sparse=sparse)
+    
+    def cache_stats(self):
+        return self.vector_models.cache_stats()
+    
+    def latency_stats(self):
+        """Per-stage latency percentiles (ms) for every stage recorded so far."""
+        return metrics.summary()
     
     def close(self):
-        self.vector_store.close()
\ No newline at end of file
+        self.vector_store.close()
+        self.vector_models.close()
@@ -4,13 +4,18 @@ Search Performance Evaluation Script
 Compares dense, sparse, and hybrid search strategies
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 import time
 from search_engine import SearchEngine
-from data_preprocessor import main as preprocess_data
+from search_metrics import metrics
+from data_preprocessor import PREPROCESSED_PATH, main as preprocess_data, read_preprocessed_data
 import os
 
+# Scoring needs only ids and similarities; titles are kept for inspecting saved results
+EVALUATION_FIELDS = ('title',)
+
 class SearchEvaluator:
     def __init__(self):
         self.search_engine = SearchEngine()
@@ -21,17 +26,14 @@ class SearchEvaluator:
     
     def _initialize_search_engine(self):
         """Initialize the search engine with preprocessed data."""
-        import pandas as pd
-        import os
-        
-        if not os.path.exists('data/preprocessed_data.csv'):
-            from data_preprocessor import main as preprocess_data
-            preprocess_data()
+        if self.search_engine.documents_indexed:
+            print("Using the existing index from the database.")
+            return
         
-        documents_df = pd.read_csv('data/preprocessed_data.csv')
-        print(f"Initializing search engine with {len(documents_df)} documents...")
-        self.search_engine.index_documents(documents_df)
-        print("Search engine initialized successfully!")
+        # Indexed chunk by chunk from the preprocessed data, without loading all of it
+        print("Initializing search engine from the preprocessed data...")
+        stats = self.search_engine.index_document_stream(read_preprocessed_data())
+        print(f"Search engine initialized with {stats['indexed'] + stats['unchanged']} documents!")
         
     def _create_test_queries(self):
         """Create a comprehensive set of test queries for evaluation."""
@@ -66,7 +68,38 @@ class SearchEvaluator:
             ]
         }
     
-    def evaluate_search_method(self, query, search_type, limit=10, dense_weight=0.5):
+    def _summarize_results(self, query, search_type, results, search_time):
+        """Build the evaluation record for one query's results."""
+        results = results.to_dataframe()
+        return {
+            'query': query,
+            'search_type': search_type,
+            'results_count': len(results),
+            'search_time': search_time,
+            'avg_similarity': results['similarity'].mean() if not results.empty else 0,
+            'max_similarity': results['similarity'].max() if not results.empty else 0,
+            'min_similarity': results['similarity'].min() if not results.empty else 0,
+            'std_similarity': results['similarity'].std() if not results.empty else 0,
+            'results': results
+        }
+    
+    def _error_result(self, query, search_type, search_time, error):
+        """Build the evaluation record for a failed search."""
+        print(f"Error evaluating {search_type} search for query '{query}': {error}")
+        return {
+            'query': query,
+            'search_type': search_type,
+            'results_count': 0,
+            'search_time': search_time,
+            'avg_similarity': 0,
+            'max_similarity': 0,
+            'min_similarity': 0,
+            'std_similarity': 0,
+            'results': pd.DataFrame(),
+            'error': str(error)
+        }
+    
+    def evaluate_search_method(self, query, search_type, limit=10, dense_weight=0.5, fusion='weighted'):
         """Evaluate a single search method."""
         start_time = time.time()
         
@@ -75,40 +108,49 @@ class SearchEvaluator:
                 query, 
                 search_type=search_type, 
                 limit=limit, 
-                dense_weight=dense_weight
+                dense_weight=dense_weight,
+                fusion=fusion,
+                fields=EVALUATION_FIELDS
             )
             
             search_time = time.time() - start_time
             
-            return {
-                'query': query,
-                'search_type': search_type,
-                'results_count': len(results),
-                'search_time': search_time,
-                'avg_similarity': results['similarity'].mean() if not results.empty else 0,
-                'max_similarity': results['similarity'].max() if not results.empty else 0,
-                'min_similarity': results['similarity'].min() if not results.empty else 0,
-                'std_similarity': results['similarity'].std() if not results.empty else 0,
-                'results': results
-            }
+            return self._summarize_results(query, search_type, results, search_time)
         except Exception as e:
-            print(f"Error evaluating {search_type} search for query '{query}': {e}")
-            return {
-                'query': query,
-                'search_type': search_type,
-                'results_count': 0,
-                'search_time': time.time() - start_time,
-                'avg_similarity': 0,
-                'max_similarity': 0,
-                'min_similarity': 0,
-                'std_similarity': 0,
-                'results': pd.DataFrame(),
-                'error': str(e)
-            }
+            return self._error_result(query, search_type, time.time() - start_time, e)
     
-    def run_comprehensive_evaluation(self, limit=10):
+    def evaluate_search_method_batch(self, queries, search_type, limit=10, dense_weight=0.5, fusion='weighted'):
+        """Evaluate a search method over many queries with one batched search call."""
+        start_time = time.time()
+        
+        try:
+            results_list = self.search_engine.search_many(
+                queries,
+                search_type=search_type,
+                limit=limit,
+                dense_weight=dense_weight,
+                fusion=fusion,
+                fields=EVALUATION_FIELDS
+            )
+        except Exception as e:
+            search_time = (time.time() - start_time) / len(queries)
+            return [self._error_result(query, search_type, search_time, e) for query in queries]
+        
+        # The batch time is amortized evenly over its queries
+        search_time = (time.time() - start_time) / len(queries)
+        return [
+            self._summarize_results(query, search_type, results, search_time)
+            for query, results in zip(queries, results_list)
+        ]
+    
+    def run_comprehensive_evaluation(self, limit=10, batch=False):
         """Run comprehensive evaluation of all search methods."""
         print("Starting comprehensive search evaluation...")
+        # Stage latencies should cover the evaluation queries only, not indexing
+        metrics.reset()
+        
+        if batch:
+            return self._run_batch_evaluation(limit)
         
         evaluation_results = []
         
@@ -133,6 +175,33 @@ class SearchEvaluator:
                     )
                     hybrid_result['dense_weight'] = weight
                     evaluation_results.append(hybrid_result)
+                
+                # Test hybrid search with Reciprocal Rank Fusion
+                rrf_result = self.evaluate_search_method(query, 'hybrid', limit, fusion='rrf')
+                rrf_result['search_type'] = 'hybrid_rrf'
+                evaluation_results.append(rrf_result)
+        
+        return pd.DataFrame(evaluation_results)
+    
+    def _run_batch_evaluation(self, limit=10):
+        """Run every search method once over all test queries using search_many."""
+        queries = [query for category_queries in self.test_queries.values() for query in category_queries]
+        print(f"Evaluating {len(queries)} queries per method in batch mode")
+        
+        evaluation_results = []
+        evaluation_results.extend(self.evaluate_search_method_batch(queries, 'dense', limit))
+        evaluation_results.extend(self.evaluate_search_method_batch(queries, 'sparse', limit))
+        
+        for weight in [0.3, 0.5, 0.7]:
+            hybrid_results = self.evaluate_search_method_batch(queries, 'hybrid', limit, dense_weight=weight)
+            for hybrid_result in hybrid_results:
+                hybrid_result['dense_weight'] = weight
+            evaluation_results.extend(hybrid_results)
+        
+        rrf_results = self.evaluate_search_method_batch(queries, 'hybrid', limit, fusion='rrf')
+        for rrf_result in rrf_results:
+            rrf_result['search_type'] = 'hybrid_rrf'
+        evaluation_results.extend(rrf_results)
         
         return pd.DataFrame(evaluation_results)
     
@@ -169,8 +238,30 @@ class SearchEvaluator:
                 print(f"  Average Similarity: {weight_data['avg_similarity'].mean():.4f}")
                 print(f"  Average Search Time: {weight_data['search_time'].mean():.4f} seconds")
         
+        # Weighted vs rank fusion
+        print("\n3. HYBRID FUSION COMPARISON")
+        print("-" * 50)
+        
+        weighted_data = hybrid_data[hybrid_data['dense_weight'] == 0.5]
+        rrf_data = results_df[results_df['search_type'] == 'hybrid_rrf']
+        if not weighted_data.empty and not rrf_data.empty:
+            print(f"  Weighted (0.5) Avg Search Time: {weighted_data['search_time'].mean():.4f} seconds")
+            print(f"  RRF Avg Search Time: {rrf_data['search_time'].mean():.4f} seconds")
+            
+            overlaps = []
+            for query in rrf_data['query']:
+                weighted_results = weighted_data[weighted_data['query'] == query]['results'].iloc[0]
+                rrf_results = rrf_data[rrf_data['query'] == query]['results'].iloc[0]
+                if weighted_results.empty or rrf_results.empty:
+                    continue
+                weighted_ids = set(weighted_results['id'])
+                rrf_ids = set(rrf_results['id'])
+                overlaps.append(len(weighted_ids & rrf_ids) / len(weighted_ids | rrf_ids))
+            if overlaps:
+                print(f"  Avg Result Overlap (Jaccard): {np.mean(overlaps):.4f}")
+        
         # Query category analysis
-        print("\n3. PERFORMANCE BY QUERY CATEGORY")
+        print("\n4. PERFORMANCE BY QUERY CATEGORY")
         print("-" * 50)
         
         for category in self.test_queries.keys():
@@ -187,11 +278,12 @@ class SearchEvaluator:
                     print(f"  {search_type.title()}: Avg Similarity = {category_data['avg_similarity'].mean():.4f}")
         
         # Generate recommendations
-        print("\n4. RECOMMENDATIONS")
+        print("\n5. RECOMMENDATIONS")
         print("-" * 50)
         
-        # Find best performing method overall
-        best_method = results_df.groupby('search_type')['avg_similarity'].mean().idxmax()
+        # Find best performing method overall (RRF scores are rank-based, not cosine similarities)
+        similarity_data = results_df[results_df['search_type'] != 'hybrid_rrf']
+        best_method = similarity_data.groupby('search_type')['avg_similarity'].mean().idxmax()
         print(f"  Best overall method: {best_method.upper()}")
         
         # Find fastest method
@@ -204,6 +296,14 @@ class SearchEvaluator:
             best_weight = hybrid_data.groupby('dense_weight')['avg_similarity'].mean().idxmax()
             print(f"  Optimal hybrid dense weight: {best_weight}")
         
+        # Where the search time goes
+        print("\n6. LATENCY BY STAGE")
+        print("-" * 50)
+        print(f"  {'Stage':<22} {'Count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for stage, stats in self.search_engine.latency_stats().items():
+            print(f"  {stage:<22} {stats['count']:>7} {stats['p50_ms']:>9.2f} "
+                  f"{stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+        
         return results_df
     
     def save_results(self, results_df, filename='search_evaluation_results.csv'):
@@ -224,7 +324,7 @@ class SearchEvaluator:
         report.append("SUMMARY STATISTICS")
         report.append("-" * 30)
         
-        for search_type in ['dense', 'sparse', 'hybrid']:
+        for search_type in ['dense', 'sparse', 'hybrid', 'hybrid_rrf']:
             type_data = results_df[results_df['search_type'] == search_type]
             if not type_data.empty:
                 report.append(f"{search_type.upper()} SEARCH:")
@@ -258,11 +358,16 @@ class SearchEvaluator:
 
 def main():
     """Main function to run the search evaluation."""
+    parser = argparse.ArgumentParser(description="Compare dense, sparse, and hybrid search strategies")
+    parser.add_argument('--batch', action='store_true',
+                        help='Run each method over all queries with one batched search_many call')
+    args = parser.parse_args()
+    
     print("HYBRID SEARCH EVALUATION")
     print("=" * 50)
     
     # Check if preprocessed data exists
-    if not os.path.exists('data/preprocessed_data.csv'):
+    if not os.path.exists(PREPROCESSED_PATH):
         print("Preprocessed data not found. Creating it now...")
         preprocess_data()
     
@@ -271,7 +376,7 @@ def main():
     
     # Run comprehensive evaluation
     print("Running comprehensive evaluation...")
-    results = evaluator.run_comprehensive_evaluation(limit=10)
+    results = evaluator.run_comprehensive_evaluation(limit=10, batch=args.batch)
     
     # Analyze results
     evaluator.analyze_results(results)
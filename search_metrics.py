@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class LatencyHistogram:
+    """Latencies of one stage over a sliding window of recent samples."""
+    
+    def __init__(self, window):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+    
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+    
+    def summary(self):
+        with self._lock:
+            samples = np.array(self._samples)
+            count, total = self.count, self.total
+        if not len(samples):
+            return {'count': count, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+        
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+        return {
+            'count': count,
+            'mean_ms': total / count * 1000,
+            'p50_ms': p50,
+            'p95_ms': p95,
+            'p99_ms': p99,
+            'max_ms': samples.max() * 1000
+        }
+
+class SearchMetrics:
+    """Per-stage latency histograms for the search path, with pluggable hooks.
+    
+    Stages are named by the code that records them, e.g. ``encode.dense``,
+    ``db.execute`` or ``search.hybrid``. Hooks registered with ``add_hook`` are
+    called with ``(stage, seconds)`` for every sample, so timings can be
+    forwarded to an external metrics system. Slow-query plans captured by
+    Database are passed to ``add_slow_query_hook`` hooks and kept in
+    ``slow_queries``.
+    """
+    
+    def __init__(self):
+        self.enabled = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+        self.window = int(os.getenv('METRICS_WINDOW', '10000'))
+        self._histograms = {}
+        self._hooks = []
+        self._slow_query_hooks = []
+        self._lock = threading.Lock()
+        self.slow_queries = deque(maxlen=int(os.getenv('SLOW_QUERY_LOG_SIZE', '50')))
+    
+    def add_hook(self, hook):
+        self._hooks.append(hook)
+    
+    def add_slow_query_hook(self, hook):
+        self._slow_query_hooks.append(hook)
+    
+    def record(self, stage, seconds):
+        if not self.enabled:
+            return
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, LatencyHistogram(self.window))
+        histogram.record(seconds)
+        for hook in self._hooks:
+            hook(stage, seconds)
+    
+    @contextmanager
+    def timer(self, stage):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start_time)
+    
+    def record_slow_query(self, query, seconds, plan):
+        record = {'query': query, 'seconds': seconds, 'plan': plan, 'captured_at': time.time()}
+        self.slow_queries.append(record)
+        for hook in self._slow_query_hooks:
+            hook(record)
+    
+    def summary(self):
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {stage: histograms[stage].summary() for stage in sorted(histograms)}
+    
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+        self.slow_queries.clear()
+
+# Shared by VectorModels, VectorStore, Database and SearchEngine so one summary covers a whole query
+metrics = SearchMetrics()
@@ -0,0 +1,83 @@
+RESULT_FIELDS = ('id', 'title', 'content', 'source', 'document_type', 'created_at', 'similarity')
+DEFAULT_FIELDS = ('title', 'content', 'source', 'document_type')
+
+class SearchResult:
+    __slots__ = RESULT_FIELDS
+    
+    def __init__(self, id, title=None, content=None, source=None, document_type=None,
+                 created_at=None, similarity=0.0):
+        self.id = id
+        self.title = title
+        self.content = content
+        self.source = source
+        self.document_type = document_type
+        self.created_at = created_at
+        self.similarity = similarity
+    
+    def __getitem__(self, field):
+        return getattr(self, field)
+    
+    def __repr__(self):
+        return f"SearchResult(id={self.id!r}, title={self.title!r}, similarity={self.similarity!r})"
+    
+    def to_dict(self, fields=None):
+        fields = RESULT_FIELDS if fields is None else ('id',) + tuple(fields) + ('similarity',)
+        return {field: getattr(self, field) for field in fields}
+
+class SearchResults:
+    """Ranked hits for one query. Converting to a DataFrame is left to callers that need one."""
+    
+    __slots__ = ('_results', 'fields')
+    
+    def __init__(self, results=(), fields=DEFAULT_FIELDS):
+        self._results = list(results)
+        # Document columns that were fetched; the others are None on every result
+        self.fields = tuple(fields)
+    
+    @classmethod
+    def from_rows(cls, rows, fields=None):
+        # Rows are (id, *fields, similarity)
+        fields = DEFAULT_FIELDS if fields is None else tuple(fields)
+        results = []
+        for row in rows:
+            result = SearchResult(row[0], similarity=row[-1])
+            for field, value in zip(fields, row[1:-1]):
+                setattr(result, field, value)
+            results.append(result)
+        return cls(results, fields)
+    
+    def __len__(self):
+        return len(self._results)
+    
+    def __iter__(self):
+        return iter(self._results)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return SearchResults(self._results[index], self.fields)
+        return self._results[index]
+    
+    def __repr__(self):
+        return f"SearchResults({self._results!r})"
+    
+    @property
+    def empty(self):
+        return not self._results
+    
+    @property
+    def ids(self):
+        return [result.id for result in self._results]
+    
+    @property
+    def similarities(self):
+        return [result.similarity for result in self._results]
+    
+    def to_dicts(self):
+        return [result.to_dict(self.fields) for result in self._results]
+    
+    def to_dataframe(self):
+        import pandas as pd
+        
+        if not self._results:
+            return pd.DataFrame()
+        return pd.DataFrame(self.to_dicts(), columns=['id', *self.fields, 'similarity'])
@@ -1,10 +1,14 @@
 import os
 import psycopg2
 from dotenv import load_dotenv
+from database import (
+    SPARSE_VECTOR_TYPE, SPARSE_DIMENSIONS, DENSE_DIMENSIONS, DENSE_INDEX_TYPE, dense_index_sql,
+    sparse_index_sql
+)
 
 load_dotenv()
 
-def setup_database():
+def setup_database(vector_indexes=True):
     db_params = {
         'dbname': os.getenv('DB_NAME', 'hybrid_search'),
         'user': os.getenv('DB_USER', 'postgres'),
@@ -23,6 +27,8 @@ def setup_database():
         cur.execute("""
             CREATE TABLE IF NOT EXISTS documents (
                 id SERIAL PRIMARY KEY,
+                doc_key TEXT,
+                content_hash CHAR(64),
                 title VARCHAR(500),
                 content TEXT,
                 source VARCHAR(200),
@@ -32,44 +38,59 @@ def setup_database():
         """)
         conn.commit()
         
+        # Databases created before incremental indexing lack these columns
         cur.execute("""
+            ALTER TABLE documents
+                ADD COLUMN IF NOT EXISTS doc_key TEXT,
+                ADD COLUMN IF NOT EXISTS content_hash CHAR(64);
+        """)
+        conn.commit()
+        
+        cur.execute(f"""
             CREATE TABLE IF NOT EXISTS dense_vectors (
                 id SERIAL PRIMARY KEY,
                 document_id INTEGER REFERENCES documents(id),
-                vector vector(384),
+                vector vector({DENSE_DIMENSIONS}),
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
         """)
         conn.commit()
         
-        cur.execute("""
+        cur.execute(f"""
             CREATE TABLE IF NOT EXISTS sparse_vectors (
                 id SERIAL PRIMARY KEY,
                 document_id INTEGER REFERENCES documents(id),
-                vector vector(1000),
+                vector {SPARSE_VECTOR_TYPE}({SPARSE_DIMENSIONS}),
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
         """)
         conn.commit()
         
         cur.execute("""
-            CREATE INDEX IF NOT EXISTS idx_dense_vectors_vector 
-            ON dense_vectors 
-            USING hnsw (vector vector_cosine_ops)
-            WITH (m = 16, ef_construction = 64);
+            CREATE TABLE IF NOT EXISTS sparse_models (
+                id SERIAL PRIMARY KEY,
+                terms TEXT[] NOT NULL,
+                idf DOUBLE PRECISION[] NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
         """)
         conn.commit()
         
-        cur.execute("""
-            CREATE INDEX IF NOT EXISTS idx_sparse_vectors_vector 
-            ON sparse_vectors 
-            USING hnsw (vector vector_cosine_ops)
-            WITH (m = 16, ef_construction = 64);
-        """)
-        conn.commit()
+        # Quantized modes index a halfvec or binary copy of the full-precision column;
+        # both HNSW indexes are built with HNSW_M and HNSW_EF_CONSTRUCTION. Bulk loads
+        # skip them and build them once the data is in (SearchEngine.bulk_load)
+        if vector_indexes:
+            cur.execute(dense_index_sql(DENSE_INDEX_TYPE))
+            conn.commit()
+            
+            cur.execute(sparse_index_sql())
+            conn.commit()
         
         cur.execute("CREATE INDEX IF NOT EXISTS idx_documents_title ON documents(title);")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_documents_type ON documents(document_type);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_documents_source ON documents(source);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_documents_created_at ON documents(created_at);")
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_doc_key ON documents(doc_key);")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_dense_vectors_document_id ON dense_vectors(document_id);")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_sparse_vectors_document_id ON sparse_vectors(document_id);")
         conn.commit()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+import pandas as pd
+import pytest
+import data_preprocessor
+
+def source_batches(monkeypatch, tmp_path, chunk_size):
+    monkeypatch.setattr(data_preprocessor, 'SOURCE_DIR', str(tmp_path))
+    return [
+        batch for batch in data_preprocessor.stream_documents(chunk_size)
+        if (batch['source'] != 'synthetic').all()
+    ]
+
+def test_file_matching_two_sources_gets_distinct_keys(monkeypatch, tmp_path):
+    pd.DataFrame({
+        'Date': ['2024-01-01', '2024-01-02'],
+        'Product': ['Lipstick', 'Serum'],
+        'Amount': [10, 20]
+    }).to_csv(tmp_path / 'cosmetics_sales_data.csv', index=False)
+    
+    documents = pd.concat(source_batches(monkeypatch, tmp_path, 10))
+    assert sorted(documents['document_type'].unique()) == ['sales_record', 'stock_data']
+    assert documents['doc_key'].is_unique
+    assert f"sales_record:{tmp_path / 'cosmetics_sales_data.csv'}:1" in set(documents['doc_key'])
+
+def test_unreadable_file_raises_instead_of_stopping_early(monkeypatch, tmp_path):
+    # The second chunk has an unterminated quote, so the file fails after its first chunk was yielded
+    (tmp_path / 'transactions.csv').write_text('Transaction_ID,Amount\n1,10\n2,20\n3,"30\n')
+    
+    with pytest.raises(ValueError, match="transactions.csv after 2 rows"):
+        source_batches(monkeypatch, tmp_path, 2)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+import threading
+import numpy as np
+import psycopg2
+import pytest
+from scipy.sparse import csr_matrix
+from database import SPARSE_MAX_NONZERO, Database, filter_clause, to_sparsevec
+
+def parse_sparsevec(literal):
+    elements, dimensions = literal[1:].split('}/')
+    pairs = [element.split(':') for element in elements.split(',') if element]
+    return {int(index): float(value) for index, value in pairs}, int(dimensions)
+
+def test_sparsevec_literal_uses_one_based_indices():
+    row = csr_matrix((np.array([0.6, 0.8]), np.array([0, 41]), np.array([0, 2])), shape=(1, 100))
+    assert to_sparsevec(row, dimensions=100) == '{1:0.6,42:0.8}/100'
+    assert to_sparsevec(np.zeros(10), dimensions=10) == '{}/10'
+
+def test_sparsevec_keeps_the_largest_weights_renormalized():
+    weights = np.random.default_rng(0).random(SPARSE_MAX_NONZERO + 500) + 0.01
+    indices = np.random.default_rng(1).permutation(5000)[:len(weights)]
+    row = csr_matrix((weights, indices, [0, len(weights)]), shape=(1, 5000))
+    
+    elements, dimensions = parse_sparsevec(to_sparsevec(row, dimensions=5000))
+    assert dimensions == 5000
+    assert len(elements) == SPARSE_MAX_NONZERO
+    assert list(elements) == sorted(elements)
+    
+    top = np.argsort(-weights)[:SPARSE_MAX_NONZERO]
+    assert set(elements) == set(indices[top] + 1)
+    values = np.array(list(elements.values()))
+    assert np.isclose(np.linalg.norm(values), 1.0)
+    # Relative weights are unchanged
+    largest = indices[top[0]] + 1
+    assert np.isclose(elements[largest] / values.min(), weights[top[0]] / weights[top[-1]])
+
+def test_filter_clause_builds_named_conditions():
+    sql, params = filter_clause({
+        'document_type': 'annual_report',
+        'source': ['a.csv', 'b.csv'],
+        'created_after': '2024-01-01',
+        'created_before': None
+    })
+    assert sql == ("d.document_type = %(filter_document_type)s AND d.source = ANY(%(filter_source)s) "
+                   "AND d.created_at >= %(filter_created_after)s")
+    assert params == {
+        'filter_document_type': 'annual_report',
+        'filter_source': ['a.csv', 'b.csv'],
+        'filter_created_after': '2024-01-01'
+    }
+    assert filter_clause(None) == ('', {})
+    with pytest.raises(ValueError):
+        filter_clause({'author': 'x'})
+
+def filtered_database(extversion, matching_rows, result_rows):
+    # A Database without a pool; the queries it would send are recorded instead
+    db = Database.__new__(Database)
+    db.filter_exact_max_rows = 100
+    db.hnsw_iterative_scan = 'relaxed_order'
+    db._iterative_scan_supported = None
+    db.sent = []
+    
+    def fetch_one(query, params=None):
+        if 'pg_extension' in query:
+            return (extversion,)
+        return (matching_rows,)
+    
+    def fetch_all_with_settings(query, params=None, settings=None):
+        db.sent.append(settings)
+        return result_rows[len(db.sent) - 1]
+    
+    db.fetch_one = fetch_one
+    db.fetch_all_with_settings = fetch_all_with_settings
+    return db
+
+def run_filtered(db, limit=2):
+    def build(filter_sql, exact):
+        return "query", {}, {} if exact else {'hnsw.ef_search': 40}
+    return db._filtered_search(build, {'document_type': 'annual_report'}, limit)
+
+def test_filtered_search_uses_iterative_scan_on_pgvector_08():
+    db = filtered_database('0.8.0', 5000, [[(1,), (2,)]])
+    assert run_filtered(db) == [(1,), (2,)]
+    assert db.sent == [{'hnsw.ef_search': 40, 'hnsw.iterative_scan': 'relaxed_order'}]
+
+def test_filtered_search_over_fetches_before_pgvector_08():
+    db = filtered_database('0.7.4', 5000, [[(1,)], [(1,), (2,)]])
+    assert run_filtered(db) == [(1,), (2,)]
+    # No hnsw.iterative_scan; a short result is rerun as an exact scan
+    assert db.sent == [{'hnsw.ef_search': 1000}, {}]
+    
+    # Selective filters are scanned exactly without asking for the version
+    db = filtered_database(None, 50, [[(1,), (2,)]])
+    assert run_filtered(db) == [(1,), (2,)]
+    assert db.sent == [{}]
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def execute(self, query, params=None):
+        self.conn.queries.append(query)
+        if query in self.conn.drop_on:
+            # The server went away mid-statement
+            self.conn.closed = True
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+    
+    def fetchone(self):
+        return (1,)
+
+class FakeConnection:
+    def __init__(self, drop_on=()):
+        self.drop_on = set(drop_on)
+        self.closed = False
+        self.queries = []
+        self.commits = 0
+    
+    def cursor(self):
+        return FakeCursor(self)
+    
+    def commit(self):
+        self.commits += 1
+    
+    def rollback(self):
+        pass
+
+class FakePool:
+    """Hands out the given connections in order, or failures to raise instead."""
+    
+    def __init__(self, *connections):
+        self.connections = list(connections)
+        self.returned = []
+        self.checked_out = 0
+    
+    def getconn(self):
+        conn = self.connections.pop(0)
+        if isinstance(conn, Exception):
+            raise conn
+        self.checked_out += 1
+        return conn
+    
+    def putconn(self, conn, close=False):
+        self.checked_out -= 1
+        self.returned.append((conn, close))
+
+def pooled_database(*connections):
+    db = Database.__new__(Database)
+    db.pool = FakePool(*connections)
+    db.max_connections = 2
+    db._available = threading.BoundedSemaphore(2)
+    db._last_used = {}
+    db.health_check_interval = 30
+    return db
+
+def test_cursor_checks_out_and_returns_the_connection():
+    conn = FakeConnection()
+    db = pooled_database(conn)
+    with db.cursor() as cur:
+        cur.execute("SELECT 2")
+        assert db.pool.checked_out == 1
+    assert db.pool.checked_out == 0
+    assert db.pool.returned == [(conn, False)]
+    assert conn.commits == 1
+    # A recently used connection is not pinged again
+    db.pool.connections.append(conn)
+    assert db.fetch_one("SELECT 3") == (1,)
+    assert conn.queries == ["SELECT 1", "SELECT 2", "SELECT 3"]
+
+def test_reads_are_retried_on_a_fresh_connection():
+    dropped, fresh = FakeConnection(drop_on=["SELECT 2"]), FakeConnection()
+    db = pooled_database(dropped, fresh)
+    assert db.fetch_one("SELECT 2") == (1,)
+    assert db.pool.returned == [(dropped, True), (fresh, False)]
+    assert db.pool.checked_out == 0
+
+def test_writes_are_not_replayed_after_the_statement_was_sent():
+    insert = "INSERT INTO documents VALUES (1)"
+    db = pooled_database(FakeConnection(drop_on=[insert]), FakeConnection())
+    with pytest.raises(psycopg2.OperationalError):
+        db.execute(insert)
+    assert len(db.pool.connections) == 1
+    with pytest.raises(psycopg2.OperationalError):
+        pooled_database(FakeConnection(drop_on=[insert]), FakeConnection()).fetch_one(insert, read_only=False)
+    
+    # A connection that failed before the write started is safe to retry
+    conn = FakeConnection()
+    db = pooled_database(psycopg2.OperationalError("could not connect"), conn)
+    db.execute(insert)
+    assert conn.queries[-1] == insert
+    assert conn.commits == 1
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import os
+import numpy as np
+import pytest
+from embedding_store import EmbeddingStore, content_hash
+
+def make_vectors(count, dimensions=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dimensions)).astype(np.float32)
+
+def test_round_trip_skips_stored_hashes(tmp_path):
+    store = EmbeddingStore(str(tmp_path), 'model:torch:a')
+    hashes = [content_hash(f"document {i}") for i in range(5)]
+    vectors = make_vectors(5)
+    
+    assert store.get_many(hashes) == {}
+    assert store.put_many(hashes[:3], vectors[:3]) == 3
+    # Stored and repeated hashes are not appended again
+    assert store.put_many(hashes + hashes[3:4], np.vstack([vectors, vectors[3:4]])) == 2
+    
+    found = store.get_many(hashes)
+    assert all(np.array_equal(found[key], vector) for key, vector in zip(hashes, vectors))
+    assert store.stats()['entries'] == 5
+    assert store.stats()['bytes'] == 5 * 8 * 4
+    store.close()
+
+def test_reopen_and_model_keys_are_separate(tmp_path):
+    hashes = [content_hash(f"document {i}") for i in range(3)]
+    vectors = make_vectors(3)
+    store = EmbeddingStore(str(tmp_path), 'model:torch:a')
+    store.put_many(hashes, vectors)
+    store.close()
+    
+    store = EmbeddingStore(str(tmp_path), 'model:torch:a')
+    found = store.get_many(hashes)
+    assert all(np.array_equal(found[key], vector) for key, vector in zip(hashes, vectors))
+    with pytest.raises(ValueError):
+        store.put_many([content_hash("other")], make_vectors(1, dimensions=4))
+    store.close()
+    
+    other = EmbeddingStore(str(tmp_path), 'model:int8:a')
+    assert other.get_many(hashes) == {}
+    other.put_many(hashes[:1], make_vectors(1, dimensions=4, seed=1))
+    assert other.get_many(hashes)[hashes[0]].shape == (4,)
+    other.close()
+
+def test_partial_row_from_interrupted_write_is_dropped(tmp_path):
+    store = EmbeddingStore(str(tmp_path), 'model:torch:a')
+    hashes = [content_hash(f"document {i}") for i in range(3)]
+    vectors = make_vectors(3)
+    store.put_many(hashes[:2], vectors[:2])
+    with open(store._vectors_path, 'ab') as f:
+        f.write(b'\0' * 12)
+    
+    store.put_many(hashes[2:], vectors[2:])
+    assert os.path.getsize(store._vectors_path) == 3 * 8 * 4
+    assert np.array_equal(store.get_many(hashes[2:])[hashes[2]], vectors[2])
+    store.close()
@@ -1,15 +1,10 @@
 #!/usr/bin/env python3
-import pandas as pd
 import time
 from search_engine import SearchEngine
-from data_preprocessor import main as preprocess_data
-import os
+from data_preprocessor import load_preprocessed_data
 
 def test_hybrid_search():
-    if not os.path.exists('data/preprocessed_data.csv'):
-        preprocess_data()
-    
-    documents_df = pd.read_csv('data/preprocessed_data.csv')
+    documents_df = load_preprocessed_data()
     search_engine = SearchEngine()
     
     start_time = time.time()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+import os
+import numpy as np
+from scipy.sparse import csr_matrix
+from memory_backend import MemoryBackend
+from vector_models import normalize
+
+def make_corpus(num_documents=200, dense_dimensions=16, sparse_dimensions=50, seed=0):
+    rng = np.random.default_rng(seed)
+    dense = normalize(rng.normal(size=(num_documents, dense_dimensions)).astype(np.float32))
+    sparse = rng.random((num_documents, sparse_dimensions))
+    sparse[sparse < 0.8] = 0
+    sparse = normalize(csr_matrix(sparse))
+    documents = [
+        (f"doc:{i}", f"hash:{i}", f"Title {i}", f"Content of document {i}", f"source_{i % 4}",
+         'earnings_call' if i % 10 == 0 else 'annual_report')
+        for i in range(num_documents)
+    ]
+    return documents, dense, sparse
+
+def store_corpus(backend, documents, dense, sparse):
+    return backend.store_documents_batch(documents, dense, [sparse[i] for i in range(sparse.shape[0])])
+
+def test_dense_and_sparse_search_match_brute_force():
+    documents, dense, sparse = make_corpus()
+    backend = MemoryBackend()
+    document_ids = store_corpus(backend, documents, dense, sparse)
+    
+    query = dense[3]
+    expected = np.argsort(-(dense @ query))[:5]
+    results = backend.dense_search(query, limit=5)
+    assert [row[0] for row in results] == [document_ids[i] for i in expected]
+    assert results[0][-1] > 0.99
+    
+    sparse_query = sparse[7]
+    sparse_scores = (sparse @ sparse_query.T).toarray().ravel()
+    results = backend.sparse_search(sparse_query, limit=5)
+    assert np.allclose([row[-1] for row in results], np.sort(sparse_scores)[::-1][:5], atol=1e-5)
+
+def test_hybrid_fusion_modes():
+    documents, dense, sparse = make_corpus()
+    backend = MemoryBackend()
+    store_corpus(backend, documents, dense, sparse)
+    
+    exact = backend.exact_hybrid_search(dense[0], sparse[0], limit=10, dense_weight=0.7)
+    candidates = backend.hybrid_search(dense[0], sparse[0], limit=10, dense_weight=0.7, candidate_multiplier=4)
+    rrf = backend.rrf_hybrid_search(dense[0], sparse[0], limit=10)
+    
+    scores = [row[-1] for row in exact]
+    assert scores == sorted(scores, reverse=True)
+    assert exact[0][0] == candidates[0][0] == rrf[0][0]
+    assert len(rrf) == 10
+    assert rrf[0][-1] <= 2.0 / (backend.rrf_k + 1)
+
+def test_filters_return_full_limit():
+    documents, dense, sparse = make_corpus()
+    backend = MemoryBackend()
+    store_corpus(backend, documents, dense, sparse)
+    
+    filters = {'document_type': 'earnings_call', 'source': ['source_0', 'source_2']}
+    results = backend.hybrid_search(dense[1], sparse[1], limit=10, filters=filters, fields=('document_type', 'source'))
+    assert len(results) == 10
+    assert all(row[1] == 'earnings_call' and row[2] in ('source_0', 'source_2') for row in results)
+
+def test_projection_and_snippets():
+    documents, dense, sparse = make_corpus(num_documents=20)
+    backend = MemoryBackend()
+    document_ids = store_corpus(backend, documents, dense, sparse)
+    
+    results = backend.dense_search(dense[0], limit=3, fields=('title', 'content'), snippet_length=7)
+    assert all(len(row) == 4 and len(row[2]) <= 7 for row in results)
+    
+    assert backend.fetch_documents([document_ids[1]], fields=('content',)) == [(document_ids[1], documents[1][3])]
+
+def test_upsert_and_prune():
+    documents, dense, sparse = make_corpus(num_documents=20)
+    backend = MemoryBackend()
+    document_ids = store_corpus(backend, documents, dense, sparse)
+    
+    updated = ('doc:0', 'hash:new', 'New title', 'New content', 'source_0', 'annual_report')
+    assert backend.store_documents_batch([updated], dense[5:6], [sparse[5]]) == [document_ids[0]]
+    assert backend.fetch_document_hashes(['doc:0']) == {'doc:0': (document_ids[0], 'hash:new')}
+    
+    assert backend.delete_documents_except([document[0] for document in documents[:10]]) == 10
+    assert all(row[0] in document_ids[:10] for row in backend.dense_search(dense[15], limit=20))
+
+def test_batched_search_matches_single_queries():
+    documents, dense, sparse = make_corpus()
+    backend = MemoryBackend()
+    store_corpus(backend, documents, dense, sparse)
+    
+    batched = backend.hybrid_search_many(dense[:3], [sparse[i] for i in range(3)], limit=5, fusion='rrf')
+    for i, results in enumerate(batched):
+        assert results == backend.hybrid_search(dense[i], sparse[i], limit=5, fusion='rrf')
+
+def test_persisted_index_is_reloaded(tmp_path):
+    documents, dense, sparse = make_corpus(num_documents=30)
+    backend = MemoryBackend(path=str(tmp_path))
+    store_corpus(backend, documents, dense, sparse)
+    backend.save_sparse_model(['alpha', 'beta'], [1.0, 2.0])
+    expected = backend.hybrid_search(dense[2], sparse[2], limit=5)
+    
+    reloaded = MemoryBackend(path=str(tmp_path))
+    assert reloaded.has_documents()
+    assert reloaded.load_sparse_model() == (1, ['alpha', 'beta'], [1.0, 2.0])
+    assert reloaded.hybrid_search(dense[2], sparse[2], limit=5) == expected
+
+def test_batches_are_logged_as_segments_and_merged_on_reload(tmp_path):
+    documents, dense, sparse = make_corpus(num_documents=40)
+    backend = MemoryBackend(path=str(tmp_path))
+    document_ids = []
+    for start in range(0, 40, 10):
+        document_ids += backend.store_documents_batch(
+            documents[start:start + 10], dense[start:start + 10], [sparse[i] for i in range(start, start + 10)]
+        )
+    updated = ('doc:3', 'hash:new', 'New title', 'New content', 'source_3', 'annual_report')
+    backend.store_documents_batch([updated], dense[20:21], [sparse[20]])
+    backend.delete_documents_except([document[0] for document in documents[:30]])
+    # Each write appends one segment; nothing is rewritten until reload
+    assert len([name for name in os.listdir(tmp_path) if name.startswith('segment_')]) == 6
+    assert not os.path.exists(tmp_path / 'documents.json')
+    expected = backend.hybrid_search(dense[7], sparse[7], limit=5)
+    
+    reloaded = MemoryBackend(path=str(tmp_path))
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('segment_')]
+    assert reloaded.count_documents() == 30
+    assert reloaded.fetch_document_hashes(['doc:3', 'doc:35']) == {'doc:3': (document_ids[3], 'hash:new')}
+    assert reloaded.fetch_documents([document_ids[3]], fields=('title',)) == [(document_ids[3], 'New title')]
+    assert reloaded.hybrid_search(dense[7], sparse[7], limit=5) == expected
+    assert reloaded.dense_search(dense[20], limit=2)[0][0] in (document_ids[3], document_ids[20])
+    
+    new_ids = reloaded.store_documents_batch([documents[35]], dense[35:36], [sparse[35]])
+    assert new_ids[0] > max(document_ids)
+    assert MemoryBackend(path=str(tmp_path)).count_documents() == 31
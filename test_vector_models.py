@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import numpy as np
+from vector_models import EmbeddingCache, VectorModels
+
+def test_cache_evicts_least_recently_used():
+    cache = EmbeddingCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    # Reading 'a' makes 'b' the oldest entry
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats() == {'size': 2, 'max_size': 2, 'hits': 3, 'misses': 1, 'evictions': 1}
+
+def test_cache_counts_every_eviction():
+    cache = EmbeddingCache(3)
+    for i in range(10):
+        cache.put(i, i)
+    # Re-putting a stored key refreshes it without evicting
+    cache.put(7, 7)
+    cache.put(10, 10)
+    
+    assert cache.stats()['evictions'] == 8
+    assert [key for key in range(11) if cache.get(key) is not None] == [7, 9, 10]
+    cache.clear()
+    assert cache.stats()['size'] == 0
+    assert cache.stats()['evictions'] == 8
+
+def test_cache_with_no_capacity_stores_nothing():
+    for max_size in (0, -1):
+        cache = EmbeddingCache(max_size)
+        cache.put('a', 1)
+        assert cache.get('a') is None
+        assert cache.stats() == {'size': 0, 'max_size': max_size, 'hits': 0, 'misses': 1, 'evictions': 0}
+
+def test_refit_invalidates_cached_sparse_embeddings():
+    vector_models = VectorModels()
+    vector_models.sparse_cache = EmbeddingCache(10)
+    vector_models.fit_sparse_model(["revenue grew", "margins fell"])
+    first = vector_models.get_sparse_embedding("Revenue  grew")
+    # Whitespace and case variants hit the same entry
+    assert vector_models.get_sparse_embedding("revenue grew") is first
+    
+    vector_models.fit_sparse_model(["cash flow", "revenue and cash"])
+    assert vector_models.sparse_cache.stats()['size'] == 0
+    second = vector_models.get_sparse_embedding("revenue grew")
+    assert second is not first
+    assert second.shape[1] == len(vector_models.sparse_model.vocabulary_)
+    assert np.isclose(second.power(2).sum(), 1.0)
+    
+    # A vector encoded with the old model while a refit lands is not cached
+    previous_model = vector_models.sparse_model
+    
+    class RefitDuringTransform:
+        def transform(self, texts):
+            vector_models.load_sparse_model(["margins"], [1.0])
+            return previous_model.transform(texts)
+    
+    vector_models._set_sparse_model(RefitDuringTransform())
+    vector_models.get_sparse_embedding("cash flow")
+    assert vector_models.sparse_cache.stats()['size'] == 0
+    assert vector_models.get_sparse_embedding("margins").shape[1] == 1
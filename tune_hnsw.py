@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+HNSW Parameter Tuner
+Rebuilds the HNSW indexes for each m / ef_construction pair, measures latency
+and recall@k against exact search for each ef_search, and recommends the
+cheapest setting that reaches the target recall
+"""
+
+import argparse
+import statistics
+import time
+from benchmark_quantization import sample_queries
+from benchmark_suite import index_corpus
+from database import Database, HNSW_M, HNSW_EF_CONSTRUCTION, dense_index_sql, sparse_index_sql
+from search_engine import SearchEngine
+
+SEARCH_TYPES = ['dense', 'sparse', 'hybrid']
+
+def index_names(db, search_type):
+    names = []
+    if search_type in ('dense', 'hybrid'):
+        names.append(f"idx_dense_vectors_{db.dense_index_type}")
+    if search_type in ('sparse', 'hybrid'):
+        names.append("idx_sparse_vectors_vector")
+    return names
+
+def rebuild_indexes(db, search_type, m, ef_construction):
+    """Drop and rebuild the indexes search_type reads; returns the build time."""
+    start_time = time.time()
+    for name in index_names(db, search_type):
+        db.execute(f"DROP INDEX IF EXISTS {name}")
+        if name == "idx_sparse_vectors_vector":
+            db.execute(sparse_index_sql(m, ef_construction))
+        else:
+            db.execute(dense_index_sql(db.dense_index_type, m, ef_construction))
+    return time.time() - start_time
+
+def index_size(db, search_type):
+    return sum(
+        db.fetch_one("SELECT COALESCE(pg_relation_size(to_regclass(%s)), 0)", (name,))[0]
+        for name in index_names(db, search_type)
+    )
+
+def search(db, search_type, query_vectors, k, ef_search=None, exact=False):
+    dense_vector, sparse_vector = query_vectors
+    if search_type == 'dense':
+        if exact:
+            return db.exact_dense_search(dense_vector, k, fields=())
+        return db.dense_search(dense_vector, k, fields=(), ef_search=ef_search)
+    if search_type == 'sparse':
+        if exact:
+            return db.exact_sparse_search(sparse_vector, k, fields=())
+        return db.sparse_search(sparse_vector, k, fields=(), ef_search=ef_search)
+    if exact:
+        return db.exact_hybrid_search(dense_vector, sparse_vector, k, fields=())
+    return db.hybrid_search(dense_vector, sparse_vector, k, fields=(), ef_search=ef_search)
+
+def measure(db, search_type, query_vectors, ground_truth, k, ef_search):
+    latencies = []
+    recalls = []
+    for vectors, expected in zip(query_vectors, ground_truth):
+        start_time = time.perf_counter()
+        rows = search(db, search_type, vectors, k, ef_search)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        found = {row[0] for row in rows}
+        recalls.append(len(found & set(expected)) / len(expected) if expected else 1.0)
+    
+    latencies.sort()
+    return {
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        'recall': statistics.mean(recalls)
+    }
+
+def choose(results, target_recall):
+    """Lowest p95 latency among settings meeting the target, then the smallest index."""
+    passing = [result for result in results if result['recall'] >= target_recall]
+    if not passing:
+        return None
+    return min(passing, key=lambda result: (result['p95_ms'], result['index_bytes'], result['ef_search']))
+
+def main():
+    """Main function to run the HNSW tuner."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--m', type=int, nargs='+', default=[8, 16, 32])
+    parser.add_argument('--ef-construction', type=int, nargs='+', default=[64, 128, 256])
+    parser.add_argument('--ef-search', type=int, nargs='+', default=[20, 40, 80, 160, 320])
+    parser.add_argument('--target-recall', type=float, default=0.95, help='Minimum recall@k to accept')
+    parser.add_argument('--search-type', default='dense', choices=SEARCH_TYPES)
+    parser.add_argument('--queries', type=int, default=100, help='Number of sampled queries')
+    parser.add_argument('--k', type=int, default=10, help='Results per query (recall@k)')
+    parser.add_argument('--documents', type=int, default=0,
+                        help='Index this many synthetic documents first (0 tunes on the existing corpus)')
+    parser.add_argument('--apply', action='store_true',
+                        help='Leave the indexes built with the recommended parameters')
+    args = parser.parse_args()
+    
+    print("HNSW PARAMETER TUNING")
+    print("=" * 50)
+    print("Indexes are dropped and rebuilt for every m / ef_construction pair; run this")
+    print("against a copy of the database, not one serving queries.\n")
+    
+    search_engine = SearchEngine()
+    db = search_engine.vector_store.db
+    if not isinstance(db, Database):
+        print("HNSW tuning requires SEARCH_BACKEND=postgres.")
+        return
+    
+    try:
+        if args.documents:
+            print(f"Indexing {args.documents} synthetic documents...")
+            index_corpus(search_engine, args.documents, 0, 10000)
+        
+        queries = sample_queries(db, args.queries)
+        if not queries:
+            print("No documents indexed; run the indexer first.")
+            return
+        
+        print(f"Encoding {len(queries)} queries and computing exact top-{args.k}...")
+        query_vectors = list(zip(
+            search_engine.vector_models.get_dense_embeddings(queries),
+            search_engine.vector_models.get_sparse_embeddings(queries)
+        ))
+        ground_truth = [
+            [row[0] for row in search(db, args.search_type, vectors, args.k, exact=True)]
+            for vectors in query_vectors
+        ]
+        
+        results = []
+        print(f"\n{'m':>4} {'ef_cons':>8} {'build s':>8} {'size MB':>8} {'ef_search':>10} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'Recall@' + str(args.k):>10}")
+        for m in args.m:
+            for ef_construction in args.ef_construction:
+                build_time = rebuild_indexes(db, args.search_type, m, ef_construction)
+                size = index_size(db, args.search_type)
+                # One untimed pass loads the new index into shared buffers
+                measure(db, args.search_type, query_vectors, ground_truth, args.k, max(args.ef_search))
+                for ef_search in args.ef_search:
+                    result = measure(db, args.search_type, query_vectors, ground_truth, args.k, ef_search)
+                    result.update(m=m, ef_construction=ef_construction, ef_search=ef_search,
+                                  build_seconds=build_time, index_bytes=size)
+                    results.append(result)
+                    print(f"{m:>4} {ef_construction:>8} {build_time:>8.1f} {size / 1024 ** 2:>8.1f} "
+                          f"{ef_search:>10} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+                          f"{result['recall']:>10.4f}")
+        
+        best = choose(results, args.target_recall)
+        if best is None:
+            best_recall = max(results, key=lambda result: result['recall'])
+            print(f"\nNo setting reached recall@{args.k} >= {args.target_recall}; the best was "
+                  f"{best_recall['recall']:.4f} (m={best_recall['m']}, ef_construction="
+                  f"{best_recall['ef_construction']}, ef_search={best_recall['ef_search']}).")
+            print("Widen the sweep with larger --m, --ef-construction or --ef-search values.")
+        else:
+            print(f"\nCheapest setting with recall@{args.k} >= {args.target_recall}: "
+                  f"{best['recall']:.4f} recall, p95 {best['p95_ms']:.2f}ms")
+            print(f"HNSW_M={best['m']}")
+            print(f"HNSW_EF_CONSTRUCTION={best['ef_construction']}")
+            print(f"HNSW_EF_SEARCH={best['ef_search']}")
+        
+        if args.apply and best is not None:
+            m, ef_construction = best['m'], best['ef_construction']
+        else:
+            m, ef_construction = HNSW_M, HNSW_EF_CONSTRUCTION
+        print(f"\nRebuilding indexes with m={m}, ef_construction={ef_construction}...")
+        rebuild_indexes(db, args.search_type, m, ef_construction)
+    finally:
+        search_engine.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,273 @@
+import os
+import threading
+from collections import OrderedDict
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.preprocessing import normalize
+from scipy.sparse import diags, issparse
+from database import SPARSE_DIMENSIONS
+from dense_encoders import load_dense_encoder, start_encode_pool, weights_fingerprint
+from embedding_store import EmbeddingStore, content_hash
+from search_metrics import metrics
+
+class EmbeddingCache:
+    """Thread-safe LRU cache of query embeddings with hit/miss/eviction counters."""
+    
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+def _normalize_text(text):
+    return ' '.join(text.split())
+
+def normalize(matrix):
+    """L2-normalize the rows of a dense array or CSR matrix (zero rows are left as is)."""
+    if issparse(matrix):
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return (diags(1 / norms) @ matrix).tocsr()
+    
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
 
 class VectorModels:
+    # torch, transformers and sklearn are imported on first use, not at import time
     def __init__(self):
-        self.dense_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.sparse_model = TfidfVectorizer(max_features=1000, stop_words='english')
+        self.dense_model_name = os.getenv('DENSE_MODEL_NAME', 'all-MiniLM-L6-v2')
+        self.dense_backend = os.getenv('DENSE_BACKEND', 'torch')
+        self.dense_threads = int(os.getenv('DENSE_THREADS') or 0) or None
+        self._dense_model = None
+        self._dense_lock = threading.Lock()
+        self._dense_pool = None
+        self.encode_batch_size = int(os.getenv('ENCODE_BATCH_SIZE', '32'))
+        self.encode_workers = int(os.getenv('ENCODE_WORKERS', '1'))
+        self.embedding_store_path = os.getenv('EMBEDDING_STORE_PATH') or None
+        self._embedding_store = None
+        self.sparse_model = None
         self.sparse_fitted = False
+        self.sparse_version = 0
+        self._sparse_lock = threading.Lock()
+        
+        cache_size = int(os.getenv('EMBEDDING_CACHE_SIZE', '1024'))
+        self.dense_cache = EmbeddingCache(cache_size)
+        self.sparse_cache = EmbeddingCache(cache_size)
+    
+    @property
+    def dense_model(self):
+        if self._dense_model is None:
+            with self._dense_lock:
+                if self._dense_model is None:
+                    self._dense_model = load_dense_encoder(
+                        self.dense_model_name, self.dense_backend, self.dense_threads
+                    )
+        return self._dense_model
+    
+    @property
+    def dense_model_key(self):
+        """Model name, backend and weights hash; stored embeddings are only reused under the same key."""
+        return f"{self.dense_model_name}:{self.dense_backend}:{weights_fingerprint(self.dense_model)}"
+    
+    @property
+    def embedding_store(self):
+        if self.embedding_store_path is None:
+            return None
+        if self._embedding_store is None:
+            model_key = self.dense_model_key
+            with self._dense_lock:
+                if self._embedding_store is None:
+                    self._embedding_store = EmbeddingStore(self.embedding_store_path, model_key)
+        return self._embedding_store
+    
+    def warm_up(self, dense=True, sparse=True):
+        """Load models and run one encode so the first query does not pay for it."""
+        if dense:
+            self.dense_model.encode("warm up")
+        if sparse and self.sparse_fitted:
+            self.sparse_model.transform(["warm up"])
+    
+    def _create_sparse_model(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        return TfidfVectorizer(max_features=SPARSE_DIMENSIONS, stop_words='english')
     
     def fit_sparse_model(self, documents):
-        self.sparse_model.fit(documents)
-        self.sparse_fitted = True
+        # Fit a fresh vectorizer and swap it in, so concurrent queries never see a half-fitted model
+        sparse_model = self._create_sparse_model()
+        sparse_model.fit(documents)
+        self._set_sparse_model(sparse_model)
+    
+    def export_sparse_model(self):
+        if not self.sparse_fitted:
+            raise ValueError("TF-IDF model must be fitted before it can be exported")
+        
+        vocabulary = self.sparse_model.vocabulary_
+        terms = [None] * len(vocabulary)
+        for term, index in vocabulary.items():
+            terms[index] = term
+        return terms, self.sparse_model.idf_.tolist()
+    
+    def load_sparse_model(self, terms, idf):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        sparse_model = TfidfVectorizer(
+            vocabulary={term: index for index, term in enumerate(terms)},
+            stop_words='english'
+        )
+        sparse_model.idf_ = np.asarray(idf)
+        self._set_sparse_model(sparse_model)
+    
+    def _set_sparse_model(self, sparse_model):
+        with self._sparse_lock:
+            self.sparse_model = sparse_model
+            self.sparse_version += 1
+            self.sparse_fitted = True
+            self.sparse_cache.clear()
     
     def get_dense_embedding(self, text):
-        embedding = self.dense_model.encode(text)
-        return normalize(embedding.reshape(1, -1))[0]
+        key = (self.dense_model_name, _normalize_text(text))
+        embedding = self.dense_cache.get(key)
+        if embedding is not None:
+            return embedding
+        
+        with metrics.timer('encode.dense'):
+            embedding = self.dense_model.encode(text)
+            embedding = normalize(embedding.reshape(1, -1))[0]
+        # Cached arrays are shared between callers
+        embedding.setflags(write=False)
+        self.dense_cache.put(key, embedding)
+        return embedding
+    
+    def _get_dense_pool(self):
+        dense_model = self.dense_model
+        with self._dense_lock:
+            if self._dense_pool is None:
+                # Every worker loads its own model; splitting the cores between them
+                # keeps torch from oversubscribing the CPU
+                threads = self.dense_threads or max(1, (os.cpu_count() or 1) // self.encode_workers)
+                self._dense_pool = start_encode_pool(dense_model, self.encode_workers, threads)
+            return self._dense_pool
+    
+    def get_dense_embeddings(self, texts, batch_size=None, store=False):
+        """Encode texts in batches of ENCODE_BATCH_SIZE, across ENCODE_WORKERS processes.
+        
+        Texts are encoded in length order, so each batch (and each chunk sent to
+        a worker) pads to similar lengths; embeddings are returned in input order.
+        Inputs of a single batch, and backends without a process pool (onnx),
+        are encoded in-process. With ``store`` (document indexing) and
+        EMBEDDING_STORE_PATH set, texts whose embeddings are already stored are
+        not encoded again and new embeddings are stored; queries never are.
+        """
+        batch_size = batch_size or self.encode_batch_size
+        texts = list(texts)
+        with metrics.timer('encode.dense_batch'):
+            embedding_store = self.embedding_store if store else None
+            if embedding_store is None:
+                return self._encode_dense(texts, batch_size)
+            
+            hashes = [content_hash(text) for text in texts]
+            embeddings = embedding_store.get_many(hashes)
+            missing = [i for i, key in enumerate(hashes) if key not in embeddings]
+            if missing:
+                encoded = self._encode_dense([texts[i] for i in missing], batch_size)
+                embedding_store.put_many([hashes[i] for i in missing], encoded)
+                embeddings.update(zip((hashes[i] for i in missing), encoded))
+            return np.array([embeddings[key] for key in hashes])
+    
+    def _encode_dense(self, texts, batch_size):
+        order = np.argsort([len(text) for text in texts], kind='stable')
+        ordered_texts = [texts[i] for i in order]
+        multi_process = hasattr(self.dense_model, 'encode_multi_process')
+        if self.encode_workers > 1 and len(texts) > batch_size and multi_process:
+            ordered = self.dense_model.encode_multi_process(
+                ordered_texts, self._get_dense_pool(), batch_size=batch_size
+            )
+        else:
+            ordered = self.dense_model.encode(ordered_texts, batch_size=batch_size)
+        embeddings = np.empty_like(ordered)
+        embeddings[order] = ordered
+        return normalize(embeddings)
     
     def get_sparse_embedding(self, text):
         if not self.sparse_fitted:
             raise ValueError("TF-IDF model must be fitted before generating embeddings")
         
-        embedding = self.sparse_model.transform([text]).toarray()[0]
-        return normalize(embedding.reshape(1, -1))[0]
+        with self._sparse_lock:
+            sparse_model, sparse_version = self.sparse_model, self.sparse_version
+        
+        # TF-IDF lowercases its input, so case does not change the embedding
+        key = (sparse_version, _normalize_text(text).lower())
+        embedding = self.sparse_cache.get(key)
+        if embedding is not None:
+            return embedding
+        
+        # Kept as a 1 x vocabulary CSR row; it is never densified
+        with metrics.timer('encode.sparse'):
+            embedding = normalize(sparse_model.transform([text]))
+        with self._sparse_lock:
+            if sparse_version == self.sparse_version:
+                self.sparse_cache.put(key, embedding)
+        return embedding
+    
+    def get_sparse_embeddings(self, texts):
+        if not self.sparse_fitted:
+            raise ValueError("TF-IDF model must be fitted before generating embeddings")
+        
+        with metrics.timer('encode.sparse_batch'):
+            embeddings = self.sparse_model.transform(texts)
+            return normalize(embeddings)
+    
+    def cache_stats(self):
+        stats = {
+            'dense': self.dense_cache.stats(),
+            'sparse': self.sparse_cache.stats()
+        }
+        if self._embedding_store is not None:
+            stats['store'] = self._embedding_store.stats()
+        return stats
     
     def normalize_vector(self, vector):
-        return normalize(vector.reshape(1, -1))[0]
\ No newline at end of file
+        return normalize(vector.reshape(1, -1))[0]
+    
+    def close(self):
+        with self._dense_lock:
+            if self._dense_pool is not None:
+                self._dense_model.stop_multi_process_pool(self._dense_pool)
+                self._dense_pool = None
+            if self._embedding_store is not None:
+                self._embedding_store.close()
+                self._embedding_store = None
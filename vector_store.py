@@ -1,10 +1,25 @@
-import numpy as np
-import pandas as pd
+import os
 from database import Database
+from search_metrics import metrics
+from search_results import SearchResults
+
+def create_backend(name=None):
+    """Storage and search backend selected by SEARCH_BACKEND: 'postgres' (default) or 'memory'."""
+    name = name or os.getenv('SEARCH_BACKEND', 'postgres')
+    if name == 'postgres':
+        return Database()
+    if name == 'memory':
+        from memory_backend import MemoryBackend
+        return MemoryBackend()
+    raise ValueError(f"Unknown SEARCH_BACKEND: {name}")
+
+def format_results(results, fields=None):
+    return SearchResults.from_rows(results or [], fields)
 
 class VectorStore:
-    def __init__(self, vector_models=None):
-        self.db = Database()
+    def __init__(self, vector_models=None, backend=None):
+        # Database or MemoryBackend; both expose the same storage and search methods
+        self.db = backend if backend is not None else create_backend()
         self.vector_models = vector_models
     
     def store_document(self, title, content, source, document_type):
@@ -16,21 +31,115 @@ class VectorStore:
     def store_sparse_vector(self, document_id, vector):
         self.db.store_sparse_vector(document_id, vector)
     
-    def dense_search(self, query, limit=10):
+    def store_documents_batch(self, documents, dense_vectors, sparse_vectors):
+        return self.db.store_documents_batch(documents, dense_vectors, sparse_vectors)
+    
+    def replace_sparse_vectors(self, document_ids, sparse_vectors):
+        self.db.replace_sparse_vectors(document_ids, sparse_vectors)
+    
+    def fetch_document_hashes(self, doc_keys):
+        return self.db.fetch_document_hashes(doc_keys)
+    
+    def fetch_document_contents(self, after_id=0, limit=1000):
+        return self.db.fetch_document_contents(after_id, limit)
+    
+    def delete_documents_except(self, doc_keys):
+        return self.db.delete_documents_except(doc_keys)
+    
+    def save_sparse_model(self, terms, idf):
+        return self.db.save_sparse_model(terms, idf)
+    
+    def load_sparse_model(self):
+        return self.db.load_sparse_model()
+    
+    def has_documents(self):
+        return self.db.has_documents()
+    
+    def has_vector_indexes(self):
+        return self.db.has_vector_indexes()
+    
+    def drop_vector_indexes(self):
+        self.db.drop_vector_indexes()
+    
+    def build_vector_indexes(self, progress=None):
+        return self.db.build_vector_indexes(progress)
+    
+    def dense_search(self, query, limit=10, fields=None, snippet_length=None, filters=None, ef_search=None):
         query_vector = self._get_dense_embedding(query)
-        results = self.db.dense_search(query_vector, limit)
-        return self._format_results(results)
+        with metrics.timer('store.retrieve'):
+            results = self.db.dense_search(query_vector, limit, fields, snippet_length, filters, ef_search)
+        return self._format_results(results, fields)
     
-    def sparse_search(self, query, limit=10):
+    def sparse_search(self, query, limit=10, fields=None, snippet_length=None, filters=None, ef_search=None):
         query_vector = self._get_sparse_embedding(query)
-        results = self.db.sparse_search(query_vector, limit)
-        return self._format_results(results)
+        with metrics.timer('store.retrieve'):
+            results = self.db.sparse_search(query_vector, limit, fields, snippet_length, filters, ef_search)
+        return self._format_results(results, fields)
     
-    def hybrid_search(self, query, limit=10, dense_weight=0.5):
+    def hybrid_search(self, query, limit=10, dense_weight=0.5, candidate_multiplier=None, fusion='weighted',
+                      fields=None, snippet_length=None, filters=None, ef_search=None):
         dense_vector = self._get_dense_embedding(query)
         sparse_vector = self._get_sparse_embedding(query)
-        results = self.db.hybrid_search(dense_vector, sparse_vector, limit, dense_weight)
-        return self._format_results(results)
+        with metrics.timer('store.retrieve'):
+            results = self.db.hybrid_search(
+                dense_vector, sparse_vector, limit, dense_weight, candidate_multiplier, fusion,
+                fields, snippet_length, filters, ef_search
+            )
+        return self._format_results(results, fields)
+    
+    def search_many(self, queries, search_type='hybrid', limit=10, dense_weight=0.5,
+                    candidate_multiplier=None, fusion='weighted', fields=None, snippet_length=None,
+                    filters=None, ef_search=None):
+        queries = list(queries)
+        if not queries:
+            return []
+        
+        # One batched encode per model and one SQL statement for all queries
+        if search_type == 'dense':
+            dense_vectors = self._get_dense_embeddings(queries)
+            with metrics.timer('store.retrieve_batch'):
+                results = self.db.dense_search_many(
+                    dense_vectors, limit, fields, snippet_length, filters, ef_search
+                )
+        elif search_type == 'sparse':
+            sparse_vectors = self._get_sparse_embeddings(queries)
+            with metrics.timer('store.retrieve_batch'):
+                results = self.db.sparse_search_many(
+                    sparse_vectors, limit, fields, snippet_length, filters, ef_search
+                )
+        elif search_type == 'hybrid':
+            dense_vectors = self._get_dense_embeddings(queries)
+            sparse_vectors = self._get_sparse_embeddings(queries)
+            with metrics.timer('store.retrieve_batch'):
+                results = self.db.hybrid_search_many(
+                    dense_vectors, sparse_vectors,
+                    limit, dense_weight, candidate_multiplier, fusion, fields, snippet_length, filters, ef_search
+                )
+        else:
+            raise ValueError(f"Unknown search type: {search_type}")
+        
+        return [self._format_results(query_results, fields) for query_results in results]
+    
+    def fetch_documents(self, document_ids, fields=None):
+        document_ids = list(document_ids)
+        rows = {row[0]: row for row in self.db.fetch_documents(document_ids, fields)}
+        # Returned in the order requested; ids that no longer exist are skipped
+        return format_results(
+            [rows[document_id] + (None,) for document_id in document_ids if document_id in rows],
+            fields
+        )
+    
+    def _get_dense_embeddings(self, texts):
+        if self.vector_models is None:
+            from vector_models import VectorModels
+            self.vector_models = VectorModels()
+        return self.vector_models.get_dense_embeddings(texts)
+    
+    def _get_sparse_embeddings(self, texts):
+        if self.vector_models is None:
+            from vector_models import VectorModels
+            self.vector_models = VectorModels()
+        return self.vector_models.get_sparse_embeddings(texts)
     
     def _get_dense_embedding(self, text):
         if self.vector_models is None:
@@ -44,22 +153,9 @@ class VectorStore:
             self.vector_models = VectorModels()
         return self.vector_models.get_sparse_embedding(text)
     
-    def _format_results(self, results):
-        if not results:
-            return pd.DataFrame()
-        
-        formatted_results = []
-        for result in results:
-            formatted_results.append({
-                'id': result[0],
-                'title': result[1],
-                'content': result[2],
-                'source': result[3],
-                'document_type': result[4] if len(result) > 4 else 'unknown',
-                'similarity': result[5] if len(result) > 5 else 0.0
-            })
-        
-        return pd.DataFrame(formatted_results)
+    def _format_results(self, results, fields=None):
+        with metrics.timer('store.format'):
+            return format_results(results, fields)
     
     def close(self):
         self.db.close()
\ No newline at end of file